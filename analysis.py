@@ -2,24 +2,76 @@
 
 from tqdm import tqdm
 from util import ChartUtils
-from calculate import TechnicalIndicators
 from data import MarketData
 from core import TradingCore
+from fetcher import OHLCVFetcher
+from cache import CandleCache
+from render import ChartRenderer
+from metrics import metrics
+from prescreen import PreScreen
+from shard import shard_of
 import os
 import time
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 class Analysis:
-    def __init__(self, exchange):
+    def __init__(self, exchange, cache_max_age=0, resample_bars=100, report_path='reports/last_scan.json',
+                 max_tier=None, prescreen_margin=None, shard=None, cache_directory='cache/candles'):
         self.exchange = exchange
+        self.fetcher = OHLCVFetcher(exchange.connect_async, cache=CandleCache(cache_directory, max_age=cache_max_age),
+                                    on_invalid_symbol=exchange.universe.exclude)
+        # 유동성 등급 제한 (None이면 거래 중인 USDT-M 무기한 선물 전체)
+        self.max_tier = max_tier
         self.timeframe_options = ['1h', '2h', '4h', '6h', '8h', '12h']
         # For debugging
         # self.timeframe_options = ['1h']
+        # 0이 아니면 1h만 받아 상위 타임프레임을 타임프레임당 resample_bars개씩 로컬에서 만든다
+        self.resample_bars = resample_bars
+        self.renderer = ChartRenderer()
+        # start_stream() 이후에는 REST 대신 웹소켓으로 유지되는 상태에서 읽는다
+        self.stream = None
+        # 타임프레임별 마지막 신호/데이터 (마감된 타임프레임만 다시 계산할 때 재사용)
+        self.timeframe_signals = {}
+        self.timeframe_coins_data = {}
+        # 스캔마다 단계별 시간/카운터 변화량을 JSON으로 남긴다 (None이면 저장하지 않음)
+        self.report_path = report_path
+        # None이 아니면 두 번째 스캔부터 티커로 후보를 고르고 후보의 캔들만 다시 받는다
+        self.prescreen_margin = prescreen_margin
+        # (index, count)이면 심볼 해시로 나눈 index번째 조각만 맡는다 (ShardedScanner 워커)
+        self.shard = shard
+
+    def symbols(self):
+        symbols = self.exchange.get_symbols(self.max_tier)
+        if self.shard is None:
+            return symbols
+        index, count = self.shard
+        return [symbol for symbol in symbols if shard_of(symbol, count) == index]
+
+    def start_stream(self, **kwargs):
+        # aiohttp 웹소켓/서버 모듈은 스트리밍 모드에서만 필요하다
+        from stream import MarketStream
+
+        symbols = MarketData.usdt_pairs(self.exchange.exchange, self.symbols())
+        # 스트림 밖의 펀딩비 조회(exchange.fetch_funding_rate)도 markPrice로 최신 상태를 유지한다
+        kwargs.setdefault('funding_service', self.exchange.funding)
+        self.stream = MarketStream(self.exchange.connect_async, self.exchange.exchange.markets, symbols,
+                                   self.timeframe_options, limit=self.resample_bars or 100, **kwargs)
+        self.stream.start()
+        return self.stream
+
+    def fetch_funding_rate(self, symbol):
+        with metrics.timer('funding_lookup'):
+            funding = self.stream.funding_snapshot().get(symbol) if self.stream is not None else None
+            if funding is None:
+                return self.exchange.fetch_funding_rate(symbol)
+            return funding['fundingRate']
 
     def fetch_top_gainers_and_losers(self):
-        tickers = self.exchange.exchange.fetch_tickers()
+        if self.stream is not None:
+            tickers = self.stream.ticker_snapshot()
+        else:
+            tickers = self.exchange.exchange.fetch_tickers()
         futures_tickers = {symbol: ticker for symbol, ticker in tickers.items() if symbol.endswith('USDT')}
 
         sorted_tickers = sorted(futures_tickers.items(), key=lambda x: x[1]['percentage'], reverse=True)
@@ -28,7 +80,7 @@ class Analysis:
 
         gainers_with_fee = []
         for symbol, ticker in top_5_gainers:
-            funding_rate = self.exchange.fetch_funding_rate(symbol)
+            funding_rate = self.fetch_funding_rate(symbol)
             gainers_with_fee.append({
                 'symbol': symbol.replace(':USDT', ''),
                 'change': ticker['percentage'],
@@ -37,7 +89,7 @@ class Analysis:
 
         losers_with_fee = []
         for symbol, ticker in top_5_losers:
-            funding_rate = self.exchange.fetch_funding_rate(symbol)
+            funding_rate = self.fetch_funding_rate(symbol)
             losers_with_fee.append({
                 'symbol': symbol.replace(':USDT', ''),
                 'change': ticker['percentage'],
@@ -53,47 +105,100 @@ class Analysis:
         top_gainers = self.fetch_top_gainers_and_losers()
         return top_gainers
 
-    def process_timeframe(self, timeframe, symbols):
+    def fetch_coins_data(self, timeframe, symbols):
+        if self.stream is not None:
+            return self.stream.coins_data(timeframe)
         limit = ChartUtils.calculate_limit(timeframe)
-        coins_data = MarketData.fetch_coins_data(self.exchange.exchange, symbols, timeframe, limit)
-        extreme_bb_signals = TradingCore.find_bollinger_extremes(coins_data)
-        extreme_rsi_signals = TradingCore.find_extreme_rsi(coins_data)
+        return MarketData.fetch_coins_data(self.exchange.exchange, symbols, timeframe, limit, self.fetcher)
+
+    def process_timeframe(self, timeframe, symbols):
+        coins_data = self.fetch_coins_data(timeframe, symbols)
+        bb_symbols, rsi_symbols = self.detect_signals(coins_data)
+        return (coins_data, bb_symbols, rsi_symbols)
+
+    @staticmethod
+    def detect_signals(coins_data):
+        extreme_bb_signals, extreme_rsi_signals = TradingCore.find_extremes_vectorized(coins_data)
 
         bb_symbols = {symbol for symbol, _ in extreme_bb_signals}
         rsi_symbols = {symbol for symbol, _, _ in extreme_rsi_signals}
-        return (coins_data, bb_symbols, rsi_symbols)
+        return bb_symbols, rsi_symbols
 
-    def analyze_all_timeframes(self):
+    def fetch_all_coins_data(self, symbols, timeframes=None):
+        timeframes = timeframes or self.timeframe_options
+        if self.stream is not None:
+            return {timeframe: self.stream.coins_data(timeframe) for timeframe in timeframes}
+        if self.resample_bars:
+            return MarketData.fetch_resampled_timeframes(self.exchange.exchange, symbols, timeframes,
+                                                         self.resample_bars, self.fetcher)
+        # 모든 타임프레임 x 심볼 요청을 하나의 비동기 배치로 수집 (가중치 리미터 공유)
+        timeframe_limits = {timeframe: ChartUtils.calculate_limit(timeframe) for timeframe in timeframes}
+        return MarketData.fetch_all_timeframes(self.exchange.exchange, symbols, timeframe_limits, self.fetcher)
+
+    def prescreen_symbols(self, symbols):
+        """fetch_tickers 한 번으로 신호가 날 수 있는 후보만 남긴다 (이전 스캔 데이터가 없으면 전체).
+
+        모든 타임프레임 교집합(common_*)은 전체 스캔과 같고, 타임프레임별 신호는 후보 안에서만 계산된다.
+        """
+        if self.prescreen_margin is None or self.stream is not None or not self.timeframe_coins_data:
+            return symbols
+        with metrics.timer('ticker_load'):
+            tickers = self.exchange.exchange.fetch_tickers()
+        prices = {symbol: float(ticker['last']) for symbol, ticker in tickers.items() if ticker.get('last')}
+        with metrics.timer('prescreen'):
+            candidates = PreScreen.candidates(self.timeframe_coins_data, prices, symbols, self.timeframe_options,
+                                              int(time.time() * 1000), self.prescreen_margin)
+        metrics.increment('prescreen_symbols', len(candidates), result='candidate')
+        metrics.increment('prescreen_symbols', len(symbols) - len(candidates), result='skipped')
+        return [symbol for symbol in symbols if symbol in candidates]
+
+    def update_timeframe_signals(self, timeframes, close_time=None):
+        """주어진 타임프레임만 다시 받아 신호를 갱신한다. 나머지는 이전 결과를 그대로 쓴다.
+
+        close_time(ms)이 있으면 그 시각까지 마감된 봉만 남겨 진행 중인 봉을 평가하지 않는다.
+        """
+        # 아직 한 번도 계산하지 않은 타임프레임은 함께 계산
+        timeframes = [timeframe for timeframe in self.timeframe_options
+                      if timeframe in timeframes or timeframe not in self.timeframe_signals]
+        symbols = self.symbols()
+        # 마감 봉 평가에는 현재가가 의미 없으므로 진행 중인 봉을 볼 때만 사전 선별
+        prescreened = close_time is None and len(timeframes) == len(self.timeframe_options)
+        if prescreened:
+            symbols = self.prescreen_symbols(symbols)
+        with metrics.timer('ohlcv_batch'):
+            all_coins_data = self.fetch_all_coins_data(symbols, timeframes)
+        for timeframe, timeframe_data in all_coins_data.items():
+            if close_time is not None:
+                timeframe_data = MarketData.closed_bars(timeframe_data, timeframe, close_time)
+            bb_signals, rsi_signals = self.detect_signals(timeframe_data)
+            self.timeframe_signals[timeframe] = {'bb': bb_signals, 'rsi': rsi_signals}
+            if prescreened and self.prescreen_margin is not None:
+                # 후보가 아닌 심볼의 이전 캔들은 다음 사전 선별에 그대로 쓴다
+                timeframe_data = dict(self.timeframe_coins_data.get(timeframe, {}), **timeframe_data)
+            self.timeframe_coins_data[timeframe] = timeframe_data
+        return timeframes
+
+    def analyze_all_timeframes(self, timeframes=None, close_time=None):
+        """timeframes가 None이면 전체를 다시 계산하고, 아니면 그 타임프레임만 갱신해 교집합을 구한다."""
         print("Analyzing all timeframes...")
         result = {
             'common_bb_symbols': [], 
             'common_rsi_symbols': [], 
             'intersected_symbols': [],
-            'funding_rates': {}
-        }
-        symbols = self.exchange.get_symbols()
-        extreme_signals_per_timeframe = {
-        timeframe: {'bb': set(), 'rsi': set()} for timeframe in self.timeframe_options
+            'funding_rates': {},
+            'charts': {}
         }
-        all_coins_data = {}
+        run_start = metrics.snapshot()
         start_time = time.time()
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            futures = {executor.submit(self.process_timeframe, timeframe, symbols): 
-                       timeframe for timeframe in self.timeframe_options}
-            for future in as_completed(futures):
-                result_list = future.result()
-                timeframe_data = result_list[0]
-                bb_signals = result_list[1]
-                rsi_signals = result_list[2]
-                timeframe = futures[future]
-                all_coins_data[timeframe] = timeframe_data
-
-                extreme_signals_per_timeframe[timeframe]['bb'].update(bb_signals)
-                extreme_signals_per_timeframe[timeframe]['rsi'].update(rsi_signals)
+        with metrics.timer('signal_update'):
+            self.update_timeframe_signals(timeframes or self.timeframe_options, close_time)
         end_time = time.time()
         total_time = end_time - start_time
         print(f"Total execution time: {total_time:.2f} seconds")
 
+        extreme_signals_per_timeframe = {timeframe: self.timeframe_signals[timeframe]
+                                         for timeframe in self.timeframe_options}
+        all_coins_data = self.timeframe_coins_data
         common_bb_symbols = set.intersection(*[signals['bb'] for signals in extreme_signals_per_timeframe.values()])
         common_rsi_symbols = set.intersection(*[signals['rsi'] for signals in extreme_signals_per_timeframe.values()])
         intersected_symbols = common_bb_symbols.intersection(common_rsi_symbols)
@@ -109,10 +214,9 @@ class Analysis:
                 # 단일로 처리해야함..
                 # 몇시간 봉을 보여줄 것인가?
                 # 이미지를 한번에 합쳐서 보여주는건...?
-                data = TechnicalIndicators.add_technical_indicators(data[0])
-                data['upper_band'], data['lower_band'] = TechnicalIndicators.calculate_bollinger_bands(data)
-                ChartUtils.save_chart(data, symbol, "common")
-                funding_rate = self.exchange.fetch_funding_rate(symbol)
+                # 렌더링은 프로세스 풀에서 진행되고 결과에는 Future만 담는다
+                result['charts'][symbol] = self.renderer.submit(data[0], symbol, "common")
+                funding_rate = self.fetch_funding_rate(symbol)
                 result['funding_rates'][symbol] = funding_rate
             
             result.update({
@@ -122,8 +226,33 @@ class Analysis:
             'funding_rate': funding_rate})            
         else:
             print("No common Bollinger Band signals found across timeframes.")
+
+        metrics.observe('scan', time.time() - start_time)
+        if self.report_path:
+            result['metrics'] = metrics.write_report(self.report_path, run_start)
         return result
     
+    def scan_timeframe(self, timeframe):
+        """한 타임프레임만 받아 BB/RSI 극단값 심볼을 출력하고 (bb, rsi) 신호 목록을 반환."""
+        symbols = self.symbols()
+        coins_data = self.fetch_coins_data(timeframe, symbols)
+        extreme_bb_signals, extreme_rsi_signals = TradingCore.find_extremes_vectorized(coins_data)
+
+        if extreme_bb_signals:
+            print("\nCoins with extreme Bollinger Band values:")
+            for symbol, position in extreme_bb_signals:
+                print(f"{symbol} is {position}")
+                self.renderer.submit(coins_data[symbol], symbol, timeframe)
+                
+        if extreme_rsi_signals:
+            print("\nCoins with extreme RSI values:")
+            for symbol, status, rsi_value in extreme_rsi_signals:
+                print(f"{symbol} is {status} (RSI: {rsi_value:.2f})")
+
+        else:
+            print("\nNo coins with extreme Bollinger Band values at this time.")
+        return extreme_bb_signals, extreme_rsi_signals
+
     def analyze_specific_timeframe(self):
         print("Available timeframes: " + ', '.join(self.timeframe_options))
         while True:
@@ -131,29 +260,7 @@ class Analysis:
             if user_input.isdigit() and f"{user_input}h" in self.timeframe_options:
                 timeframe = f"{user_input}h"
                 print(f"You have selected the timeframe: {timeframe}")
-                symbols = self.exchange.get_symbols()
-                limit = ChartUtils.calculate_limit(timeframe)
-                coins_data = MarketData.fetch_coins_data(self.exchange.exchange, symbols, timeframe, limit)
-                extreme_bb_signals = TradingCore.find_bollinger_extremes(coins_data)
-                extreme_rsi_signals = TradingCore.find_extreme_rsi(coins_data)
-
-                if extreme_bb_signals:
-                    print("\nCoins with extreme Bollinger Band values:")
-                    for symbol, position in extreme_bb_signals:
-                        print(f"{symbol} is {position}")
-                        data = coins_data[symbol]
-                        data = TechnicalIndicators.add_technical_indicators(data)
-                        data['upper_band'], data['lower_band'] = TechnicalIndicators.calculate_bollinger_bands(data)
-                        ChartUtils.save_chart(data, symbol, timeframe)
-                        
-                if extreme_rsi_signals:
-                    print("\nCoins with extreme RSI values:")
-                    for symbol, status, rsi_value in extreme_rsi_signals:
-                        print(f"{symbol} is {status} (RSI: {rsi_value:.2f})")
-
-                else:
-                    print("\nNo coins with extreme Bollinger Band values at this time.")
+                self.scan_timeframe(timeframe)
                 break
             else:
                 print("Invalid input. Please enter a valid number for the timeframe.")
-                
\ No newline at end of file
@@ -0,0 +1,283 @@
+# arbitrage.py
+import asyncio
+import atexit
+import itertools
+import time
+
+import ccxt.async_support as ccxt_async
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class Venue:
+    """거래소 하나의 한 시장 종류(spot 또는 swap)를 감싼 호가 수집기.
+
+    클라이언트는 한 번 만들어 재사용하므로 ccxt 세션의 keep-alive 연결이 거래소별로 풀링된다.
+    client_factory는 load_markets/fetch_order_book(필요하면 fetch_bids_asks,
+    fetch_funding_rates)을 가진 async 클라이언트를 반환해야 하며, 테스트에서는 목 거래소로 바꿀 수 있다.
+    """
+
+    def __init__(self, name, client_factory, market_type='swap', quote='USDT', taker_fee=None, max_concurrency=10,
+                 order_book_limit=5, funding_ttl=60):
+        self.name = name
+        self.client_factory = client_factory
+        self.market_type = market_type
+        self.quote = quote
+        self.taker_fee = taker_fee
+        self.max_concurrency = max_concurrency
+        self.order_book_limit = order_book_limit
+        self.funding_ttl = funding_ttl
+        self.client = None
+        self.symbols = {}
+        self.fees = {}
+        self.funding_rates = {}
+        self.funding_expires_at = 0.0
+        self.semaphore = None
+
+    @staticmethod
+    def normalize(market):
+        # 거래소마다 다른 심볼 표기(BTC/USDT:USDT, BTC-USDT-SWAP ...)를 BASE/QUOTE로 통일
+        return f"{market['base']}/{market['quote']}"
+
+    async def load(self):
+        if self.client is None:
+            self.client = self.client_factory()
+        markets = await self.client.load_markets()
+        self.symbols = {}
+        self.fees = {}
+        for symbol, market in markets.items():
+            if market.get('type') != self.market_type or market.get('quote') != self.quote:
+                continue
+            if market.get('active') is False:
+                continue
+            canonical = self.normalize(market)
+            self.symbols[canonical] = symbol
+            fee = self.taker_fee if self.taker_fee is not None else market.get('taker')
+            self.fees[canonical] = float(fee or 0.0)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.symbols
+
+    @property
+    def is_perp(self):
+        return self.market_type == 'swap'
+
+    def _quote(self, canonical, bid, ask, bid_size, ask_size, timestamp, sent):
+        if not bid or not ask:
+            return None
+        return {
+            'venue': self.name,
+            'symbol': canonical,
+            'bid': float(bid),
+            'ask': float(ask),
+            'bid_size': float(bid_size) if bid_size is not None else None,
+            'ask_size': float(ask_size) if ask_size is not None else None,
+            # 거래소 타임스탬프가 없으면 요청을 보낸 시각을 호가 시각으로 본다 (보수적)
+            'timestamp': int(timestamp) if timestamp else sent,
+            'received': now_ms(),
+        }
+
+    async def _fetch_order_book(self, canonical):
+        sent = now_ms()
+        try:
+            async with self.semaphore:
+                order_book = await self.client.fetch_order_book(self.symbols[canonical], self.order_book_limit)
+        except Exception as e:
+            print(f"Error fetching order book for {self.name} {canonical}: {e}")
+            return None
+        bids, asks = order_book.get('bids') or [], order_book.get('asks') or []
+        if not bids or not asks:
+            return None
+        return self._quote(canonical, bids[0][0], asks[0][0], bids[0][1], asks[0][1], order_book.get('timestamp'),
+                           sent)
+
+    async def fetch_quotes(self, canonicals):
+        """{canonical: quote}. 일괄 호가 엔드포인트가 있으면 한 번에, 없으면 심볼별로 동시에 요청."""
+        canonicals = [canonical for canonical in canonicals if canonical in self.symbols]
+        if not canonicals:
+            return {}
+        if self.client.has.get('fetchBidsAsks'):
+            sent = now_ms()
+            try:
+                tickers = await self.client.fetch_bids_asks([self.symbols[canonical] for canonical in canonicals])
+            except Exception as e:
+                print(f"Error fetching quotes for {self.name}: {e}")
+                return {}
+            quotes = {}
+            for canonical in canonicals:
+                ticker = tickers.get(self.symbols[canonical])
+                if ticker is None:
+                    continue
+                quote = self._quote(canonical, ticker.get('bid'), ticker.get('ask'), ticker.get('bidVolume'),
+                                    ticker.get('askVolume'), ticker.get('timestamp'), sent)
+                if quote is not None:
+                    quotes[canonical] = quote
+            return quotes
+
+        results = await asyncio.gather(*[self._fetch_order_book(canonical) for canonical in canonicals])
+        return {quote['symbol']: quote for quote in results if quote is not None}
+
+    async def fetch_funding(self):
+        """{canonical: 펀딩비}. 무기한 선물만 해당하며 funding_ttl 동안 캐시한다."""
+        if not self.is_perp or not self.client.has.get('fetchFundingRates'):
+            return self.funding_rates
+        if time.time() < self.funding_expires_at:
+            return self.funding_rates
+        try:
+            funding_rates = await self.client.fetch_funding_rates(list(self.symbols.values()))
+        except Exception as e:
+            print(f"Error fetching funding rates for {self.name}: {e}")
+            return self.funding_rates
+        canonicals = {symbol: canonical for canonical, symbol in self.symbols.items()}
+        self.funding_rates = {canonicals[symbol]: float(item['fundingRate'])
+                              for symbol, item in funding_rates.items()
+                              if symbol in canonicals and item.get('fundingRate') is not None}
+        self.funding_expires_at = time.time() + self.funding_ttl
+        return self.funding_rates
+
+    async def close(self):
+        if self.client is not None and hasattr(self.client, 'close'):
+            await self.client.close()
+        self.client = None
+
+
+def default_venues():
+    return [
+        Venue('binance', lambda: ccxt_async.binance({'enableRateLimit': False}), market_type='spot'),
+        Venue('binanceusdm', lambda: ccxt_async.binanceusdm({'enableRateLimit': False}), market_type='swap'),
+        Venue('bybit', lambda: ccxt_async.bybit({'enableRateLimit': False}), market_type='swap'),
+        Venue('okx', lambda: ccxt_async.okx({'enableRateLimit': False}), market_type='swap'),
+    ]
+
+
+class SpreadScanner:
+    """여러 거래소/시장의 최우선 호가를 동시에 받아 거래소 간 스프레드와 현물-무기한 베이시스를 계산한다.
+
+    순 스프레드 = 매도 bid / 매수 ask - 1 - 양쪽 진입·청산 테이커 수수료 + 보유 기간 펀딩.
+    펀딩은 funding_periods번 정산을 가정하며 무기한 숏은 받고 롱은 낸다.
+    현물은 공매도할 수 없다고 보고 매도 쪽으로 쓰지 않는다. max_age초보다 오래된 호가는 버린다.
+    """
+
+    def __init__(self, venues=None, symbols=None, min_spread=0.001, max_age=2.0, funding_periods=1, interval=1.0,
+                 on_opportunity=None):
+        self.venues = venues if venues is not None else default_venues()
+        self.requested_symbols = symbols
+        self.symbols = []
+        self.min_spread = min_spread
+        self.max_age = max_age
+        self.funding_periods = funding_periods
+        self.interval = interval
+        self.on_opportunity = on_opportunity or self.print_opportunity
+        self.loop = asyncio.new_event_loop()
+        self.loaded = False
+        self.stats = {'polls': 0, 'quotes': 0, 'stale': 0, 'opportunities': 0}
+        atexit.register(self.close)
+
+    async def load_async(self):
+        await asyncio.gather(*[venue.load() for venue in self.venues])
+        # 두 곳 이상에서 거래되는 심볼만 비교 대상
+        counts = {}
+        for venue in self.venues:
+            for canonical in venue.symbols:
+                counts[canonical] = counts.get(canonical, 0) + 1
+        symbols = [canonical for canonical, count in counts.items() if count >= 2]
+        if self.requested_symbols is not None:
+            symbols = [canonical for canonical in self.requested_symbols if canonical in counts and counts[canonical] >= 2]
+        self.symbols = sorted(symbols)
+        self.loaded = True
+        return self.symbols
+
+    async def poll_async(self):
+        """모든 거래소의 호가와 펀딩비를 동시에 받아 기준 이상의 기회를 반환."""
+        if not self.loaded:
+            await self.load_async()
+        results = await asyncio.gather(*[venue.fetch_quotes(self.symbols) for venue in self.venues],
+                                       *[venue.fetch_funding() for venue in self.venues])
+        quotes = dict(zip([venue.name for venue in self.venues], results[:len(self.venues)]))
+        funding_rates = dict(zip([venue.name for venue in self.venues], results[len(self.venues):]))
+
+        fresh_quotes = self.fresh(quotes, now_ms(), self.max_age)
+        self.stats['polls'] += 1
+        self.stats['quotes'] += sum(len(venue_quotes) for venue_quotes in quotes.values())
+        self.stats['stale'] += (sum(len(venue_quotes) for venue_quotes in quotes.values())
+                                - sum(len(venue_quotes) for venue_quotes in fresh_quotes.values()))
+
+        opportunities = self.spreads(self.venues, fresh_quotes, funding_rates, self.min_spread, self.funding_periods)
+        self.stats['opportunities'] += len(opportunities)
+        for opportunity in opportunities:
+            self.on_opportunity(opportunity)
+        return opportunities
+
+    @staticmethod
+    def fresh(quotes, now, max_age):
+        max_age_ms = max_age * 1000
+        return {venue: {symbol: quote for symbol, quote in venue_quotes.items() if now - quote['timestamp'] <= max_age_ms}
+                for venue, venue_quotes in quotes.items()}
+
+    @staticmethod
+    def spreads(venues, quotes, funding_rates, min_spread=0.0, funding_periods=1):
+        """매수 venue의 ask와 매도 venue의 bid로 가능한 모든 방향의 순 스프레드를 계산."""
+        opportunities = []
+        for buy_venue, sell_venue in itertools.permutations(venues, 2):
+            if not sell_venue.is_perp:
+                continue
+            buy_quotes, sell_quotes = quotes.get(buy_venue.name, {}), quotes.get(sell_venue.name, {})
+            for symbol in buy_quotes.keys() & sell_quotes.keys():
+                buy, sell = buy_quotes[symbol], sell_quotes[symbol]
+                gross = sell['bid'] / buy['ask'] - 1
+                fees = 2 * (buy_venue.fees.get(symbol, 0.0) + sell_venue.fees.get(symbol, 0.0))
+                funding = funding_rates.get(sell_venue.name, {}).get(symbol, 0.0)
+                if buy_venue.is_perp:
+                    funding -= funding_rates.get(buy_venue.name, {}).get(symbol, 0.0)
+                net = gross - fees + funding * funding_periods
+                if net < min_spread:
+                    continue
+                sizes = [size for size in (buy['ask_size'], sell['bid_size']) if size is not None]
+                opportunities.append({
+                    'symbol': symbol,
+                    'kind': 'cross' if buy_venue.market_type == sell_venue.market_type else 'basis',
+                    'buy_venue': buy_venue.name,
+                    'sell_venue': sell_venue.name,
+                    'buy_price': buy['ask'],
+                    'sell_price': sell['bid'],
+                    'gross_spread': gross,
+                    'fees': fees,
+                    'funding': funding * funding_periods,
+                    'net_spread': net,
+                    'size': min(sizes) if sizes else None,
+                    'quote_age': now_ms() - min(buy['timestamp'], sell['timestamp']),
+                })
+        return sorted(opportunities, key=lambda opportunity: opportunity['net_spread'], reverse=True)
+
+    @staticmethod
+    def print_opportunity(opportunity):
+        print(f"[{opportunity['kind']}] {opportunity['symbol']}: buy {opportunity['buy_venue']} "
+              f"{opportunity['buy_price']} / sell {opportunity['sell_venue']} {opportunity['sell_price']} "
+              f"net {opportunity['net_spread'] * 100:.3f}% (gross {opportunity['gross_spread'] * 100:.3f}%, "
+              f"age {opportunity['quote_age']}ms)")
+
+    async def run_async(self, iterations=None):
+        count = 0
+        while iterations is None or count < iterations:
+            started = time.monotonic()
+            await self.poll_async()
+            count += 1
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def poll(self):
+        return self.loop.run_until_complete(self.poll_async())
+
+    def run(self, iterations=None):
+        try:
+            self.loop.run_until_complete(self.run_async(iterations))
+        except KeyboardInterrupt:
+            pass
+
+    async def close_async(self):
+        await asyncio.gather(*[venue.close() for venue in self.venues])
+
+    def close(self):
+        if not self.loop.is_closed():
+            self.loop.run_until_complete(self.close_async())
+            self.loop.close()
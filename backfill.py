@@ -0,0 +1,282 @@
+# backfill.py
+import asyncio
+import json
+import os
+import time
+
+import ccxt
+import numpy as np
+from tqdm import tqdm
+
+from fetcher import is_invalid_symbol_error
+from metrics import metrics
+from store import OHLCVStore
+
+
+class Backfill:
+    """since 커서로 과거 구간을 최근부터 거꾸로 페이지 단위로 받아 OHLCVStore를 채우는 재개 가능한 대량 수집기.
+
+    - (symbol, timeframe) 작업마다 남은 구간/커서/받은 행 수를 manifest(JSON)에 기록하므로
+      중단된 실행을 다시 시작하면 마지막 체크포인트부터 이어 받는다.
+    - 받은 페이지는 작업별 스테이징 파일 끝에만 덧붙이고, 구간을 다 받으면 정렬/중복 제거/공백 검사 후
+      저장소에 한 번에 쓴다 (마지막 봉 이후는 append, 처음 봉 이전은 rewrite).
+    - 동시에 max_concurrency개 작업이 돌며, 모든 요청이 fetcher의 분당 가중치 리미터를 공유한다.
+    - 빈 페이지(요청 구간에 봉이 없음)를 만나면 상장 이전으로 보고 그 구간을 끝낸다.
+    """
+
+    def __init__(self, fetcher, store=None, manifest_path=None, page_limit=1000, max_concurrency=None,
+                 checkpoint_interval=5.0):
+        self.fetcher = fetcher
+        self.store = store or OHLCVStore()
+        self.manifest_path = manifest_path or os.path.join(self.store.root, '.backfill', 'manifest.json')
+        self.staging_root = os.path.join(os.path.dirname(self.manifest_path), 'staging')
+        # 1000개가 가중치(5) 대비 봉 수가 가장 많다
+        self.page_limit = page_limit
+        self.max_concurrency = max_concurrency or fetcher.max_concurrency
+        self.checkpoint_interval = checkpoint_interval
+        self.jobs = self._read_manifest()
+        self.saved_at = 0.0
+
+    # --- manifest / 스테이징 ---
+
+    @staticmethod
+    def key(symbol, timeframe):
+        return f'{timeframe}/{symbol}'
+
+    @staticmethod
+    def period(timeframe):
+        return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)['jobs']
+
+    def checkpoint(self, force=False):
+        """manifest를 원자적으로 교체한다. force가 아니면 checkpoint_interval초에 한 번만 쓴다."""
+        if not force and time.monotonic() - self.saved_at < self.checkpoint_interval:
+            return
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump({'time': time.time(), 'jobs': self.jobs}, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        self.saved_at = time.monotonic()
+
+    def _staging_path(self, symbol, timeframe):
+        return os.path.join(self.staging_root, timeframe, OHLCVStore.format_symbol(symbol) + '.bin')
+
+    def _stage(self, path, state, candles):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as f:
+            # 체크포인트 이후에 쓰인 행(중단 전 마지막 페이지들)은 다시 받으므로 잘라낸다
+            f.truncate(state['staged'] * 6 * 8)
+            f.write(np.ascontiguousarray(candles, dtype=np.float64).tobytes())
+        state['staged'] += len(candles)
+
+    @staticmethod
+    def _read_staging(path, rows):
+        if not rows or not os.path.exists(path):
+            return np.empty((0, 6))
+        return np.fromfile(path, dtype=np.float64, count=rows * 6).reshape(-1, 6)
+
+    # --- 계획 ---
+
+    @staticmethod
+    def _new_state(symbol, timeframe):
+        return {'symbol': symbol, 'timeframe': timeframe, 'status': 'pending', 'ranges': [], 'cursor': None,
+                'staged': 0, 'covered': None, 'pages': 0, 'rows': 0, 'duplicates': 0, 'misaligned': 0,
+                'gaps': 0, 'gap_ranges': [], 'error': None}
+
+    def plan(self, state, start, end):
+        """저장소가 덮지 못한 [start, end) 구간 목록 (최근 구간부터).
+
+        범위는 저장소의 처음/마지막 봉으로 정하고, manifest의 covered(이전에 받아 본 구간)는 저장소 데이터와
+        겹칠 때만 봉이 없는 구간(상장 이전, 거래 중단 이후)을 건너뛰는 힌트로 쓴다.
+        저장소가 비어 있으면 manifest와 상관없이 전체를 다시 받는다.
+        """
+        symbol, timeframe = state['symbol'], state['timeframe']
+        first = self.store.first_timestamp(symbol, timeframe)
+        if first is None:
+            return [[start, end]] if start < end else []
+        last = self.store.last_timestamp(symbol, timeframe)
+        low, high = first, last + self.period(timeframe)
+        hint = state['covered']
+        if hint and hint[0] <= first < hint[1]:
+            low = min(low, hint[0])
+        if hint and hint[0] <= last < hint[1]:
+            high = max(high, hint[1])
+        ranges = []
+        if high < end:
+            ranges.append([high, end])
+        if start < low:
+            ranges.append([start, low])
+        return ranges
+
+    # --- 검사 / 병합 ---
+
+    @staticmethod
+    def validate(candles, period, before=None, after=None):
+        """정렬, 봉 경계가 아닌 행과 중복 타임스탬프 제거, 빠진 봉 구간 검사.
+
+        before/after는 저장소에서 이 구간 바로 앞/뒤에 붙을 봉의 타임스탬프 (이음매의 공백도 센다).
+        """
+        candles = candles[np.argsort(candles[:, 0], kind='stable')]
+        aligned = candles[:, 0] % period == 0
+        misaligned = int((~aligned).sum())
+        candles = candles[aligned]
+        keep = np.ones(len(candles), dtype=bool)
+        keep[1:] = candles[1:, 0] != candles[:-1, 0]
+        duplicates = int((~keep).sum())
+        candles = candles[keep]
+
+        timestamps = candles[:, 0].astype(np.int64)
+        edges = [[before]] if before is not None else []
+        edges += [timestamps] + ([[after]] if after is not None else [])
+        timestamps = np.concatenate(edges).astype(np.int64)
+        steps = np.diff(timestamps)
+        holes = np.flatnonzero(steps > period)
+        gap_ranges = [[int(timestamps[i]) + period, int(timestamps[i + 1])] for i in holes]
+        gaps = int(((steps[holes] // period) - 1).sum())
+        return candles, {'duplicates': duplicates, 'misaligned': misaligned, 'gaps': gaps, 'gap_ranges': gap_ranges}
+
+    def _merge(self, state, path):
+        symbol, timeframe = state['symbol'], state['timeframe']
+        period = self.period(timeframe)
+        candles = self._read_staging(path, state['staged'])
+        if not len(candles):
+            return 0
+        first = self.store.first_timestamp(symbol, timeframe)
+        last = self.store.last_timestamp(symbol, timeframe)
+        with metrics.timer('backfill_merge'):
+            if last is None or candles[:, 0].min() > last:
+                candles, report = self.validate(candles, period, before=last)
+                written = self.store.append(symbol, timeframe, candles)
+            else:
+                candles, report = self.validate(candles, period, after=first)
+                written = self.store.rewrite(symbol, timeframe, candles)
+        for name in ['duplicates', 'misaligned', 'gaps']:
+            state[name] += report[name]
+        # 작업마다 앞쪽 몇 개만 남긴다
+        state['gap_ranges'] = (state['gap_ranges'] + report['gap_ranges'])[:10]
+        state['rows'] += len(candles)
+        return written
+
+    # --- 실행 ---
+
+    async def _run_job(self, state):
+        symbol, timeframe = state['symbol'], state['timeframe']
+        period = self.period(timeframe)
+        path = self._staging_path(symbol, timeframe)
+        state['status'] = 'running'
+        while state['ranges']:
+            low, high = state['ranges'][0]
+            cursor = high if state['cursor'] is None else state['cursor']
+            while cursor > low:
+                since = max(low, cursor - self.page_limit * period)
+                limit = max(1, (cursor - since) // period)
+                ohlcv = await self.fetcher.fetch_symbol(symbol, timeframe, limit, since=since)
+                state['pages'] += 1
+                candles = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+                candles = candles[(candles[:, 0] >= low) & (candles[:, 0] < cursor)]
+                if not len(candles):
+                    break
+                self._stage(path, state, candles)
+                metrics.increment('backfill_candles', len(candles))
+                cursor = int(candles[:, 0].min())
+                state['cursor'] = cursor
+                self.checkpoint()
+
+            # 저장소에 먼저 쓰고 manifest를 갱신한 뒤 스테이징을 지운다 (중간에 죽어도 병합은 다시 해도 같다)
+            self._merge(state, path)
+            covered = state['covered']
+            state['covered'] = [min(low, covered[0]), max(high, covered[1])] if covered else [low, high]
+            state['ranges'].pop(0)
+            state['cursor'] = None
+            state['staged'] = 0
+            self.checkpoint(force=True)
+            if os.path.exists(path):
+                os.remove(path)
+        state['status'] = 'done'
+
+    async def _guarded_job(self, semaphore, state, progress):
+        async with semaphore:
+            try:
+                await self._run_job(state)
+            except Exception as e:
+                error_message = str(e)
+                state['error'] = error_message
+                if is_invalid_symbol_error(error_message):
+                    state['status'] = 'invalid'
+                    if self.fetcher.on_invalid_symbol is not None:
+                        self.fetcher.on_invalid_symbol(state['symbol'])
+                else:
+                    # 커서는 남아 있으므로 다음 실행에서 이어 받는다
+                    state['status'] = 'error'
+                    metrics.error('backfill')
+                    print(f"Error backfilling {state['symbol']} {state['timeframe']}: {error_message}")
+            self.checkpoint(force=True)
+            progress.update(1)
+
+    def prepare(self, symbols, timeframes, start, end=None):
+        """작업 상태를 만들거나 불러와 남은 구간이 있는 작업 목록을 반환.
+
+        end(ms)가 없으면 타임프레임마다 현재 진행 중인 봉 직전까지(마감된 봉만) 받는다.
+        """
+        now = int(time.time() * 1000)
+        pending = []
+        for timeframe in timeframes:
+            period = self.period(timeframe)
+            timeframe_end = (now if end is None else end) // period * period
+            timeframe_start = -(-start // period) * period
+            for symbol in symbols:
+                key = self.key(symbol, timeframe)
+                state = self.jobs.setdefault(key, self._new_state(symbol, timeframe))
+                if not state['ranges']:
+                    state['ranges'] = self.plan(state, timeframe_start, timeframe_end)
+                    state['cursor'] = None
+                    state['staged'] = 0
+                if state['ranges']:
+                    state['status'] = 'pending'
+                    pending.append(state)
+        return pending
+
+    async def run_async(self, pending, verbose=True):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        with tqdm(total=len(pending), desc='backfill', disable=not verbose) as progress:
+            await asyncio.gather(*[self._guarded_job(semaphore, state, progress) for state in pending])
+
+    def run(self, symbols, timeframes, start, end=None, verbose=True):
+        """symbols x timeframes의 [start, end) 구간(ms)을 채우고 이번 실행의 요약을 반환."""
+        start_time = time.time()
+        pending = self.prepare(symbols, timeframes, start, end)
+        before = self.summary(pending)
+        try:
+            self.fetcher.loop.run_until_complete(self.run_async(pending, verbose))
+        finally:
+            # Ctrl+C 등으로 중단돼도 마지막 상태를 남긴다
+            self.checkpoint(force=True)
+        summary = self.summary(pending)
+        # 작업 상태의 수치는 이전 실행까지 누적이므로 이번 실행분만 남긴다
+        for name in ['rows', 'pages', 'gaps', 'duplicates', 'misaligned']:
+            summary[name] -= before[name]
+        summary['elapsed'] = round(time.time() - start_time, 3)
+        if verbose:
+            print(f"Backfill: {summary['done']}/{summary['jobs']} jobs done, {summary['rows']} candles, "
+                  f"{summary['pages']} requests, {summary['gaps']} missing bars, "
+                  f"{summary['duplicates']} duplicates, {summary['errors']} errors in {summary['elapsed']:.1f}s")
+        return summary
+
+    @staticmethod
+    def summary(states):
+        summary = {'jobs': len(states), 'done': 0, 'errors': 0, 'invalid': 0}
+        for name in ['rows', 'pages', 'gaps', 'duplicates', 'misaligned']:
+            summary[name] = sum(state[name] for state in states)
+        for state in states:
+            if state['status'] == 'done':
+                summary['done'] += 1
+            elif state['status'] == 'invalid':
+                summary['invalid'] += 1
+            elif state['status'] == 'error':
+                summary['errors'] += 1
+        return summary
@@ -0,0 +1,217 @@
+# backtest.py
+import time
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+from panel import PanelIndicators, PricePanel
+from store import OHLCVStore
+
+
+class Backtest:
+    """저장된 OHLCV로 다중 타임프레임 BB/RSI 교집합 신호를 배열 단위로 재생한다.
+
+    기준(가장 짧은) 타임프레임의 각 봉이 마감되는 시점에, 각 타임프레임에서 그 시점까지
+    마감된 봉의 신호만 사용하므로 미래 데이터를 보지 않는다. (실시간 분석은 진행 중인
+    상위 타임프레임 봉도 보지만, 백테스트는 보수적으로 확정된 봉만 쓴다.)
+    신호가 난 봉의 종가에 진입해 hold_bars 동안 보유하며, 평균회귀 방향
+    (상단 이탈/과매수 → 숏, 하단 이탈/과매도 → 롱)으로 거래한다.
+    """
+
+    def __init__(self, store=None, timeframes=('5m', '15m', '30m', '1h'), bb_window=20, num_of_std=2,
+                 rsi_window=14, overbought_threshold=70, oversold_threshold=30, signal='both', hold_bars=12,
+                 fee_rate=0.0004, funding_rate=0.0001, funding_interval='8h', chunk_size=64):
+        if signal not in ('bb', 'rsi', 'both'):
+            raise ValueError(f"unknown signal: {signal}")
+        self.store = store or OHLCVStore()
+        self.timeframes = sorted(timeframes, key=ccxt.Exchange.parse_timeframe)
+        self.params = {
+            'bb_window': bb_window,
+            'num_of_std': num_of_std,
+            'rsi_window': rsi_window,
+            'overbought_threshold': overbought_threshold,
+            'oversold_threshold': oversold_threshold,
+            'signal': signal,
+            'hold_bars': hold_bars,
+            'fee_rate': fee_rate,
+            'funding_rate': funding_rate,
+            'funding_interval': funding_interval,
+        }
+        self.chunk_size = chunk_size
+
+    # --- 데이터 ---
+
+    def available_symbols(self):
+        symbol_sets = [set(self.store.symbols(timeframe)) for timeframe in self.timeframes]
+        return sorted(set.intersection(*symbol_sets)) if symbol_sets else []
+
+    def load_panels(self, symbols, start=None, end=None):
+        """{timeframe: PricePanel}. 모든 패널의 심볼 순서는 symbols와 같다."""
+        panels = {}
+        for timeframe in self.timeframes:
+            raw_data = self.store.load_ohlcv(symbols, timeframe, start, end)
+            panels[timeframe] = Backtest.reindex(PricePanel.from_ohlcv(raw_data), symbols)
+        return panels
+
+    @staticmethod
+    def reindex(panel, symbols):
+        positions = {symbol: i for i, symbol in enumerate(panel.symbols)}
+        rows = np.array([positions.get(symbol, -1) for symbol in symbols])
+        arrays = []
+        for array in [panel.open, panel.high, panel.low, panel.close, panel.volume]:
+            reindexed = np.full((len(symbols), len(panel.timestamps)), np.nan)
+            if array.size:
+                reindexed[rows >= 0] = array[rows[rows >= 0]]
+            arrays.append(reindexed)
+        return PricePanel(symbols, panel.timestamps, *arrays)
+
+    # --- 신호 ---
+
+    @staticmethod
+    def band_state(close, rolling_mean, rolling_std, num_of_std):
+        upper_band = rolling_mean + rolling_std * num_of_std
+        lower_band = rolling_mean - rolling_std * num_of_std
+        return np.where(close > upper_band, 1, np.where(close < lower_band, -1, 0)).astype(np.int8)
+
+    @staticmethod
+    def rsi_state(rsi, overbought_threshold, oversold_threshold):
+        with np.errstate(invalid='ignore'):
+            return np.where(rsi > overbought_threshold, 1, np.where(rsi < oversold_threshold, -1, 0)).astype(np.int8)
+
+    @staticmethod
+    def timeframe_state(panel, params, indicators=None):
+        """타임프레임 하나의 봉별 상태 (+1: 상단/과매수, -1: 하단/과매도, 0: 없음).
+
+        indicators는 (rolling_mean, rolling_std, rsi)를 미리 계산해 둔 캐시를 넘길 때 쓴다.
+        """
+        if indicators is None:
+            indicators = (PanelIndicators.rolling_mean(panel.close, params['bb_window']),
+                          PanelIndicators.rolling_std(panel.close, params['bb_window']),
+                          PanelIndicators.calculate_rsi(panel, params['rsi_window']))
+        rolling_mean, rolling_std, rsi = indicators
+        bb = Backtest.band_state(panel.close, rolling_mean, rolling_std, params['num_of_std'])
+        rsi = Backtest.rsi_state(rsi, params['overbought_threshold'], params['oversold_threshold'])
+        if params['signal'] == 'bb':
+            return bb
+        if params['signal'] == 'rsi':
+            return rsi
+        return np.where(bb == rsi, bb, 0).astype(np.int8)
+
+    @staticmethod
+    def align(panel, timeframe, base_panel, base_timeframe):
+        """기준 봉 마감 시점마다, 그때까지 마감된 timeframe 봉의 열 위치 (-1이면 없음)."""
+        close_times = panel.timestamps + ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        decision_times = base_panel.timestamps + ccxt.Exchange.parse_timeframe(base_timeframe) * 1000
+        return np.searchsorted(close_times, decision_times, side='right') - 1
+
+    @staticmethod
+    def combined_state(panels, timeframes, params, indicator_cache=None):
+        base_timeframe = timeframes[0]
+        base_panel = panels[base_timeframe]
+        combined = None
+        for timeframe in timeframes:
+            indicators = indicator_cache(timeframe) if indicator_cache is not None else None
+            state = Backtest.timeframe_state(panels[timeframe], params, indicators)
+            positions = Backtest.align(panels[timeframe], timeframe, base_panel, base_timeframe)
+            aligned = np.where(positions >= 0, state[:, np.clip(positions, 0, None)], 0)
+            combined = aligned if combined is None else np.where(combined == aligned, combined, 0)
+        return combined.astype(np.int8)
+
+    # --- 시뮬레이션 ---
+
+    @staticmethod
+    def simulate(base_panel, base_timeframe, state, params):
+        """상태 배열로 포지션/수수료/펀딩을 계산해 심볼 x 시간 손익 배열과 포지션을 반환."""
+        close = base_panel.close
+        # 상단 이탈이면 숏(-1), 하단 이탈이면 롱(+1). 신호가 없으면 hold_bars-1봉 동안 유지
+        target = pd.DataFrame((-state).T.astype(np.float64)).replace(0, np.nan)
+        target = target.ffill(limit=max(params['hold_bars'] - 1, 0)).fillna(0).to_numpy().T
+
+        held = np.zeros_like(target)
+        held[:, 1:] = target[:, :-1]
+        returns = np.zeros_like(close)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+        returns = np.nan_to_num(returns)
+        held = np.where(np.isnan(close), 0.0, held)
+
+        turnover = np.abs(np.diff(held, axis=1, prepend=0.0))
+        funding_ms = ccxt.Exchange.parse_timeframe(params['funding_interval']) * 1000
+        funding_bar = (base_panel.timestamps % funding_ms == 0).astype(np.float64)
+        pnl = held * returns - turnover * params['fee_rate'] - held * funding_bar * params['funding_rate']
+        return pnl, held
+
+    @staticmethod
+    def trade_returns(pnl, held):
+        """같은 방향으로 이어진 보유 구간을 하나의 거래로 묶어 거래별 손익을 반환."""
+        previous = np.zeros_like(held)
+        previous[:, 1:] = held[:, :-1]
+        starts = (held != 0) & (held != previous)
+        trade_ids = np.cumsum(starts.ravel()).reshape(held.shape)
+        in_trade = held != 0
+        if not starts.any():
+            return np.empty(0)
+        # 포지션 청산 봉의 수수료도 그 거래에 포함
+        exits = (held == 0) & (previous != 0)
+        owner = np.where(in_trade | exits, trade_ids, 0)
+        return np.bincount(owner.ravel(), weights=pnl.ravel(), minlength=trade_ids.max() + 1)[1:]
+
+    @staticmethod
+    def report(portfolio_returns, trade_returns, held):
+        equity = np.cumprod(1 + portfolio_returns)
+        peak = np.maximum.accumulate(equity) if len(equity) else equity
+        drawdown = (equity / peak - 1) if len(equity) else equity
+        return {
+            'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+            'pnl': float(portfolio_returns.sum()),
+            'trades': int(len(trade_returns)),
+            'hit_rate': float((trade_returns > 0).mean()) if len(trade_returns) else float('nan'),
+            'avg_trade': float(trade_returns.mean()) if len(trade_returns) else float('nan'),
+            'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+            'exposure': float((held != 0).mean()) if held.size else 0.0,
+        }
+
+    def run(self, symbols=None, start=None, end=None, verbose=True):
+        symbols = symbols or self.available_symbols()
+        if not symbols:
+            raise ValueError("no stored OHLCV data for the backtest timeframes")
+        start_time = time.time()
+        base_timeframe = self.timeframes[0]
+
+        # 메모리를 제한하기 위해 심볼을 chunk_size개씩 나눠 계산하고 손익만 합친다
+        portfolio = None
+        timestamps = None
+        trade_returns = []
+        exposure = []
+        for i in range(0, len(symbols), self.chunk_size):
+            chunk = symbols[i:i + self.chunk_size]
+            panels = self.load_panels(chunk, start, end)
+            state = Backtest.combined_state(panels, self.timeframes, self.params)
+            pnl, held = Backtest.simulate(panels[base_timeframe], base_timeframe, state, self.params)
+
+            chunk_pnl = pd.Series(pnl.sum(axis=0), index=panels[base_timeframe].timestamps)
+            portfolio = chunk_pnl if portfolio is None else portfolio.add(chunk_pnl, fill_value=0)
+            trade_returns.append(Backtest.trade_returns(pnl, held))
+            exposure.append(held != 0)
+
+        # 전체 심볼에 자본을 균등 배분
+        portfolio_returns = (portfolio / len(symbols)).to_numpy()
+        result = Backtest.report(portfolio_returns, np.concatenate(trade_returns),
+                                 np.concatenate([e.ravel() for e in exposure]))
+        result['symbols'] = len(symbols)
+        result['bars'] = len(portfolio_returns)
+        result['elapsed'] = time.time() - start_time
+        result['equity'] = pd.Series(np.cumprod(1 + portfolio_returns),
+                                     index=pd.to_datetime(portfolio.index, unit='ms'))
+        if verbose:
+            Backtest.print_report(result)
+        return result
+
+    @staticmethod
+    def print_report(result):
+        print(f"Symbols: {result['symbols']}, bars: {result['bars']}, elapsed: {result['elapsed']:.2f} seconds")
+        print(f"Total return: {result['total_return'] * 100:.2f}%")
+        print(f"Trades: {result['trades']}, hit rate: {result['hit_rate'] * 100:.1f}%, "
+              f"avg trade: {result['avg_trade'] * 100:.3f}%")
+        print(f"Max drawdown: {result['max_drawdown'] * 100:.2f}%, exposure: {result['exposure'] * 100:.1f}%")
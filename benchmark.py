@@ -0,0 +1,1018 @@
+# benchmark.py
+import argparse
+import asyncio
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from arbitrage import SpreadScanner, Venue
+from calculate import TechnicalIndicators
+from core import TradingCore
+from panel import PanelIndicators, PricePanel
+from store import OHLCVStore
+from streaming import StreamingBollinger, StreamingEMA, StreamingIchimoku, StreamingRSI, StreamingSMA
+
+
+def synthetic_coins_data(n_symbols=300, n_bars=1200, timeframe_ms=3600000, seed=0):
+    """랜덤워크 OHLCV로 fetch_coins_data와 같은 형태의 {symbol: DataFrame}을 만든다."""
+    rng = np.random.default_rng(seed)
+    end = int(time.time() * 1000) // timeframe_ms * timeframe_ms
+    timestamps = end - timeframe_ms * np.arange(n_bars)[::-1]
+    coins_data = {}
+    for i in range(n_symbols):
+        start_price = 10 ** rng.uniform(-3, 4)
+        close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+        open = np.concatenate([[start_price], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.005, n_bars)) * close
+        coins_data[f'SYN{i}/USDT:USDT'] = pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps, unit='ms'),
+            'open': open,
+            'high': np.maximum(open, close) + spread,
+            'low': np.minimum(open, close) - spread,
+            'close': close,
+            'volume': rng.uniform(1, 1000, n_bars),
+        })
+    return coins_data
+
+
+def _best_of(function, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def gapped_coins_data(coins_data, share=0.5, drop=0.1, seed=0):
+    """share만큼의 심볼에서 봉을 drop 비율로 빼고, 최근 20봉 안에서도 하나는 반드시 뺀다 (거래 중지/누락 봉)."""
+    rng = np.random.default_rng(seed)
+    gapped = {}
+    for i, (symbol, df) in enumerate(coins_data.items()):
+        if i % round(1 / share) == 0:
+            keep = rng.random(len(df)) >= drop
+            keep[len(df) - 1 - rng.integers(1, 20)] = False
+            keep[-1] = True
+            df = df[keep].reset_index(drop=True)
+        gapped[symbol] = df
+    return gapped
+
+
+def short_coins_data(coins_data, share=0.5, seed=0):
+    """share만큼의 심볼을 5~40봉만 남긴다 (최근 상장)."""
+    rng = np.random.default_rng(seed)
+    return {symbol: df.iloc[-rng.integers(5, 41):].reset_index(drop=True) if i % round(1 / share) == 0 else df
+            for i, (symbol, df) in enumerate(coins_data.items())}
+
+
+def benchmark_panel(n_symbols=300, n_bars=1200, repeat=3):
+    """DataFrame별 TradingCore 경로와 패널 엔진을 같은 합성 데이터로 비교.
+
+    정렬된 데이터 외에 일부 심볼에 빠진 봉이 있는 경우와 봉 수가 윈도우보다 적은 경우도 신호가 같은지 본다.
+    """
+    aligned = synthetic_coins_data(n_symbols, n_bars)
+    cases = {'aligned': aligned, 'gapped': gapped_coins_data(aligned), 'short': short_coins_data(aligned)}
+
+    def run(coins_data):
+        def per_dataframe():
+            # TradingCore는 DataFrame에 열을 추가하므로 복사본으로 돌린다
+            frames = {symbol: df.copy() for symbol, df in coins_data.items()}
+            return TradingCore.find_bollinger_extremes(frames), TradingCore.find_extreme_rsi(frames)
+
+        def vectorized():
+            return TradingCore.find_extremes_vectorized(coins_data)
+
+        per_dataframe_time, (bb_signals, rsi_signals) = _best_of(per_dataframe, repeat)
+        vectorized_time, (panel_bb_signals, panel_rsi_signals) = _best_of(vectorized, repeat)
+        same_signals = (sorted(bb_signals) == sorted(panel_bb_signals)
+                        and sorted((s, status) for s, status, _ in rsi_signals)
+                        == sorted((s, status) for s, status, _ in panel_rsi_signals))
+        return {'per_dataframe': per_dataframe_time, 'panel': vectorized_time, 'same_signals': same_signals,
+                'bb_signals': len(bb_signals), 'rsi_signals': len(rsi_signals)}
+
+    results = {name: run(coins_data) for name, coins_data in cases.items()}
+    print(f"symbols={n_symbols} bars={n_bars}")
+    for name, result in results.items():
+        print(f"  {name:8s}: per-DataFrame {result['per_dataframe'] * 1000:8.1f} ms  panel "
+              f"{result['panel'] * 1000:8.1f} ms ({result['per_dataframe'] / result['panel']:.1f}x)  "
+              f"signals bb {result['bb_signals']:3d} rsi {result['rsi_signals']:3d}  same {result['same_signals']}")
+    # 이전 기록과 비교할 수 있도록 정렬된 데이터 결과는 최상위 키에 둔다
+    aligned_result = results.pop('aligned')
+    return dict(aligned_result, **results)
+
+
+def benchmark_indicators(n_symbols=300, n_bars=1200, repeat=3):
+    """지표별로 심볼마다 TechnicalIndicators(pandas)를 부르는 경우와 PanelIndicators 한 번을 비교."""
+    coins_data = synthetic_coins_data(n_symbols, n_bars)
+    panel = PricePanel.from_coins_data(coins_data)
+    indicators = {
+        'sma': (TechnicalIndicators.calculate_sma, PanelIndicators.calculate_sma),
+        'ema': (TechnicalIndicators.calculate_ema, PanelIndicators.calculate_ema),
+        'rsi': (TechnicalIndicators.calculate_rsi, PanelIndicators.calculate_rsi),
+        'bollinger': (TechnicalIndicators.calculate_bollinger_bands, PanelIndicators.calculate_bollinger_bands),
+        'ichimoku': (TechnicalIndicators.calculate_ichimoku, PanelIndicators.calculate_ichimoku),
+        'all (chart)': (lambda df: TechnicalIndicators.add_technical_indicators(df.copy()), None),
+    }
+
+    print(f"symbols={n_symbols} bars={n_bars}")
+    results = {}
+    for name, (per_dataframe, vectorized) in indicators.items():
+        pandas_time, _ = _best_of(lambda: [per_dataframe(df) for df in coins_data.values()], repeat)
+        results[name] = {'pandas': pandas_time}
+        line = f"  {name:12s}: pandas {pandas_time * 1000:8.1f} ms"
+        if vectorized is not None:
+            panel_time, _ = _best_of(lambda: vectorized(panel), repeat)
+            results[name]['panel'] = panel_time
+            line += f"  panel {panel_time * 1000:8.1f} ms  ({pandas_time / panel_time:.1f}x)"
+        print(line)
+    return results
+
+
+def benchmark_streaming(n_bars=5000, updates_per_bar=4, seed=0):
+    """봉마다 진행 중 캔들을 여러 번 갱신하며 스트리밍 지표를 배치 함수와 비교하고 갱신당 시간을 잰다."""
+    df = synthetic_coins_data(1, n_bars, seed=seed)['SYN0/USDT:USDT']
+    timestamps = df['timestamp'].astype('int64').to_numpy()
+    high, low, close = df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy()
+    rng = np.random.default_rng(seed)
+
+    upper_band, lower_band = TechnicalIndicators.calculate_bollinger_bands(df)
+    ichimoku = TechnicalIndicators.calculate_ichimoku(df)
+    batch = {
+        'sma': TechnicalIndicators.calculate_sma(df).to_numpy(),
+        'ema': TechnicalIndicators.calculate_ema(df).to_numpy(),
+        'rsi': TechnicalIndicators.calculate_rsi(df).to_numpy(),
+        'bollinger': np.column_stack([upper_band, lower_band]),
+        'ichimoku': np.column_stack([line.to_numpy() for line in ichimoku[:4]]),
+    }
+    indicators = {
+        'sma': (StreamingSMA(), lambda i, c: (c,)),
+        'ema': (StreamingEMA(), lambda i, c: (c,)),
+        'rsi': (StreamingRSI(), lambda i, c: (c,)),
+        'bollinger': (StreamingBollinger(), lambda i, c: (c,)),
+        'ichimoku': (StreamingIchimoku(), lambda i, c: (high[i], low[i], c)),
+    }
+
+    print(f"bars={n_bars} updates/bar={updates_per_bar}")
+    results = {}
+    for name, (indicator, arguments) in indicators.items():
+        streamed = []
+        start_time = time.perf_counter()
+        for i in range(n_bars):
+            # 진행 중인 봉이 임의의 값으로 몇 번 바뀐 뒤 최종 종가로 마감
+            for noise in rng.normal(0, 0.002, updates_per_bar - 1):
+                indicator.update(timestamps[i], *arguments(i, close[i] * (1 + noise)))
+            value = indicator.update(timestamps[i], *arguments(i, close[i]))
+            streamed.append(value[:4] if name == 'ichimoku' else value)
+        elapsed = time.perf_counter() - start_time
+
+        expected = batch[name]
+        streamed = np.array(streamed, dtype=np.float64).reshape(expected.shape)
+        same_nan = np.array_equal(np.isnan(streamed), np.isnan(expected))
+        with np.errstate(invalid='ignore'):
+            error = np.nanmax(np.abs(streamed - expected) / np.abs(expected))
+        per_update = elapsed / (n_bars * updates_per_bar) * 1e6
+        print(f"  {name:10s}: {per_update:6.2f} us/update  max rel err={error:.2e}  nan mask equal={same_nan}")
+        results[name] = {'us_per_update': per_update, 'max_rel_error': float(error), 'nan_mask_equal': same_nan}
+    return results
+
+
+def check_store():
+    """진행 중이던 봉이 저장소에 남지 않는지 확인한다 (가격이 바뀐 뒤 두 번 dump)."""
+    from data import MarketData
+    from fetcher import OHLCVFetcher, WeightRateLimiter
+    from replay import ReplayData, ReplayExchange
+
+    directory = tempfile.mkdtemp(prefix='store_check_')
+    try:
+        # append는 마지막 저장 봉과 같은 타임스탬프를 새 값으로 덮어쓴다
+        store = OHLCVStore(os.path.join(directory, 'append'))
+        bars = np.array([[i * 60_000, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(10)])
+        store.append('A/USDT:USDT', '1m', bars)
+        assert store.append('A/USDT:USDT', '1m', [[9 * 60_000, 1.0, 3.0, 0.5, 2.5, 20.0],
+                                                  [10 * 60_000, 2.5, 2.5, 2.5, 2.5, 1.0]]) == 1
+        stored = store.load_array('A/USDT:USDT', '1m')
+        assert len(stored) == 11 and stored[9].tolist() == [9 * 60_000, 1.0, 3.0, 0.5, 2.5, 20.0], stored[-2:]
+
+        data = ReplayData(5, history=300)
+        exchange = ReplayExchange(data, weight_per_minute=0, universe_path=os.path.join(directory, 'markets.json'))
+        fetcher = OHLCVFetcher(exchange.connect_async, limiter=WeightRateLimiter(weight_per_minute=10 ** 9))
+        store = OHLCVStore(os.path.join(directory, 'dump'))
+        MarketData.fetch_and_save_all_timeframes(exchange, 100, fetcher, store, now=data.end_time)
+        for timeframe in store.timeframes():
+            for symbol in data.symbols:
+                # 마감된 봉만 저장된다
+                expected = data.ohlcv_now(symbol, timeframe)[-100:-1]
+                assert np.array_equal(store.load_array(symbol, timeframe), expected), (symbol, timeframe)
+        # 가격이 움직인 뒤 그 봉이 마감되면 마감 가격으로 저장된다
+        data.move(0.05)
+        MarketData.fetch_and_save_all_timeframes(exchange, 100, fetcher, store, now=data.end_time + 3_600_000)
+        for timeframe in store.timeframes():
+            for symbol in data.symbols:
+                assert store.load_array(symbol, timeframe)[-1, 4] == data.ohlcv_now(symbol, timeframe)[-1, 4]
+        fetcher.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_store(n_symbols=100, n_bars=20000, range_bars=500, repeat=3):
+    """기존 CSV 덤프 레이아웃과 열 지향 저장소의 쓰기/전체 읽기/구간 읽기 시간을 비교."""
+    check_store()
+    coins_data = synthetic_coins_data(n_symbols, n_bars, timeframe_ms=300000)
+    directory = tempfile.mkdtemp(prefix='ohlcv_bench_')
+    csv_directory = os.path.join(directory, 'csv', '5m')
+    os.makedirs(csv_directory)
+    store = OHLCVStore(os.path.join(directory, 'store'))
+    first_timestamp = next(iter(coins_data.values()))['timestamp'].iloc[n_bars - range_bars]
+    start = int(first_timestamp.value // 10 ** 6)
+
+    def csv_path(symbol):
+        return os.path.join(csv_directory, f"{OHLCVStore.format_symbol(symbol)}.csv")
+
+    def write_csv():
+        for symbol, df in coins_data.items():
+            df.to_csv(csv_path(symbol), index=False)
+
+    def write_store():
+        shutil.rmtree(store.root, ignore_errors=True)
+        for symbol, df in coins_data.items():
+            store.append(symbol, '5m', df)
+
+    def read_csv_all():
+        return {symbol: pd.read_csv(csv_path(symbol), parse_dates=['timestamp']) for symbol in coins_data}
+
+    def read_csv_range():
+        data = read_csv_all()
+        return {symbol: df[df['timestamp'] >= first_timestamp] for symbol, df in data.items()}
+
+    try:
+        timings = {
+            'write': {'csv': _best_of(write_csv, repeat)[0], 'store': _best_of(write_store, repeat)[0]},
+            'read_all': {'csv': _best_of(read_csv_all, repeat)[0],
+                         'store': _best_of(lambda: store.load_many(coins_data, '5m'), repeat)[0]},
+            'read_range': {'csv': _best_of(read_csv_range, repeat)[0],
+                           'store': _best_of(lambda: store.load_ohlcv(coins_data, '5m', start=start), repeat)[0]},
+        }
+        csv_bytes = sum(os.path.getsize(csv_path(symbol)) for symbol in coins_data)
+        store_bytes = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(store.root) for name in names)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"symbols={n_symbols} bars={n_bars} range={range_bars} bars")
+    print("  checks    : dump across a price change ok")
+    for name, timing in timings.items():
+        csv_time, store_time = timing['csv'], timing['store']
+        print(f"  {name.replace('_', ' '):10s}: csv {csv_time * 1000:9.1f} ms  store {store_time * 1000:9.1f} ms"
+              f"  ({csv_time / store_time:.1f}x)")
+    print(f"  size      : csv {csv_bytes / 2 ** 20:9.1f} MB  store {store_bytes / 2 ** 20:9.1f} MB")
+    return {'timings': timings, 'csv_bytes': csv_bytes, 'store_bytes': store_bytes}
+
+
+class _NullRenderer:
+    """스캔 벤치마크에서 차트 렌더링을 빼기 위한 렌더러."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, data, symbol, timeframe):
+        self.submitted += 1
+
+    def warm(self):
+        return []
+
+
+def _measure(function, memory=False):
+    """(wall 시간, 결과, 추적된 최대 메모리 바이트, 순증가 할당 블록 수). memory면 tracemalloc으로 측정."""
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    if memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    try:
+        result = function()
+    finally:
+        elapsed = time.perf_counter() - start_time
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+        if memory:
+            tracemalloc.stop()
+    return elapsed, result, peak, sys.getallocatedblocks() - blocks
+
+
+def check_cache():
+    """limit이 번갈아 바뀌어도 CandleCache가 가진 봉을 잘라내지 않고 델타만 받는지 확인한다."""
+    from cache import CandleCache
+
+    directory = tempfile.mkdtemp(prefix='cache_check_')
+    try:
+        cache = CandleCache(directory)
+        period = 3_600_000
+        now = 2000 * period / 1000
+        candles = [[i * period, 1.0, 1.0, 1.0, 1.0, 1.0] for i in range(2000 - 1212, 2001)]
+        assert cache.plan('A/USDT:USDT', '1h', 1212, now=now)[0] == 'full'
+        cache.merge('A/USDT:USDT', '1h', candles, 1212, now=now)
+        for step, limit in enumerate([101, 1212, 101, 202, 1212], start=1):
+            # 1h만 닫힌 스캔(101봉)과 12h까지 닫힌 스캔(1212봉)이 번갈아 온다
+            now += period / 1000
+            mode, since, fetch_limit = cache.plan('A/USDT:USDT', '1h', limit, now=now)
+            assert mode == 'delta' and fetch_limit == 3, (limit, mode, fetch_limit)
+            cache.merge('A/USDT:USDT', '1h', [[since, 1.0, 1.0, 1.0, 1.0, 1.0],
+                                              [since + period, 1.0, 1.0, 1.0, 1.0, 1.0]], limit, now=now)
+            window = cache.window('A/USDT:USDT', '1h', limit)
+            assert len(window) == limit and window[-1, 0] == (2000 + step) * period, (limit, window[-1])
+
+        cache = CandleCache(directory, max_bars=500)
+        cache.merge('A/USDT:USDT', '1h', candles, 1212, now=now)
+        cache.merge('A/USDT:USDT', '1h', [], 101, now=now)
+        assert len(cache.window('A/USDT:USDT', '1h', 10 ** 6)) == 500
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_scan(sizes=(50, 300, 1000), mode='all', latency=0.0, resample_bars=100, charts=False, memory=True,
+                   seed=0):
+    """리플레이 거래소 위에서 Analysis 스캔 전체를 돌려 wall 시간, 요청 수/가중치, 메모리를 잰다.
+
+    cold는 빈 캔들 캐시, warm은 같은 캐시로 한 번 더 돌린 결과다. 거래소 한도 대기는 빼고 파이프라인
+    자체를 보기 위해 리미터 한도를 넉넉하게 둔다.
+    """
+    from analysis import Analysis
+    from cache import CandleCache
+    from fetcher import WeightRateLimiter
+    from replay import ReplayData, ReplayExchange
+
+    check_cache()
+    directory = tempfile.mkdtemp(prefix='scan_bench_')
+    results = {}
+    try:
+        for n_symbols in sizes:
+            def build(cache_directory):
+                exchange = ReplayExchange(ReplayData(n_symbols, seed=seed), latency=latency, weight_per_minute=0,
+                                          universe_path=os.path.join(directory, 'markets.json'))
+                analysis = Analysis(exchange, resample_bars=resample_bars, report_path=None)
+                analysis.fetcher.cache = CandleCache(cache_directory)
+                analysis.fetcher.limiter = WeightRateLimiter(weight_per_minute=10 ** 9)
+                if not charts:
+                    analysis.renderer = _NullRenderer()
+                return exchange, analysis
+
+            def scan(exchange, analysis):
+                if mode == 'all':
+                    return analysis.analyze_all_timeframes()
+                return analysis.process_timeframe('1h', exchange.get_symbols())
+
+            runs = {}
+            exchange, analysis = build(os.path.join(directory, f'cache_{n_symbols}'))
+            for name in ['cold', 'warm']:
+                before = exchange.stats
+                elapsed, _, _, blocks = _measure(lambda: scan(exchange, analysis))
+                after = exchange.stats
+                runs[name] = {'wall': elapsed, 'requests': after['requests'] - before['requests'],
+                              'weight': after['weight'] - before['weight'], 'blocks': blocks}
+            analysis.fetcher.close()
+            if memory:
+                # tracemalloc은 느리므로 시간 측정과 따로, 새 캐시로 cold 스캔을 한 번 더 돌린다
+                exchange, analysis = build(os.path.join(directory, f'cache_{n_symbols}_memory'))
+                _, _, peak, _ = _measure(lambda: scan(exchange, analysis), memory=True)
+                runs['cold']['peak_memory'] = peak
+                analysis.fetcher.close()
+            results[n_symbols] = runs
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"mode={mode} latency={latency * 1000:.0f}ms resample_bars={resample_bars} charts={charts}")
+    for n_symbols, runs in results.items():
+        for name, run in runs.items():
+            peak = f"  peak {run['peak_memory'] / 2 ** 20:7.1f} MB" if 'peak_memory' in run else ''
+            print(f"  {n_symbols:5d} symbols {name}: {run['wall'] * 1000:9.1f} ms  requests {run['requests']:5d}  "
+                  f"weight {run['weight']:6d}  blocks {run['blocks']:+8d}{peak}")
+    return results
+
+
+def benchmark_prescreen(n_symbols=300, cycles=5, volatility=0.02, margin=0.002, latency=0.0, seed=0):
+    """같은 리플레이 데이터로 전체 스캔과 티커 사전 선별 스캔을 번갈아 돌려 요청 수와 신호 일치를 비교.
+
+    매 주기마다 모든 심볼의 현재가를 volatility만큼 움직인다 (진행 중인 봉 안에서의 가격 변화).
+    """
+    from analysis import Analysis
+    from cache import CandleCache
+    from fetcher import WeightRateLimiter
+    from replay import ReplayData, ReplayExchange
+
+    directory = tempfile.mkdtemp(prefix='prescreen_bench_')
+    data = ReplayData(n_symbols, seed=seed)
+
+    def build(name, prescreen_margin):
+        exchange = ReplayExchange(data, latency=latency, weight_per_minute=0,
+                                  universe_path=os.path.join(directory, f'{name}_markets.json'))
+        analysis = Analysis(exchange, report_path=None, prescreen_margin=prescreen_margin)
+        analysis.fetcher.cache = CandleCache(os.path.join(directory, name))
+        analysis.fetcher.limiter = WeightRateLimiter(weight_per_minute=10 ** 9)
+        analysis.renderer = _NullRenderer()
+        return exchange, analysis
+
+    keys = ['common_bb_symbols', 'common_rsi_symbols', 'intersected_symbols']
+    runs = {'full': build('full', None), 'prescreen': build('prescreen', margin)}
+    results = {'cycles': [], 'identical': True}
+    try:
+        for cycle in range(cycles):
+            if cycle:
+                data.move(volatility, cycle)
+            cycle_result = {}
+            for name, (exchange, analysis) in runs.items():
+                before = exchange.stats
+                start_time = time.perf_counter()
+                result = analysis.analyze_all_timeframes()
+                cycle_result[name] = {'wall': time.perf_counter() - start_time,
+                                      'requests': exchange.stats['requests'] - before['requests'],
+                                      'signals': tuple(sorted(result[key]) for key in keys)}
+            cycle_result['identical'] = cycle_result['full']['signals'] == cycle_result['prescreen']['signals']
+            results['identical'] &= cycle_result['identical']
+            results['cycles'].append(cycle_result)
+    finally:
+        for exchange, analysis in runs.values():
+            analysis.fetcher.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"symbols={n_symbols} volatility={volatility} margin={margin}")
+    for cycle, cycle_result in enumerate(results['cycles']):
+        full, prescreen = cycle_result['full'], cycle_result['prescreen']
+        print(f"  cycle {cycle}: full {full['wall'] * 1000:8.1f} ms {full['requests']:5d} requests | "
+              f"prescreen {prescreen['wall'] * 1000:8.1f} ms {prescreen['requests']:5d} requests | "
+              f"signals {sum(len(signals) for signals in full['signals'])} identical={cycle_result['identical']}")
+    later = results['cycles'][1:]
+    if later:
+        results['full_requests'] = float(np.mean([cycle['full']['requests'] for cycle in later]))
+        results['prescreen_requests'] = float(np.mean([cycle['prescreen']['requests'] for cycle in later]))
+        results['full_wall'] = float(np.mean([cycle['full']['wall'] for cycle in later]))
+        results['prescreen_wall'] = float(np.mean([cycle['prescreen']['wall'] for cycle in later]))
+    return results
+
+
+class _Crash(BaseException):
+    """백필 도중 프로세스가 죽은 것처럼 모든 작업을 멈추게 하는 예외 (작업별 except Exception에 잡히지 않는다)."""
+
+
+def check_backfill():
+    """Backfill.validate와 Backfill.plan의 동작을 작은 입력으로 직접 확인한다 (실패하면 AssertionError)."""
+    from backfill import Backfill
+
+    period = 60_000
+    bars = [[i * period, 1.0, 1.0, 1.0, 1.0, 1.0] for i in range(10, 20)]
+    # 순서가 섞이고, 중복 2개, 봉 경계가 아닌 행 1개, 13~14번 봉이 빠진 입력
+    candles = np.array(bars[5:] + bars[:3] + bars[5:7] + [[15 * period + 1, 1.0, 1.0, 1.0, 1.0, 1.0]] + bars[5:])
+    candles = candles[candles[:, 0] != 13 * period]
+    candles = candles[candles[:, 0] != 14 * period]
+    valid, report = Backfill.validate(candles, period)
+    assert valid[:, 0].tolist() == [i * period for i in [10, 11, 12, 15, 16, 17, 18, 19]], valid[:, 0]
+    assert report['duplicates'] == 7 and report['misaligned'] == 1, report
+    assert report['gaps'] == 2 and report['gap_ranges'] == [[13 * period, 15 * period]], report
+    # 저장소와의 이음매: 앞쪽 저장 봉이 7번이면 8~9번, 뒤쪽 저장 봉이 22번이면 20~21번이 빠진 것
+    _, report = Backfill.validate(np.array(bars), period, before=7 * period)
+    assert report['gaps'] == 2 and report['gap_ranges'] == [[8 * period, 10 * period]], report
+    _, report = Backfill.validate(np.array(bars), period, after=22 * period)
+    assert report['gaps'] == 2 and report['gap_ranges'] == [[20 * period, 22 * period]], report
+    _, report = Backfill.validate(np.array(bars), period, before=9 * period, after=20 * period)
+    assert report['gaps'] == 0, report
+
+    directory = tempfile.mkdtemp(prefix='backfill_check_')
+    try:
+        store = OHLCVStore(directory)
+        backfill = Backfill.__new__(Backfill)
+        backfill.store = store
+        state = Backfill._new_state('A/USDT:USDT', '1m')
+        # 빈 저장소: manifest가 덮었다고 해도 전체를 받는다
+        state['covered'] = [0, 100 * period]
+        assert backfill.plan(state, 0, 100 * period) == [[0, 100 * period]]
+        store.append('A/USDT:USDT', '1m', np.array(bars))
+        state['covered'] = None
+        assert backfill.plan(state, 0, 100 * period) == [[20 * period, 100 * period], [0, 10 * period]]
+        # 저장 봉과 겹치는 힌트는 봉이 없는 구간(상장 이전)을 건너뛴다
+        state['covered'] = [0, 20 * period]
+        assert backfill.plan(state, 0, 100 * period) == [[20 * period, 100 * period]]
+        # 저장 봉과 겹치지 않는 힌트는 무시한다
+        state['covered'] = [50 * period, 100 * period]
+        assert backfill.plan(state, 0, 100 * period) == [[20 * period, 100 * period], [0, 10 * period]]
+        assert backfill.plan(state, 10 * period, 20 * period) == []
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def benchmark_backfill(n_symbols=20, days=30, timeframes=('5m', '1h'), latency=0.05, concurrency=20,
+                       crash_after=None, seed=0):
+    """리플레이 거래소에서 한 작업씩 받는 경우와 동시 백필을 비교하고, 중간에 끊긴 실행이 이어서 끝나는지 확인.
+
+    crash_after번째 요청(기본은 전체 요청의 절반) 이후, 디스크의 manifest에 구간 중간의 커서가 하나라도 기록된 뒤의
+    첫 요청에서 모든 작업을 멈춰 마지막 체크포인트 이후를 저장하지 못하고 프로세스가 죽은 상태를 흉내 낸다.
+    그 뒤 manifest만 읽어 이어 받고, 저장소의 모든 봉이 리플레이 데이터와 같은지, 실제로 커서에서 이어 받은
+    작업이 있는지 검사한다. 이어 받을 커서가 생기도록 가장 짧은 타임프레임의 작업은 항상 두 페이지 이상이 되게 한다.
+    """
+    from backfill import Backfill
+    from fetcher import OHLCVFetcher, WeightRateLimiter
+    from replay import ReplayData, ReplayExchange, ReplayLimiter
+
+    check_backfill()
+    directory = tempfile.mkdtemp(prefix='backfill_bench_')
+    history = days * 288 + 288
+    data = ReplayData(n_symbols, history=history, seed=seed)
+    end = data.end_time
+    start = end - days * 86_400_000
+    shortest_bars = days * 86_400_000 // min(Backfill.period(timeframe) for timeframe in timeframes)
+    page_limit = min(1000, max(1, shortest_bars // 2))
+
+    class CrashingBackfill(Backfill):
+        # 디스크에 쓴 manifest에 구간 중간의 커서(이어 받을 위치)가 있는지 기억한다
+        cursor_saved = False
+
+        def checkpoint(self, force=False):
+            saved_at = self.saved_at
+            super().checkpoint(force)
+            if self.saved_at != saved_at:
+                self.cursor_saved = any(state['ranges'] and state['cursor'] is not None
+                                        for state in self.jobs.values())
+
+    class CrashingLimiter(ReplayLimiter):
+        def __init__(self, crash_after, ready):
+            super().__init__(0)
+            self.crash_after = crash_after
+            self.ready = ready
+            self.requests = 0
+
+        def consume(self, weight):
+            if self.requests >= self.crash_after and self.ready():
+                raise _Crash()
+            self.requests += 1
+            return super().consume(weight)
+
+    def build(name, max_concurrency, crash_after=None):
+        exchange = ReplayExchange(data, latency=latency, weight_per_minute=0,
+                                  universe_path=os.path.join(directory, f'{name}_markets.json'))
+        fetcher = OHLCVFetcher(exchange.connect_async, limiter=WeightRateLimiter(weight_per_minute=10 ** 9))
+        store = OHLCVStore(os.path.join(directory, name))
+        if crash_after is None:
+            return exchange, Backfill(fetcher, store, page_limit=page_limit, max_concurrency=max_concurrency,
+                                      checkpoint_interval=0.2)
+        # 페이지마다 체크포인트를 써서 요청 수만으로 충돌 시점이 정해지게 한다
+        backfill = CrashingBackfill(fetcher, store, page_limit=page_limit, max_concurrency=max_concurrency,
+                                    checkpoint_interval=0)
+        # 마켓 적재 요청은 생성자에서 끝났으므로 이후의 캔들 요청만 센다
+        exchange.limiter = CrashingLimiter(crash_after, lambda: backfill.cursor_saved)
+        return exchange, backfill
+
+    def verify(store):
+        for timeframe in timeframes:
+            period = Backfill.period(timeframe)
+            first = -(-start // period) * period
+            for symbol in data.symbols:
+                expected = data.ohlcv(symbol, timeframe)
+                expected = expected[(expected[:, 0] >= first) & (expected[:, 0] < end // period * period)]
+                if not np.array_equal(store.load_array(symbol, timeframe), expected):
+                    return False
+        return True
+
+    def crash(backfill):
+        loop = backfill.fetcher.loop
+        pending = backfill.prepare(data.symbols, timeframes, start, end)
+        try:
+            loop.run_until_complete(backfill.run_async(pending, verbose=False))
+        except _Crash:
+            pass
+        else:
+            raise AssertionError('backfill finished before the simulated crash')
+        # 남은 작업은 체크포인트 없이 취소한다 (죽은 프로세스처럼)
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+    results = {}
+    try:
+        # 한 작업씩 순서대로 (페이지마다 지연을 그대로 기다림)
+        exchange, backfill = build('serial', 1)
+        start_time = time.perf_counter()
+        summary = backfill.run(data.symbols, timeframes, start, end, verbose=False)
+        results['serial'] = {'wall': time.perf_counter() - start_time, 'requests': summary['pages'],
+                             'rows': summary['rows']}
+        backfill.fetcher.close()
+
+        exchange, backfill = build('concurrent', concurrency)
+        start_time = time.perf_counter()
+        summary = backfill.run(data.symbols, timeframes, start, end, verbose=False)
+        results['concurrent'] = {'wall': time.perf_counter() - start_time, 'requests': summary['pages'],
+                                 'rows': summary['rows'], 'identical': verify(backfill.store)}
+        backfill.fetcher.close()
+
+        # crash_after번째 요청에서 죽은 뒤 새 프로세스처럼 manifest만 읽어 이어 받기
+        crash_after = crash_after or results['concurrent']['requests'] // 2
+        exchange, backfill = build('resume', concurrency, crash_after)
+        crash(backfill)
+        backfill.fetcher.close()
+        before_crash = exchange.limiter.requests
+        exchange, backfill = build('resume', concurrency)
+        resumed = sum(1 for state in backfill.jobs.values() if state['ranges'] and state['cursor'] is not None)
+        finished = sum(1 for state in backfill.jobs.values() if state['status'] == 'done' and not state['ranges'])
+        summary = backfill.run(data.symbols, timeframes, start, end, verbose=False)
+        results['resume'] = {'before_crash': before_crash, 'after_crash': summary['pages'], 'resumed_jobs': resumed,
+                             'finished_before_crash': finished, 'done': summary['done'],
+                             'identical': verify(backfill.store)}
+        backfill.fetcher.close()
+
+        # 같은 구간을 다시 실행하면 받을 것이 없어야 한다
+        exchange, backfill = build('resume', concurrency)
+        summary = backfill.run(data.symbols, timeframes, start, end, verbose=False)
+        results['rerun_requests'] = summary['pages']
+        backfill.fetcher.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    serial, concurrent, resume = results['serial'], results['concurrent'], results['resume']
+    assert concurrent['identical'] and resume['identical'], results
+    assert resume['resumed_jobs'] > 0, 'no job was resumed from a checkpointed cursor'
+    assert resume['after_crash'] < concurrent['requests'], 'the resumed run started over'
+    assert results['rerun_requests'] == 0, results
+    print(f"symbols={n_symbols} days={days} timeframes={','.join(timeframes)} latency={latency * 1000:.0f}ms")
+    print("  checks    : validate/plan ok")
+    print(f"  serial    : {serial['wall']:8.2f} s {serial['requests']:6d} requests {serial['rows']:9d} candles")
+    print(f"  concurrent: {concurrent['wall']:8.2f} s {concurrent['requests']:6d} requests "
+          f"({serial['wall'] / concurrent['wall']:.1f}x) identical={concurrent['identical']}")
+    print(f"  resume    : crash after {resume['before_crash']} requests, {resume['resumed_jobs']} jobs resumed from a "
+          f"cursor, {resume['finished_before_crash']} already finished, {resume['after_crash']} requests after, "
+          f"{resume['done']} jobs done, identical={resume['identical']}, rerun requests={results['rerun_requests']}")
+    # 실제 바이낸스 가중치 한도(2400/분, 80% 사용)에서 1000봉 페이지(가중치 5)로 1년치 5분봉을 받는 데 걸리는 시간
+    pages_per_minute = 2400 * 0.8 / 5
+    year_pages = -(-365 * 288 // 1000)
+    results['year_5m_minutes_per_300_symbols'] = 300 * year_pages / pages_per_minute
+    print(f"  projected : 1 year of 5m for 300 perps = {300 * year_pages} requests, "
+          f"~{results['year_5m_minutes_per_300_symbols']:.0f} min at 2400 weight/min")
+    return results
+
+
+def benchmark_shard(n_symbols=1000, shards=(1, 2, 4), latency=0.02, seed=0):
+    """단일 프로세스 Analysis와 ShardedScanner(샤드 수별)의 전체 스캔 시간을 비교하고 결과가 같은지 확인.
+
+    샤드마다 같은 인자로 만든 리플레이 거래소와 자기 캔들 캐시를 쓰며, 첫 스캔(cold)과 두 번째 스캔(warm)을 잰다.
+    """
+    import functools
+
+    from analysis import Analysis
+    from fetcher import WeightRateLimiter
+    from replay import ReplayExchange
+    from shard import ShardedScanner
+
+    directory = tempfile.mkdtemp(prefix='shard_bench_')
+    end_time = int(time.time() * 1000)
+    keys = ['common_bb_symbols', 'common_rsi_symbols', 'intersected_symbols']
+
+    def factory(name):
+        return functools.partial(ReplayExchange.synthetic, n_symbols, end_time=end_time, seed=seed, latency=latency,
+                                 weight_per_minute=0, universe_path=os.path.join(directory, f'{name}_markets.json'))
+
+    def signals(result):
+        return tuple(sorted(result[key]) for key in keys)
+
+    results = {}
+    try:
+        analysis = Analysis(factory('single')(), report_path=None, cache_directory=os.path.join(directory, 'single'))
+        analysis.fetcher.limiter = WeightRateLimiter(weight_per_minute=10 ** 9)
+        analysis.renderer = _NullRenderer()
+        runs = []
+        for _ in range(2):
+            start_time = time.perf_counter()
+            result = analysis.analyze_all_timeframes()
+            runs.append(time.perf_counter() - start_time)
+        analysis.fetcher.close()
+        expected = signals(result)
+        results['single'] = {'cold': runs[0], 'warm': runs[1]}
+
+        for count in shards:
+            scanner = ShardedScanner(count, factory(f'shards{count}'), weight_per_minute=10 ** 9, charts=False,
+                                     analysis_options={'report_path': None,
+                                                       'cache_directory': os.path.join(directory, f'shards{count}')})
+            start_time = time.perf_counter()
+            scanner.start()
+            startup = time.perf_counter() - start_time
+            runs, identical = [], True
+            try:
+                for _ in range(2):
+                    start_time = time.perf_counter()
+                    result = scanner.analyze_all_timeframes()
+                    runs.append(time.perf_counter() - start_time)
+                    identical &= signals(result) == expected
+            finally:
+                scanner.stop()
+            results[f'shards_{count}'] = {'startup': startup, 'cold': runs[0], 'warm': runs[1], 'identical': identical,
+                                          'balance': sorted(scanner.shard_symbols.values())}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    single = results['single']
+    print(f"symbols={n_symbols} latency={latency * 1000:.0f}ms cpus={os.cpu_count()}")
+    print(f"  single process: cold {single['cold']:7.2f} s | warm {single['warm']:7.2f} s")
+    for count in shards:
+        run = results[f'shards_{count}']
+        print(f"  {count} shard(s)   : cold {run['cold']:7.2f} s ({single['cold'] / run['cold']:.2f}x) | "
+              f"warm {run['warm']:7.2f} s ({single['warm'] / run['warm']:.2f}x) | startup {run['startup']:.2f} s | "
+              f"symbols/shard {run['balance']} identical={run['identical']}")
+    return results
+
+
+def benchmark_resample(n_symbols=300, bars=100, repeat=3, record=None, verify=None):
+    """1h 한 번으로 상위 타임프레임을 만드는 경우와 타임프레임마다 받는 경우의 요청 비용, 리샘플 시간을 비교.
+
+    record를 주면 실제 거래소에서 기준/상위 타임프레임 캔들을 같은 시점에 받아 그 경로에 픽스처로 저장하고,
+    verify를 주면 저장된 픽스처에서 리샘플 결과와 거래소 캔들이 같은지 확인한다 (다르면 AssertionError).
+    """
+    from fetcher import kline_weight
+    from resample import OHLCVResampler
+    from util import ChartUtils
+
+    timeframes = ['1h', '2h', '4h', '6h', '8h', '12h']
+    higher = timeframes[1:]
+    base_limit = OHLCVResampler.base_limit(higher, bars)
+    # 심볼 하나당: 1h 한 번(base_limit봉) vs 타임프레임마다 calculate_limit봉
+    resampled_weight = kline_weight(base_limit)
+    direct_weight = sum(kline_weight(ChartUtils.calculate_limit(timeframe)) for timeframe in timeframes)
+
+    coins_data = synthetic_coins_data(n_symbols, base_limit)
+    candles = {symbol: np.column_stack([PricePanel._timestamps_ms(df['timestamp'])] +
+                                       [df[column].to_numpy() for column in OHLCVStore.PRICE_COLUMNS])
+               for symbol, df in coins_data.items()}
+
+    def resample_all():
+        return {symbol: [OHLCVResampler.resample(array, timeframe)[-bars:] for timeframe in higher]
+                for symbol, array in candles.items()}
+
+    resample_time, _ = _best_of(resample_all, repeat)
+    results = {'base_limit': base_limit, 'weight_per_symbol': {'resampled': resampled_weight, 'direct': direct_weight},
+               'requests_per_symbol': {'resampled': 1, 'direct': len(timeframes)}, 'resample': resample_time}
+
+    if record:
+        from exchange import Exchange
+        from fetcher import OHLCVFetcher
+
+        exchange = Exchange()
+        fetcher = OHLCVFetcher(exchange.connect_async)
+        symbols = exchange.get_symbols()[:n_symbols]
+        OHLCVResampler.record_fixtures(fetcher, symbols, higher, bars, directory=record)
+        fetcher.close()
+        results['recorded'] = len(symbols)
+    if verify:
+        mismatches = OHLCVResampler.verify_fixtures(verify)
+        results['mismatches'] = len(mismatches)
+
+    print(f"symbols={n_symbols} bars={bars} timeframes={','.join(timeframes)}")
+    print(f"  per symbol : resampled 1 request of {base_limit} 1h bars (weight {resampled_weight}) | "
+          f"direct {len(timeframes)} requests (weight {direct_weight})")
+    print(f"  resample   : {resample_time * 1000:8.1f} ms for {n_symbols} symbols x {len(higher)} timeframes")
+    if record:
+        print(f"  recorded   : {results['recorded']} symbols to {record}")
+    if verify:
+        for (symbol, timeframe), diff in mismatches.items():
+            print(f"  mismatch   : {symbol} {timeframe} {len(diff)} bars")
+        print(f"  verified   : {verify} ({len(mismatches)} mismatching symbol/timeframe pairs)")
+        assert not mismatches, 'resampled candles differ from the exchange candles'
+    return results
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + '.'))
+        elif isinstance(value, (bool, np.bool_)):
+            flat[name] = bool(value)
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            flat[name] = float(value)
+    return flat
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(benchmark, params, results, path='benchmarks/results.jsonl'):
+    record = {'benchmark': benchmark, 'commit': _git_commit(), 'time': time.time(), 'params': params,
+              'results': _flatten(results)}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+
+def compare_results(record, path='benchmarks/results.jsonl', threshold=0.1):
+    """같은 벤치마크/파라미터의 다른 커밋 결과 중 가장 최근 것과 비교해 시간 지표 회귀를 출력."""
+    previous = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                candidate = json.loads(line)
+                if (candidate['benchmark'] == record['benchmark'] and candidate['params'] == record['params']
+                        and candidate['commit'] != record['commit']):
+                    previous = candidate
+    if previous is None:
+        print("No previous result from another commit to compare against.")
+        return []
+
+    regressions = []
+    print(f"Compared with {previous['commit']}:")
+    for name, value in record['results'].items():
+        before = previous['results'].get(name)
+        # 시간/메모리 지표만 (작을수록 좋은 값)
+        if not before or isinstance(value, bool) or not any(key in name for key in ['wall', 'pandas', 'panel',
+                                                                                     'peak_memory', 'serial',
+                                                                                     'concurrent', 'us_per_update',
+                                                                                     'write', 'read']):
+            continue
+        change = value / before - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"  {name:40s} {before:12.6g} -> {value:12.6g} ({change * 100:+.1f}%){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+class MockQuoteClient:
+    """지연을 흉내 내는 로컬 목 거래소 (load_markets, fetch_order_book, fetch_funding_rates)."""
+
+    def __init__(self, market_type, symbols, latency=0.05, price_offset=0.0, taker_fee=0.0004, funding_rate=0.0001,
+                 seed=0):
+        self.market_type = market_type
+        self.latency = latency
+        self.price_offset = price_offset
+        self.funding_rate = funding_rate
+        self.rng = np.random.default_rng(seed)
+        suffix = ':USDT' if market_type == 'swap' else ''
+        self.markets = {f'{symbol}{suffix}': {'symbol': f'{symbol}{suffix}', 'base': symbol.split('/')[0],
+                                              'quote': 'USDT', 'type': market_type, 'active': True,
+                                              'taker': taker_fee}
+                        for symbol in symbols}
+        self.has = {'fetchBidsAsks': False, 'fetchFundingRates': market_type == 'swap'}
+
+    async def load_markets(self):
+        await asyncio.sleep(self.latency)
+        return self.markets
+
+    async def fetch_order_book(self, symbol, limit=None):
+        await asyncio.sleep(self.latency)
+        mid = 100 * (1 + self.price_offset + self.rng.normal(0, 0.0005))
+        return {'bids': [[mid * 0.9999, 1.0]], 'asks': [[mid * 1.0001, 1.0]], 'timestamp': int(time.time() * 1000)}
+
+    async def fetch_funding_rates(self, symbols=None):
+        await asyncio.sleep(self.latency)
+        return {symbol: {'fundingRate': self.funding_rate} for symbol in symbols or self.markets}
+
+    async def close(self):
+        pass
+
+
+def benchmark_arbitrage(n_symbols=50, n_venues=4, latency=0.05, repeat=3):
+    """목 거래소들에 대해 심볼/거래소를 하나씩 요청하는 경우와 SpreadScanner의 동시 요청을 비교."""
+    symbols = [f'SYN{i}/USDT' for i in range(n_symbols)]
+    venues = [Venue('spot', lambda: MockQuoteClient('spot', symbols, latency, seed=0), market_type='spot')]
+    venues += [Venue(f'perp{i}', lambda i=i: MockQuoteClient('swap', symbols, latency, price_offset=0.003 * i, seed=i),
+                     market_type='swap') for i in range(n_venues - 1)]
+    scanner = SpreadScanner(venues, min_spread=0.0, on_opportunity=lambda opportunity: None)
+    scanner.loop.run_until_complete(scanner.load_async())
+
+    async def serial():
+        quotes = {}
+        for venue in venues:
+            quotes[venue.name] = {}
+            for symbol in scanner.symbols:
+                quotes[venue.name][symbol] = await venue._fetch_order_book(symbol)
+        return quotes
+
+    serial_time, _ = _best_of(lambda: scanner.loop.run_until_complete(serial()), 1)
+    concurrent_time, opportunities = _best_of(scanner.poll, repeat)
+    scanner.close()
+
+    print(f"venues={n_venues} symbols={n_symbols} latency={latency * 1000:.0f}ms")
+    print(f"  serial    : {serial_time * 1000:9.1f} ms per poll")
+    print(f"  concurrent: {concurrent_time * 1000:9.1f} ms per poll ({serial_time / concurrent_time:.1f}x), "
+          f"{len(opportunities)} opportunities")
+    return {'serial': serial_time, 'concurrent': concurrent_time, 'opportunities': opportunities}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Performance benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    panel_parser = subparsers.add_parser('panel', help='per-DataFrame vs panel indicator engine')
+    panel_parser.add_argument('--symbols', type=int, default=300)
+    panel_parser.add_argument('--bars', type=int, default=1200)
+    panel_parser.add_argument('--repeat', type=int, default=3)
+
+    streaming_parser = subparsers.add_parser('streaming', help='O(1) streaming indicators vs batch functions')
+    streaming_parser.add_argument('--bars', type=int, default=5000)
+    streaming_parser.add_argument('--updates-per-bar', type=int, default=4)
+
+    store_parser = subparsers.add_parser('store', help='CSV dumps vs columnar OHLCV store')
+    store_parser.add_argument('--symbols', type=int, default=100)
+    store_parser.add_argument('--bars', type=int, default=20000)
+    store_parser.add_argument('--range-bars', type=int, default=500)
+    store_parser.add_argument('--repeat', type=int, default=3)
+
+    indicators_parser = subparsers.add_parser('indicators', help='per-indicator pandas vs panel microbenchmarks')
+    indicators_parser.add_argument('--symbols', type=int, default=300)
+    indicators_parser.add_argument('--bars', type=int, default=1200)
+    indicators_parser.add_argument('--repeat', type=int, default=3)
+
+    scan_parser = subparsers.add_parser('scan', help='end-to-end Analysis scan on the replay exchange')
+    scan_parser.add_argument('--sizes', type=int, nargs='+', default=[50, 300, 1000])
+    scan_parser.add_argument('--mode', choices=['all', 'specific'], default='all')
+    scan_parser.add_argument('--latency', type=float, default=0.0)
+    scan_parser.add_argument('--resample-bars', type=int, default=100)
+    scan_parser.add_argument('--charts', action='store_true')
+    scan_parser.add_argument('--no-memory', action='store_true')
+
+    prescreen_parser = subparsers.add_parser('prescreen', help='full scan vs ticker pre-screened scan')
+    prescreen_parser.add_argument('--symbols', type=int, default=300)
+    prescreen_parser.add_argument('--cycles', type=int, default=5)
+    prescreen_parser.add_argument('--volatility', type=float, default=0.02)
+    prescreen_parser.add_argument('--margin', type=float, default=0.002)
+    prescreen_parser.add_argument('--latency', type=float, default=0.0)
+
+    arbitrage_parser = subparsers.add_parser('arbitrage', help='serial vs concurrent quote polling on mock venues')
+    arbitrage_parser.add_argument('--symbols', type=int, default=50)
+    arbitrage_parser.add_argument('--venues', type=int, default=4)
+    arbitrage_parser.add_argument('--latency', type=float, default=0.05)
+    arbitrage_parser.add_argument('--repeat', type=int, default=3)
+
+    backfill_parser = subparsers.add_parser('backfill', help='serial vs concurrent resumable history backfill')
+    backfill_parser.add_argument('--symbols', type=int, default=20)
+    backfill_parser.add_argument('--days', type=int, default=30)
+    backfill_parser.add_argument('--timeframes', nargs='+', default=['5m', '1h'])
+    backfill_parser.add_argument('--latency', type=float, default=0.05)
+    backfill_parser.add_argument('--concurrency', type=int, default=20)
+    backfill_parser.add_argument('--crash-after', type=int, default=None,
+                                 help='simulate a crash after this many requests, once a cursor is checkpointed '
+                                      '(default: half of the run)')
+
+    shard_parser = subparsers.add_parser('shard', help='single-process scan vs sharded worker processes')
+    shard_parser.add_argument('--symbols', type=int, default=1000)
+    shard_parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    shard_parser.add_argument('--latency', type=float, default=0.02)
+
+    resample_parser = subparsers.add_parser('resample', help='local 1h resampling vs per-timeframe fetches')
+    resample_parser.add_argument('--symbols', type=int, default=300)
+    resample_parser.add_argument('--bars', type=int, default=100)
+    resample_parser.add_argument('--repeat', type=int, default=3)
+    resample_parser.add_argument('--record', metavar='PATH', help='record live exchange fixtures into PATH')
+    resample_parser.add_argument('--verify', metavar='PATH', help='check resampling against the fixtures in PATH')
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument('--save', action='store_true', help='append results to benchmarks/results.jsonl')
+        subparser.add_argument('--compare', action='store_true', help='compare with the last result of another commit')
+        subparser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    if args.command == 'panel':
+        results = benchmark_panel(args.symbols, args.bars, args.repeat)
+    elif args.command == 'streaming':
+        results = benchmark_streaming(args.bars, args.updates_per_bar)
+    elif args.command == 'store':
+        results = benchmark_store(args.symbols, args.bars, args.range_bars, args.repeat)
+    elif args.command == 'indicators':
+        results = benchmark_indicators(args.symbols, args.bars, args.repeat)
+    elif args.command == 'scan':
+        results = benchmark_scan(args.sizes, args.mode, args.latency, args.resample_bars, args.charts,
+                                 not args.no_memory)
+    elif args.command == 'prescreen':
+        results = benchmark_prescreen(args.symbols, args.cycles, args.volatility, args.margin, args.latency)
+    elif args.command == 'arbitrage':
+        results = benchmark_arbitrage(args.symbols, args.venues, args.latency, args.repeat)
+    elif args.command == 'backfill':
+        results = benchmark_backfill(args.symbols, args.days, args.timeframes, args.latency, args.concurrency,
+                                     args.crash_after)
+    elif args.command == 'shard':
+        results = benchmark_shard(args.symbols, args.shards, args.latency)
+    elif args.command == 'resample':
+        results = benchmark_resample(args.symbols, args.bars, args.repeat, args.record, args.verify)
+
+    params = {key: value for key, value in vars(args).items() if key not in ('command', 'save', 'compare', 'threshold')}
+    if args.save or args.compare:
+        record = save_results(args.command, params, results) if args.save else \
+            {'benchmark': args.command, 'commit': _git_commit(), 'params': params, 'results': _flatten(results)}
+        if args.compare:
+            compare_results(record, threshold=args.threshold)
+
+
+if __name__ == "__main__":
+    main()
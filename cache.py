@@ -0,0 +1,92 @@
+# cache.py
+import os
+import time
+
+import ccxt
+import numpy as np
+
+from metrics import metrics
+
+
+class CandleCache:
+    """(symbol, timeframe)별 캔들 저장소.
+
+    마지막 봉의 타임스탬프를 기억해 since=last_ts 이후의 델타만 받아오고,
+    아직 진행 중인 마지막 봉은 새 값으로 덮어쓴다. 요청마다 limit이 달라도(예: 1h만 닫힌 스캔 뒤의 12h 스캔)
+    다시 전체를 받지 않도록 지금까지 가진 봉 수와 limit 중 큰 쪽을 남기고, max_bars가 있으면 그 이상은 버린다.
+    """
+
+    def __init__(self, directory='cache/candles', max_age=0, max_bars=None):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bars = max_bars
+        self.entries = {}
+        self.dirty = set()
+        self.stats = {'hit': 0, 'delta': 0, 'full': 0}
+
+    @staticmethod
+    def timeframe_ms(timeframe):
+        return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+    def _path(self, symbol, timeframe):
+        formatted_symbol = symbol.replace(':USDT', '').replace('/', '_')
+        return os.path.join(self.directory, timeframe, f"{formatted_symbol}.npy")
+
+    def get(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        if key not in self.entries:
+            path = self._path(symbol, timeframe)
+            if not os.path.exists(path):
+                return None
+            self.entries[key] = {'candles': np.load(path), 'fetched_at': os.path.getmtime(path)}
+        return self.entries[key]
+
+    def plan(self, symbol, timeframe, limit, now=None):
+        """('hit'|'delta'|'full', since, fetch_limit) 반환."""
+        now = time.time() if now is None else now
+        entry = self.get(symbol, timeframe)
+        if entry is None or len(entry['candles']) < limit:
+            return 'full', None, limit
+
+        if now - entry['fetched_at'] <= self.max_age:
+            return 'hit', None, None
+
+        last_ts = int(entry['candles'][-1, 0])
+        missing_bars = int((now * 1000 - last_ts) // self.timeframe_ms(timeframe)) + 1
+        if missing_bars >= limit:
+            return 'full', None, limit
+        # 진행 중이던 마지막 봉부터 다시 받는다
+        return 'delta', last_ts, missing_bars + 1
+
+    def merge(self, symbol, timeframe, ohlcv, limit, now=None):
+        now = time.time() if now is None else now
+        new_candles = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        entry = self.get(symbol, timeframe)
+        keep = limit if entry is None else max(limit, len(entry['candles']))
+        if self.max_bars is not None:
+            keep = max(limit, min(keep, self.max_bars))
+        if entry is not None and len(new_candles):
+            old_candles = entry['candles']
+            old_candles = old_candles[old_candles[:, 0] < new_candles[0, 0]]
+            new_candles = np.concatenate([old_candles, new_candles])
+        elif entry is not None:
+            new_candles = entry['candles']
+
+        self.entries[(symbol, timeframe)] = {'candles': new_candles[-keep:], 'fetched_at': now}
+        self.dirty.add((symbol, timeframe))
+
+    def window(self, symbol, timeframe, limit):
+        return self.entries[(symbol, timeframe)]['candles'][-limit:]
+
+    def record(self, mode):
+        self.stats[mode] += 1
+        metrics.increment('candle_cache', result=mode)
+
+    def flush(self):
+        for symbol, timeframe in self.dirty:
+            path = self._path(symbol, timeframe)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, self.entries[(symbol, timeframe)]['candles'])
+            os.replace(path + '.tmp', path)
+        self.dirty.clear()
@@ -1,5 +1,7 @@
 import pandas as pd
 from calculate import TechnicalIndicators
+from panel import PricePanel, PanelEngine
+from metrics import metrics
 
 class TradingCore:
     @staticmethod
@@ -30,4 +32,20 @@ class TradingCore:
                 elif df['RSI'].iloc[-1] < oversold_threshold:
                     extreme_rsi_signals.append((symbol, 'Oversold', df['RSI'].iloc[-1]))
 
-        return extreme_rsi_signals
\ No newline at end of file
+        return extreme_rsi_signals
+
+    @staticmethod
+    def find_extremes_vectorized(coins_data, num_of_std=2, rsi_window=14, overbought_threshold=70, oversold_threshold=30):
+        """find_bollinger_extremes/find_extreme_rsi와 같은 결과를 패널 한 번으로 계산."""
+        with metrics.timer('panel_build'):
+            panel = PricePanel.from_coins_data(coins_data)
+        with metrics.timer('indicator_compute'):
+            signal_table = PanelEngine.scan(panel, num_of_std=num_of_std, rsi_window=rsi_window,
+                                            overbought_threshold=overbought_threshold,
+                                            oversold_threshold=oversold_threshold)
+        with metrics.timer('signal_detection'):
+            bb_table = signal_table.dropna(subset=['bb_signal'])
+            rsi_table = signal_table.dropna(subset=['rsi_signal'])
+            extreme_bb_signals = list(zip(bb_table.index, bb_table['bb_signal']))
+            extreme_rsi_signals = list(zip(rsi_table.index, rsi_table['rsi_signal'], rsi_table['rsi']))
+        return extreme_bb_signals, extreme_rsi_signals
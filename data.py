@@ -1,22 +1,67 @@
-import os
 import ccxt
+import time
 import pandas as pd
 from tqdm import tqdm
+from resample import OHLCVResampler
+from store import OHLCVStore
+from metrics import metrics
 
 class MarketData:
     @staticmethod
-    def fetch_coins_data(exchange, symbols, timeframe, limit):
+    def to_dataframe(ohlcv):
+        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype('int64'), unit='ms')
+        return df
+
+    @staticmethod
+    def usdt_pairs(exchange, symbols):
+        markets = exchange.markets
+        if not markets:
+            with metrics.timer('market_load'):
+                markets = exchange.load_markets()
+        return [symbol for symbol in symbols if symbol.endswith('/USDT:USDT') and symbol in markets]
+
+    @staticmethod
+    def fetch_all_timeframes(exchange, symbols, timeframe_limits, fetcher):
+        """여러 타임프레임을 하나의 비동기 배치로 수집해 {timeframe: coins_data}로 반환."""
+        usdt_pairs = MarketData.usdt_pairs(exchange, symbols)
+        raw_data = fetcher.fetch_many(usdt_pairs, timeframe_limits)
+        return {timeframe: {symbol: MarketData.to_dataframe(ohlcv) for symbol, ohlcv in data.items()}
+                for timeframe, data in raw_data.items()}
+
+    @staticmethod
+    def fetch_resampled_timeframes(exchange, symbols, timeframes, bars, fetcher, base_timeframe='1h'):
+        """기준 타임프레임만 한 번 받아 나머지 타임프레임을 로컬에서 만든다."""
+        usdt_pairs = MarketData.usdt_pairs(exchange, symbols)
+        base_limit = OHLCVResampler.base_limit(timeframes, bars, base_timeframe)
+        base_data = fetcher.fetch(usdt_pairs, base_timeframe, base_limit)
+
+        all_coins_data = {timeframe: {} for timeframe in timeframes}
+        for symbol, ohlcv in base_data.items():
+            for timeframe in timeframes:
+                candles = OHLCVResampler.resample(ohlcv, timeframe, base_timeframe)
+                all_coins_data[timeframe][symbol] = MarketData.to_dataframe(candles[-bars:])
+        return all_coins_data
+
+    @staticmethod
+    def closed_bars(coins_data, timeframe, timestamp):
+        """timestamp(ms) 시점까지 마감된 봉만 남긴다 (진행 중인 마지막 봉 제외)."""
+        period = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        cutoff = pd.to_datetime(timestamp // period * period, unit='ms')
+        return {symbol: df[df['timestamp'] < cutoff] for symbol, df in coins_data.items()}
+
+    @staticmethod
+    def fetch_coins_data(exchange, symbols, timeframe, limit, fetcher=None):
+        if fetcher is not None:
+            return MarketData.fetch_all_timeframes(exchange, symbols, {timeframe: limit}, fetcher)[timeframe]
+
         coins_data = {}
-        markets = exchange.load_markets()
-        
-        usdt_pairs = [symbol for symbol in symbols if symbol.endswith('/USDT:USDT') and symbol in markets]
+        usdt_pairs = MarketData.usdt_pairs(exchange, symbols)
         
         for symbol in tqdm(usdt_pairs, leave=False):
             try:
                 ohlcv = exchange.fetch_ohlcv(symbol, timeframe, limit=limit)
-                df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-                coins_data[symbol] = df
+                coins_data[symbol] = MarketData.to_dataframe(ohlcv)
             except Exception as e:
                 error_message = str(e)
                 # 에러 메시지에 "-1122" 코드가 포함된 경우 필터링
@@ -28,21 +73,22 @@ class MarketData:
 
 
     @staticmethod
-    def save_data(df, symbol, timeframe):
-        formatted_symbol = symbol.replace(':USDT', '').replace('/', '_')
-        directory = f"data/{timeframe}"
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        file_name = f"{directory}/{formatted_symbol}.csv"
-        df.to_csv(file_name, index=False)
+    def save_data(df, symbol, timeframe, store=None):
+        # data/{timeframe}/{symbol}/ 열 지향 저장소에 마지막 저장 봉 이후만 추가
+        store = store or OHLCVStore()
+        return store.append(symbol, timeframe, df)
 
     @staticmethod
-    def fetch_and_save_all_timeframes(exchange, limit):
+    def fetch_and_save_all_timeframes(exchange, limit, fetcher=None, store=None, now=None):
         symbols = exchange.get_symbols()
         timeframes = ['5m', '15m', '30m', '1h']
+        store = store or OHLCVStore()
         for timeframe in timeframes:
             print(f"Fetching and saving data for timeframe: {timeframe}")
-            data = MarketData.fetch_coins_data(exchange.exchange, symbols, timeframe, limit)
+            data = MarketData.fetch_coins_data(exchange.exchange, symbols, timeframe, limit, fetcher)
+            # 진행 중인 마지막 봉은 저장하지 않는다 (백테스트/스윕은 마감된 봉만 읽어야 한다)
+            timestamp = int(time.time() * 1000) if now is None else now
+            data = MarketData.closed_bars(data, timeframe, timestamp)
             for symbol, df in data.items():
-                MarketData.save_data(df, symbol, timeframe)
+                MarketData.save_data(df, symbol, timeframe, store)
             print(f"{timeframe} ohlcv data is saved!")
\ No newline at end of file
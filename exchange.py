@@ -1,7 +1,11 @@
 # Exchange.py
 import ccxt
+import ccxt.async_support as ccxt_async
 from dotenv import load_dotenv
 import os
+from funding import FundingRateService
+from universe import SymbolUniverse
+from metrics import metrics
 
 class Exchange:
     def __init__(self):
@@ -9,6 +13,11 @@ class Exchange:
         self.api_key = os.getenv('BINANCE_API_KEY')
         self.api_secret = os.getenv('BINANCE_API_SECRET')
         self.exchange = self.connect()
+        # 모든 호출자가 공유하는 펀딩비 캐시
+        self.funding = FundingRateService(self.exchange)
+        # 마켓 정보는 cache/markets.json에서 복원하고 refresh_interval마다만 다시 받는다
+        self.universe = SymbolUniverse(self.exchange)
+        self.universe.load()
         
     def connect(self):
         exchange = ccxt.binance({
@@ -18,24 +27,34 @@ class Exchange:
             'options': {'defaultType': 'future'}
         })
         return exchange
+
+    def connect_async(self):
+        # 요청 간격은 OHLCVFetcher의 가중치 리미터가 관리하므로 ccxt 내장 리미터는 끈다
+        exchange = ccxt_async.binance({
+            'apiKey': self.api_key,
+            'secret': self.api_secret,
+            'enableRateLimit': False,
+            'options': {'defaultType': 'future'}
+        })
+        if self.exchange.markets:
+            exchange.set_markets(self.exchange.markets, self.exchange.currencies)
+        return exchange
     
     def fetch_funding_rate(self, symbol):
-        market = self.exchange.market(symbol)
-        funding_rate = self.exchange.fetch_funding_rate(symbol)['fundingRate']
-        percentage_rate = funding_rate * 100
-        funding_rate = "{:.3f}%".format(percentage_rate)
-        return funding_rate
+        return self.funding.get(symbol)
 
     def fetch_balance(self):
         return self.exchange.fetch_balance()
     
     def load_markets(self):
-        return self.exchange.load_markets()
+        self.universe.load()
+        return self.exchange.markets
     
-    def get_symbols(self):
-        return self.exchange.symbols
+    def get_symbols(self, max_tier=None):
+        return self.universe.symbols(max_tier)
     
     def print_balance(self):
+        metrics.mark('first_request')
         balance = self.exchange.fetch_balance()
         print("Futures Account Balances:")
         for asset, amount in balance['total'].items():
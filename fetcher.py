@@ -0,0 +1,197 @@
+# fetcher.py
+import asyncio
+import atexit
+import random
+import time
+
+import ccxt
+
+from metrics import metrics
+
+
+def kline_weight(limit):
+    # Binance USDT-M /fapi/v1/klines 요청 가중치 (limit 구간별)
+    if limit is None:
+        limit = 500
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+def is_invalid_symbol_error(error_message):
+    # -1122: 상장 폐지/거래 중지 심볼 (기존 필터링 유지)
+    return '"code":-1122' in error_message or "-1122" in error_message
+
+
+class WeightRateLimiter:
+    """모든 타임프레임이 공유하는 분당 요청 가중치 토큰 버킷.
+
+    share는 같은 IP 한도를 여러 프로세스가 나눠 쓸 때 이 버킷이 가질 몫 (샤드 n개면 1/n).
+    """
+
+    def __init__(self, weight_per_minute=2400, headroom=0.8, share=1.0):
+        self.capacity = weight_per_minute * headroom * share
+        self.weight_per_minute = weight_per_minute
+        self.refill_rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    async def acquire(self, weight):
+        weight = min(weight, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= weight:
+                self.tokens -= weight
+                return
+            await asyncio.sleep((weight - self.tokens) / self.refill_rate)
+
+    def observe(self, used_weight):
+        # 거래소가 알려준 사용량(X-MBX-USED-WEIGHT-1M)이 더 크면 버킷을 줄인다
+        self._refill()
+        remaining = self.capacity - used_weight * self.capacity / self.weight_per_minute
+        self.tokens = min(self.tokens, max(remaining, 0.0))
+
+    def penalize(self):
+        self._refill()
+        self.tokens = 0.0
+
+
+class OHLCVFetcher:
+    """ccxt async_support 기반 동시 OHLCV 수집기.
+
+    client_factory는 async fetch_ohlcv를 가진 클라이언트를 반환해야 하며,
+    테스트에서는 지연/에러를 주입하는 스텁 거래소로 대체할 수 있다.
+    """
+
+    def __init__(self, client_factory, max_concurrency=20, limiter=None, max_retries=3, backoff=0.5, cache=None,
+                 on_invalid_symbol=None, loop=None):
+        self.client_factory = client_factory
+        # -1122로 실패한 심볼을 알릴 콜백 (SymbolUniverse.exclude)
+        self.on_invalid_symbol = on_invalid_symbol
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter or WeightRateLimiter()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # loop를 주면(예: 스트림 스레드의 루프) 새 루프를 만들지 않고, 그 루프에서 close_async로 닫는 것도 호출한 쪽이 맡는다
+        self.owns_loop = loop is None
+        self.loop = asyncio.new_event_loop() if loop is None else loop
+        self.client = None
+        if self.owns_loop:
+            atexit.register(self.close)
+
+    def _get_client(self):
+        if self.client is None:
+            self.client = self.client_factory()
+        return self.client
+
+    def _observe_headers(self, client):
+        headers = getattr(client, 'last_response_headers', None) or {}
+        for key, value in headers.items():
+            if key.lower() == 'x-mbx-used-weight-1m':
+                try:
+                    self.limiter.observe(int(value))
+                    metrics.set_gauge('exchange_used_weight_1m', int(value))
+                except ValueError:
+                    pass
+                return
+
+    async def fetch_symbol(self, symbol, timeframe, limit, since=None, semaphore=None):
+        client = self._get_client()
+        weight = kline_weight(limit)
+        for attempt in range(self.max_retries + 1):
+            try:
+                if semaphore is None:
+                    ohlcv = await self._request(client, symbol, timeframe, limit, since, weight)
+                else:
+                    async with semaphore:
+                        ohlcv = await self._request(client, symbol, timeframe, limit, since, weight)
+                self._observe_headers(client)
+                return ohlcv
+            except ccxt.NetworkError as e:
+                # 타임아웃, 429/418, 일시적 장애만 재시도
+                if isinstance(e, ccxt.DDoSProtection):
+                    self.limiter.penalize()
+                    metrics.increment('rate_limited', service='exchange')
+                if attempt == self.max_retries:
+                    raise
+                metrics.increment('retries', stage='ohlcv_fetch')
+                delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+                await asyncio.sleep(delay)
+
+    async def _request(self, client, symbol, timeframe, limit, since, weight):
+        with metrics.timer('rate_limit_wait'):
+            await self.limiter.acquire(weight)
+        metrics.increment('request_weight', weight)
+        metrics.mark('first_request')
+        with metrics.timer('ohlcv_fetch'):
+            return await client.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    async def _fetch_cached(self, semaphore, symbol, timeframe, limit):
+        mode, since, fetch_limit = self.cache.plan(symbol, timeframe, limit)
+        if mode != 'hit':
+            ohlcv = await self.fetch_symbol(symbol, timeframe, fetch_limit, since=since, semaphore=semaphore)
+            self.cache.merge(symbol, timeframe, ohlcv, limit)
+        self.cache.record(mode)
+        return self.cache.window(symbol, timeframe, limit)
+
+    async def _fetch_one(self, semaphore, symbol, timeframe, limit):
+        try:
+            if self.cache is not None:
+                return await self._fetch_cached(semaphore, symbol, timeframe, limit)
+            return await self.fetch_symbol(symbol, timeframe, limit, semaphore=semaphore)
+        except Exception as e:
+            error_message = str(e)
+            if is_invalid_symbol_error(error_message):
+                if self.on_invalid_symbol is not None:
+                    self.on_invalid_symbol(symbol)
+            else:
+                metrics.error('ohlcv_fetch')
+                print(f"Error fetching data for {symbol}: {error_message}")
+            return None
+
+    async def fetch_many_async(self, symbols, timeframe_limits):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        jobs = [(timeframe, symbol) for timeframe in timeframe_limits for symbol in symbols]
+        results = await asyncio.gather(*[
+            self._fetch_one(semaphore, symbol, timeframe, timeframe_limits[timeframe])
+            for timeframe, symbol in jobs])
+        if self.cache is not None:
+            self.cache.flush()
+
+        raw_data = {timeframe: {} for timeframe in timeframe_limits}
+        for (timeframe, symbol), ohlcv in zip(jobs, results):
+            if ohlcv is not None:
+                raw_data[timeframe][symbol] = ohlcv
+        return raw_data
+
+    def fetch_many(self, symbols, timeframe_limits):
+        """{timeframe: limit}의 모든 조합을 한 번에 수집해 {timeframe: {symbol: ohlcv}}로 반환."""
+        return self.loop.run_until_complete(self.fetch_many_async(symbols, timeframe_limits))
+
+    def fetch(self, symbols, timeframe, limit):
+        return self.fetch_many(symbols, {timeframe: limit})[timeframe]
+
+    async def close_async(self):
+        # 다른 이벤트 루프(예: 스트림 스레드)에서 비동기 메서드만 쓴 경우 그 루프에서 닫는다
+        if self.client is not None and hasattr(self.client, 'close'):
+            await self.client.close()
+        self.client = None
+
+    def close(self):
+        if not self.owns_loop:
+            return
+        if self.client is not None and not self.loop.is_closed():
+            self.loop.run_until_complete(self.close_async())
+        self.client = None
+        if not self.loop.is_closed():
+            self.loop.close()
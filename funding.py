@@ -0,0 +1,82 @@
+# funding.py
+import threading
+import time
+
+from metrics import metrics
+
+
+class FundingRateService:
+    """premiumIndex 전체를 한 번에 받아(fetch_funding_rates) 다음 펀딩 시각까지 캐시한다.
+
+    값은 소수(0.0001 = 0.01%)로 반환하며 표시 형식은 호출하는 쪽에서 정한다.
+    """
+
+    def __init__(self, exchange, max_ttl=900, min_ttl=10):
+        self.exchange = exchange
+        self.max_ttl = max_ttl
+        self.min_ttl = min_ttl
+        self.rates = {}
+        self.next_funding_times = {}
+        self.expires_at = 0.0
+        self.lock = threading.Lock()
+        # 만료 시 동시에 들어온 호출 중 하나만 전체 펀딩비를 다시 받는다
+        self.refresh_lock = threading.Lock()
+        self.stats = {'hit': 0, 'refresh': 0}
+
+    def refresh(self):
+        with metrics.timer('funding_refresh'):
+            funding_rates = self.exchange.fetch_funding_rates()
+        now = time.time()
+        rates = {}
+        next_funding_times = {}
+        for symbol, item in funding_rates.items():
+            if item.get('fundingRate') is None:
+                continue
+            rates[symbol] = float(item['fundingRate'])
+            next_funding_time = item.get('fundingTimestamp') or item.get('nextFundingTimestamp')
+            if next_funding_time:
+                next_funding_times[symbol] = next_funding_time / 1000
+
+        # 가장 이른 다음 펀딩 시각에 만료 (너무 길거나 짧지 않게 제한)
+        upcoming = [t for t in next_funding_times.values() if t > now]
+        ttl = min(upcoming) - now if upcoming else self.max_ttl
+        with self.lock:
+            self.rates = rates
+            self.next_funding_times = next_funding_times
+            self.expires_at = now + min(max(ttl, self.min_ttl), self.max_ttl)
+            self.stats['refresh'] += 1
+
+    def _ensure_fresh(self):
+        if time.time() >= self.expires_at:
+            with self.refresh_lock:
+                # 잠금을 기다리는 동안 다른 스레드가 이미 갱신했을 수 있다
+                if time.time() >= self.expires_at:
+                    self.refresh()
+                    metrics.increment('funding_cache', result='refresh')
+                    return
+        with self.lock:
+            self.stats['hit'] += 1
+        metrics.increment('funding_cache', result='hit')
+
+    def get(self, symbol):
+        self._ensure_fresh()
+        with self.lock:
+            return self.rates.get(symbol)
+
+    def get_many(self, symbols):
+        self._ensure_fresh()
+        with self.lock:
+            return {symbol: self.rates.get(symbol) for symbol in symbols}
+
+    def update(self, symbol, funding_rate, next_funding_time=None):
+        """웹소켓 markPrice 등 다른 경로에서 받은 값으로 갱신."""
+        with self.lock:
+            self.rates[symbol] = float(funding_rate)
+            if next_funding_time:
+                self.next_funding_times[symbol] = next_funding_time / 1000
+
+
+def format_funding_rate(funding_rate):
+    if funding_rate is None:
+        return 'N/A'
+    return "{:.3f}%".format(funding_rate * 100)
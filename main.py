@@ -1,49 +1,303 @@
-from exchange import Exchange
-from util import ChartUtils
-from analysis import Analysis
-from data import MarketData
+# main.py
+# 크론에서 자주 실행되므로 모듈 최상단에서는 가벼운 것만 import하고,
+# ccxt/pandas/matplotlib 등 무거운 모듈은 그 모드를 실행할 때 불러온다.
+import argparse
+import sys
 
+from metrics import metrics
 
-def main():
+
+def connect(balance=False, warm=False, **options):
+    """거래소와 Analysis(**options)를 만든다. balance가 참일 때만 서명된 잔고 조회 요청을 보낸다."""
+    from exchange import Exchange
+    from util import ChartUtils
+    from analysis import Analysis
+
+    metrics.mark('imports')
     ChartUtils.initialize_chart_folder()
     exchange = Exchange()
-    analysis = Analysis(exchange)
+    analysis = Analysis(exchange, **options)
+    if warm:
+        # 봇 모드처럼 오래 도는 경우에만 렌더링 워커를 미리 띄운다
+        analysis.renderer.warm()
+    metrics.mark('ready')
+
+    if balance:
+        # 선물 계좌 잔고 조회
+        exchange.print_balance()
+    return exchange, analysis
+
+
+def print_startup():
+    startup = metrics.startup()
+    if startup:
+        print("Startup: " + ', '.join(f"{event} {seconds:.2f}s" for event, seconds in
+                                      sorted(startup.items(), key=lambda item: item[1])))
+
+
+def print_result(result):
+    print(f"Common BB symbols: {', '.join(result['common_bb_symbols']) or '-'}")
+    print(f"Common RSI symbols: {', '.join(result['common_rsi_symbols']) or '-'}")
+    print(f"Intersected symbols: {', '.join(result['intersected_symbols']) or '-'}")
+
+
+def start_shards(args, **options):
+    """심볼을 args.shards개 워커 프로세스에 나눠 맡기는 ShardedScanner (코디네이터는 거래소에 연결하지 않는다)."""
+    from shard import ShardedScanner
+
+    if args.balance:
+        from exchange import Exchange
+        Exchange().print_balance()
+    scanner = ShardedScanner(args.shards, analysis_options=options).start()
+    metrics.mark('ready')
+    return scanner
+
+
+def run_scan(args):
+    if args.shards:
+        if args.timeframe:
+            sys.exit("--timeframe cannot be combined with --shards")
+        scanner = start_shards(args, cache_max_age=args.cache_max_age)
+        try:
+            print_result(scanner.analyze_all_timeframes())
+        finally:
+            scanner.stop()
+        print_startup()
+        return
+
+    exchange, analysis = connect(args.balance, cache_max_age=args.cache_max_age)
+    if args.timeframe:
+        timeframe = args.timeframe if args.timeframe.endswith('h') else f"{args.timeframe}h"
+        if timeframe not in analysis.timeframe_options:
+            sys.exit(f"Unknown timeframe: {args.timeframe} (choose from {', '.join(analysis.timeframe_options)})")
+        analysis.scan_timeframe(timeframe)
+    else:
+        print_result(analysis.analyze_all_timeframes())
+    # 크론 실행이 끝나기 전에 제출된 차트를 마저 그린다
+    analysis.renderer.shutdown()
+    print_startup()
+
+
+def run_bot(args):
+    from telegram import run_telegram_bot
+    from metrics import MetricsServer
+
+    if args.prescreen_margin is not None and not args.watch:
+        sys.exit("--prescreen-margin only applies to in-progress scans; add --watch SECONDS")
+    options = {'prescreen_margin': args.prescreen_margin, 'cache_max_age': args.cache_max_age}
+    if args.shards:
+        if args.stream:
+            sys.exit("--stream cannot be combined with --shards")
+        analysis = start_shards(args, **options)
+    else:
+        exchange, analysis = connect(args.balance, warm=True, **options)
+        if args.stream:
+            analysis.start_stream()
     analysis_functions = {
             'all_timeframes': analysis.analyze_all_timeframes,
             'top_coins': analysis.analyze_top_coins
             }
+    print(f"Metrics: {MetricsServer(port=args.metrics_port).start()}")
+    run_telegram_bot(analysis_functions, analysis.timeframe_options, watch_interval=args.watch)
+
+
+def run_dump(args):
+    from data import MarketData
+
+    exchange, analysis = connect(args.balance)
+    MarketData.fetch_and_save_all_timeframes(exchange, args.limit, analysis.fetcher)
+    print_startup()
+
+
+def run_backfill(args):
+    import time
+    from backfill import Backfill
+
+    exchange, analysis = connect(args.balance)
+    start = int((time.time() - args.days * 86400) * 1000)
+    Backfill(analysis.fetcher, max_concurrency=args.concurrency).run(exchange.get_symbols(), args.timeframes, start)
+    print_startup()
+
+
+def run_backtest(args):
+    from backtest import Backtest
+    backtest = Backtest(timeframes=args.timeframes, bb_window=args.bb_window, num_of_std=args.num_of_std,
+                        rsi_window=args.rsi_window, overbought_threshold=args.overbought,
+                        oversold_threshold=args.oversold, signal=args.signal, hold_bars=args.hold_bars,
+                        fee_rate=args.fee_rate)
+    backtest.run(symbols=args.symbols, start=args.start, end=args.end)
+
 
-    # 선물 계좌 잔고 조회
-    exchange.print_balance()
+def run_sweep(args):
+    from optimize import ParameterSweep
+    # 지정하지 않은 축은 DEFAULT_GRID 값을 쓴다
+    grid = {'bb_window': args.bb_window, 'num_of_std': args.num_of_std, 'rsi_window': args.rsi_window,
+            'overbought_threshold': args.overbought, 'oversold_threshold': args.oversold,
+            'timeframes': args.timeframes, 'signal': args.signal, 'hold_bars': args.hold_bars}
+    sweep = ParameterSweep(grid={key: values for key, values in grid.items() if values},
+                           fee_rate=args.fee_rate, max_workers=args.workers)
+    results = sweep.run(symbols=args.symbols, start=args.start, end=args.end, samples=args.samples,
+                        rank_by=args.rank_by)
+    results.to_csv(args.output, index=False)
 
+
+def run_arbitrage(args):
+    from arbitrage import SpreadScanner
+    SpreadScanner().run()
+
+
+def parse_date(value):
+    """'2024-01-01' 또는 '2024-01-01T12:00' (UTC) -> ms 타임스탬프."""
+    from datetime import datetime, timezone
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value} (use YYYY-MM-DD[THH:MM])")
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return int(date.timestamp() * 1000)
+
+
+def parse_timeframes(value):
+    """'5m,15m,1h' -> ('5m', '15m', '1h'). sweep에서 타임프레임 조합 하나를 나타낸다."""
+    return tuple(timeframe for timeframe in value.split(',') if timeframe)
+
+
+def add_data_arguments(parser):
+    """backtest와 sweep이 공유하는 저장 데이터 범위 옵션."""
+    parser.add_argument('--start', type=parse_date, help="first candle to use (UTC date, e.g. 2024-01-01)")
+    parser.add_argument('--end', type=parse_date, help="stop before this candle (UTC date)")
+    parser.add_argument('--symbols', nargs='+', help="only these symbols (default: all stored symbols)")
+    parser.add_argument('--fee-rate', type=float, default=0.0004, help="taker fee per side")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Binance USDT-M futures BB/RSI scanner. "
+                                                 "Without a command, shows the interactive menu.")
+    parser.add_argument('--balance', action='store_true', help="print the futures account balance first")
+    commands = parser.add_subparsers(dest='command')
+
+    scan = commands.add_parser('scan', help="scan all timeframes once (or one with --timeframe)")
+    scan.add_argument('--timeframe', '-t', help="scan only this timeframe, e.g. 4h")
+    scan.add_argument('--shards', type=int, help="split the symbols across this many worker processes")
+    scan.add_argument('--cache-max-age', type=float, default=0, metavar='SECONDS',
+                      help="reuse cached candles fetched within SECONDS without a request")
+    scan.set_defaults(func=run_scan)
+
+    bot = commands.add_parser('bot', help="run the Telegram bot")
+    bot.add_argument('--stream', action='store_true', help="keep candles up to date over WebSocket")
+    bot.add_argument('--metrics-port', type=int, default=9108)
+    bot.add_argument('--shards', type=int, help="split the symbols across this many worker processes")
+    bot.add_argument('--watch', type=float, metavar='SECONDS',
+                     help="between candle closes, rescan including the in-progress bar every SECONDS")
+    bot.add_argument('--prescreen-margin', type=float, metavar='FRACTION',
+                     help="with --watch, refetch candles only for symbols whose ticker price could signal "
+                          "within this price margin, e.g. 0.002")
+    bot.add_argument('--cache-max-age', type=float, default=0, metavar='SECONDS',
+                     help="reuse cached candles fetched within SECONDS without a request")
+    bot.set_defaults(func=run_bot)
+
+    dump = commands.add_parser('dump', help="save OHLCV data for training")
+    dump.add_argument('--limit', type=int, default=1000, help="number of candles per symbol and timeframe")
+    dump.set_defaults(func=run_dump)
+
+    backfill = commands.add_parser('backfill', help="download full history into the local store (resumable)")
+    backfill.add_argument('--days', type=int, default=365, help="how far back to fill")
+    backfill.add_argument('--timeframes', nargs='+', default=['5m', '15m', '30m', '1h'])
+    backfill.add_argument('--concurrency', type=int, default=None, help="symbol/timeframe jobs in flight")
+    backfill.set_defaults(func=run_backfill)
+
+    backtest = commands.add_parser('backtest', help="backtest the BB/RSI signal on saved data")
+    backtest.add_argument('--timeframes', nargs='+', default=['5m', '15m', '30m', '1h'])
+    backtest.add_argument('--bb-window', type=int, default=20)
+    backtest.add_argument('--num-of-std', type=float, default=2)
+    backtest.add_argument('--rsi-window', type=int, default=14)
+    backtest.add_argument('--overbought', type=float, default=70, help="RSI overbought threshold")
+    backtest.add_argument('--oversold', type=float, default=30, help="RSI oversold threshold")
+    backtest.add_argument('--signal', choices=['bb', 'rsi', 'both'], default='both')
+    backtest.add_argument('--hold-bars', type=int, default=12, help="bars of the shortest timeframe to hold")
+    add_data_arguments(backtest)
+    backtest.set_defaults(func=run_backtest)
+
+    # 각 옵션은 값 목록을 받아 그리드 축이 된다. 생략한 축은 optimize.DEFAULT_GRID를 쓴다.
+    sweep = commands.add_parser('sweep', help="sweep BB/RSI parameters on saved data")
+    sweep.add_argument('--timeframes', nargs='+', type=parse_timeframes, metavar='TF[,TF...]',
+                       help="timeframe sets to try, e.g. 5m,15m,30m,1h 15m,1h")
+    sweep.add_argument('--bb-window', nargs='+', type=int)
+    sweep.add_argument('--num-of-std', nargs='+', type=float)
+    sweep.add_argument('--rsi-window', nargs='+', type=int)
+    sweep.add_argument('--overbought', nargs='+', type=float, help="RSI overbought thresholds")
+    sweep.add_argument('--oversold', nargs='+', type=float, help="RSI oversold thresholds")
+    sweep.add_argument('--signal', nargs='+', choices=['bb', 'rsi', 'both'])
+    sweep.add_argument('--hold-bars', nargs='+', type=int)
+    sweep.add_argument('--samples', type=int, help="evaluate only this many random combinations")
+    sweep.add_argument('--rank-by', default='total_return', help="result column to sort by")
+    sweep.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    add_data_arguments(sweep)
+    sweep.add_argument('--output', default='sweep_results.csv')
+    sweep.set_defaults(func=run_sweep)
+
+    commands.add_parser('arbitrage', help="scan cross-exchange spreads").set_defaults(func=run_arbitrage)
+    return parser.parse_args(argv)
+
+
+def interactive(args):
     while True:
-        
+
         print("Select the analysis mode:")
         print("1: Analyze all timeframes")
         print("2: Analyze a specific timeframe")
         print("3: Run Telegram bot")
         print("4: Predict crypto coin")
         print("5: Save the ohlcv data for training")
+        print("6: Run Telegram bot (WebSocket streaming)")
+        print("7: Backtest the BB/RSI signal on saved data")
+        print("8: Sweep BB/RSI parameters on saved data")
+        print("9: Scan cross-exchange spreads")
 
         mode = input("Enter your choice : ")
         if mode == '1':
+            exchange, analysis = connect(args.balance)
             analysis.analyze_all_timeframes()
             break
         elif mode == '2':
+            exchange, analysis = connect(args.balance)
             analysis.analyze_specific_timeframe()
             break
-        elif mode == '3':
-            from telegram import run_telegram_bot
-            run_telegram_bot(analysis_functions)
+        elif mode in ('3', '6'):
+            args.stream = mode == '6'
+            args.metrics_port = 9108
+            args.shards = None
+            args.watch = None
+            args.prescreen_margin = None
+            args.cache_max_age = 0
+            run_bot(args)
             break
         elif mode == '4':
             print('Not surpported!')
         elif mode == '5':
-            limit = int(input("Enter the number of data points to fetch: "))
-            MarketData.fetch_and_save_all_timeframes(exchange, limit)
+            args.limit = int(input("Enter the number of data points to fetch: "))
+            run_dump(args)
+        elif mode == '7':
+            run_backtest(parse_args(['backtest']))
+            break
+        elif mode == '8':
+            run_sweep(parse_args(['sweep']))
+            break
+        elif mode == '9':
+            run_arbitrage(args)
+            break
         else:
             print("Invalid input. Please enter the number.")
-    
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command is None:
+        interactive(args)
+    else:
+        args.func(args)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
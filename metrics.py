@@ -0,0 +1,246 @@
+# metrics.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Metrics:
+    """단계별 소요 시간(히스토그램), 카운터, 게이지를 모으는 프로세스 전역 저장소.
+
+    모든 메서드는 스레드 안전하며, prometheus_text()로 노출 형식을, report()로 JSON 보고서를 만든다.
+    라벨은 (이름, ((키, 값), ...)) 튜플로 구분한다.
+    """
+
+    def __init__(self, prefix='scanner', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # 시작 시간 측정의 기준점 (이 모듈이 처음 import된 시각, reset과 무관)
+        self.process_started = time.perf_counter()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+            self.started = time.time()
+
+    @staticmethod
+    def _labels(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    # --- 기록 ---
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            summary = self.stages.get(stage)
+            if summary is None:
+                summary = self.stages[stage] = {'count': 0, 'sum': 0.0, 'max': 0.0,
+                                                'buckets': [0] * len(self.buckets)}
+            summary['count'] += 1
+            summary['sum'] += seconds
+            summary['max'] = max(summary['max'], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    summary['buckets'][i] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start_time)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, self._labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def error(self, stage):
+        self.increment('errors', stage=stage)
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, self._labels(labels))] = value
+
+    def mark(self, event):
+        """프로세스 시작부터 event(예: 첫 거래소 요청)까지 걸린 시간을 처음 한 번만 기록한다."""
+        key = ('startup_seconds', self._labels({'event': event}))
+        with self.lock:
+            if key not in self.gauges:
+                self.gauges[key] = round(time.perf_counter() - self.process_started, 6)
+
+    def startup(self):
+        with self.lock:
+            return {dict(labels)['event']: value for (name, labels), value in self.gauges.items()
+                    if name == 'startup_seconds'}
+
+    # --- 출력 ---
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'time': time.time(),
+                'stages': {stage: dict(summary, buckets=list(summary['buckets']))
+                           for stage, summary in self.stages.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    @staticmethod
+    def _format_key(name, labels):
+        if not labels:
+            return name
+        return name + '{' + ','.join(f'{key}={value}' for key, value in labels) + '}'
+
+    def report(self, since=None):
+        """JSON으로 저장할 수 있는 보고서. since(snapshot)를 주면 그 이후 변화량만 담는다."""
+        current = self.snapshot()
+        previous = since or {'time': self.started, 'stages': {}, 'counters': {}}
+        stages = {}
+        for stage, summary in current['stages'].items():
+            before = previous['stages'].get(stage, {'count': 0, 'sum': 0.0})
+            count = summary['count'] - before['count']
+            if count:
+                total = summary['sum'] - before['sum']
+                stages[stage] = {'count': count, 'total': round(total, 6), 'mean': round(total / count, 6),
+                                 'max': round(summary['max'], 6)}
+        counters = {}
+        for key, value in current['counters'].items():
+            delta = value - previous['counters'].get(key, 0)
+            if delta:
+                counters[self._format_key(*key)] = delta
+        return {
+            'elapsed': round(current['time'] - previous['time'], 6),
+            'stages': stages,
+            'counters': counters,
+            'cache_hit_rate': self.hit_rate(counters),
+            'gauges': {self._format_key(*key): value for key, value in current['gauges'].items()},
+        }
+
+    @classmethod
+    def combine(cls, reports):
+        """여러 프로세스(샤드)의 report를 하나로 합친다. 카운터와 단계 시간은 더하고, 게이지와 경과 시간은 최댓값."""
+        stages, counters, gauges = {}, {}, {}
+        for report in reports:
+            for stage, summary in report['stages'].items():
+                combined = stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0})
+                combined['count'] += summary['count']
+                combined['total'] += summary['total']
+                combined['max'] = max(combined['max'], summary['max'])
+            for key, value in report['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in report['gauges'].items():
+                gauges[key] = max(gauges.get(key, value), value)
+        for summary in stages.values():
+            summary['total'] = round(summary['total'], 6)
+            summary['mean'] = round(summary['total'] / summary['count'], 6)
+        return {
+            'elapsed': max((report['elapsed'] for report in reports), default=0.0),
+            'stages': stages,
+            'counters': counters,
+            'cache_hit_rate': cls.hit_rate(counters),
+            'gauges': gauges,
+        }
+
+    def write_combined_report(self, path, reports):
+        return self._write(path, self.combine(reports))
+
+    @staticmethod
+    def hit_rate(counters):
+        hits = sum(value for key, value in counters.items() if key.startswith('candle_cache{') and 'result=hit' in key)
+        total = sum(value for key, value in counters.items() if key.startswith('candle_cache{'))
+        return round(hits / total, 4) if total else None
+
+    def write_report(self, path, since=None):
+        return self._write(path, self.report(since))
+
+    @staticmethod
+    def _write(path, report):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + '.tmp', path)
+        return report
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        name = f'{self.prefix}_stage_seconds'
+        lines.append(f'# HELP {name} Pipeline stage latency in seconds.')
+        lines.append(f'# TYPE {name} histogram')
+        for stage, summary in sorted(snapshot['stages'].items()):
+            for bound, count in zip(self.buckets, summary['buckets']):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {summary["count"]}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {summary["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {summary["count"]}')
+
+        for kind, values in [('counter', snapshot['counters']), ('gauge', snapshot['gauges'])]:
+            names = sorted({key[0] for key in values})
+            for metric in names:
+                full_name = f'{self.prefix}_{metric}_total' if kind == 'counter' else f'{self.prefix}_{metric}'
+                lines.append(f'# TYPE {full_name} {kind}')
+                for (key_name, labels), value in sorted(values.items()):
+                    if key_name != metric:
+                        continue
+                    label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                    lines.append(f'{full_name}{{{label_text}}} {value}' if label_text else f'{full_name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class MetricsServer:
+    """/metrics (Prometheus 텍스트)와 /report.json을 제공하는 백그라운드 HTTP 서버."""
+
+    def __init__(self, registry=None, host='127.0.0.1', port=9108):
+        self.registry = registry or metrics
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.prometheus_text().encode(), 'text/plain; version=0.0.4'
+                elif self.path == '/report.json':
+                    body, content_type = json.dumps(registry.report()).encode(), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return f'http://{self.host}:{self.port}/metrics'
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,191 @@
+# optimize.py
+import itertools
+import multiprocessing
+import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+from backtest import Backtest
+from panel import PanelIndicators, PricePanel
+
+
+DEFAULT_GRID = {
+    'bb_window': [20],
+    'num_of_std': [2, 2.5, 3],
+    'rsi_window': [14],
+    'overbought_threshold': [70, 75, 80],
+    'oversold_threshold': [30, 25, 20],
+    'timeframes': [('5m', '15m', '30m', '1h'), ('15m', '30m', '1h'), ('5m', '1h')],
+    'signal': ['both'],
+    'hold_bars': [12],
+}
+
+# 워커 프로세스 전역 상태 (initializer에서 채움)
+_panels = {}
+_shared_blocks = []
+_indicator_cache = OrderedDict()
+_cache_size = 8
+
+
+class SharedPanels:
+    """타임프레임별 종가/타임스탬프 배열을 공유 메모리에 올려 워커가 복사 없이 붙도록 한다."""
+
+    def __init__(self, panels):
+        self.blocks = []
+        self.descriptors = {}
+        symbols = None
+        for timeframe, panel in panels.items():
+            symbols = panel.symbols
+            self.descriptors[timeframe] = {
+                'close': self._share(panel.close),
+                'timestamps': self._share(panel.timestamps),
+            }
+        self.symbols = symbols
+
+    def _share(self, array):
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def _attach(descriptor):
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    _shared_blocks.append(block)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _init_worker(descriptors, symbols, cache_size):
+    global _cache_size
+    _cache_size = cache_size
+    for timeframe, arrays in descriptors.items():
+        close = _attach(arrays['close'])
+        _panels[timeframe] = PricePanel(symbols, _attach(arrays['timestamps']), None, None, None, close, None)
+
+
+def _cached(key, compute):
+    # 파라미터 조합끼리 공유되는 지표 배열(BB 평균/표준편차, RSI)을 LRU로 재사용
+    if key in _indicator_cache:
+        _indicator_cache.move_to_end(key)
+        return _indicator_cache[key]
+    value = compute()
+    _indicator_cache[key] = value
+    while len(_indicator_cache) > _cache_size:
+        _indicator_cache.popitem(last=False)
+    return value
+
+
+def _indicators(timeframe, params):
+    panel = _panels[timeframe]
+    rolling_mean = _cached(('mean', timeframe, params['bb_window']),
+                           lambda: PanelIndicators.rolling_mean(panel.close, params['bb_window']))
+    rolling_std = _cached(('std', timeframe, params['bb_window']),
+                          lambda: PanelIndicators.rolling_std(panel.close, params['bb_window']))
+    rsi = _cached(('rsi', timeframe, params['rsi_window']),
+                  lambda: PanelIndicators.calculate_rsi(panel, params['rsi_window']))
+    return rolling_mean, rolling_std, rsi
+
+
+def evaluate(params):
+    timeframes = sorted(params['timeframes'], key=ccxt.Exchange.parse_timeframe)
+    state = Backtest.combined_state(_panels, timeframes, params,
+                                    indicator_cache=lambda timeframe: _indicators(timeframe, params))
+    base_panel = _panels[timeframes[0]]
+    pnl, held = Backtest.simulate(base_panel, timeframes[0], state, params)
+    portfolio_returns = pnl.sum(axis=0) / len(base_panel.symbols)
+    return Backtest.report(portfolio_returns, Backtest.trade_returns(pnl, held), held)
+
+
+def _evaluate_group(group):
+    results = []
+    for params in group:
+        start_time = time.time()
+        metrics = evaluate(params)
+        metrics['elapsed'] = time.time() - start_time
+        results.append((params, metrics))
+    return results
+
+
+class ParameterSweep:
+    """BB/RSI 파라미터와 타임프레임 조합을 저장된 데이터로 병렬 백테스트해 순위표를 만든다."""
+
+    def __init__(self, grid=None, store=None, fee_rate=0.0004, funding_rate=0.0001, funding_interval='8h',
+                 max_workers=None, cache_size=8):
+        self.grid = dict(DEFAULT_GRID, **(grid or {}))
+        self.backtest = Backtest(store=store)
+        self.fixed = {'fee_rate': fee_rate, 'funding_rate': funding_rate, 'funding_interval': funding_interval}
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+
+    def combinations(self, samples=None, seed=0):
+        keys = list(self.grid)
+        combinations = [dict(zip(keys, values), **self.fixed)
+                        for values in itertools.product(*[self.grid[key] for key in keys])]
+        if samples is not None and samples < len(combinations):
+            combinations = random.Random(seed).sample(combinations, samples)
+        return combinations
+
+    @staticmethod
+    def group(combinations, workers):
+        # 같은 지표 배열을 쓰는 조합을 한 작업으로 묶어 워커 캐시 적중률을 높인다
+        groups = {}
+        for params in combinations:
+            groups.setdefault((params['bb_window'], params['rsi_window']), []).append(params)
+        # 워커 수보다 그룹이 적으면 큰 그룹을 나눠 모든 코어를 쓴다
+        tasks = list(groups.values())
+        while len(tasks) < workers and max(len(task) for task in tasks) > 1:
+            tasks.sort(key=len)
+            largest = tasks.pop()
+            tasks += [largest[:len(largest) // 2], largest[len(largest) // 2:]]
+        return tasks
+
+    def run(self, symbols=None, start=None, end=None, samples=None, rank_by='total_return', verbose=True):
+        combinations = self.combinations(samples)
+        timeframes = sorted({timeframe for params in combinations for timeframe in params['timeframes']},
+                            key=ccxt.Exchange.parse_timeframe)
+        self.backtest.timeframes = timeframes
+        symbols = symbols or self.backtest.available_symbols()
+        if not symbols:
+            raise ValueError("no stored OHLCV data for the sweep timeframes")
+
+        start_time = time.time()
+        shared = SharedPanels(self.backtest.load_panels(symbols, start, end))
+        load_time = time.time() - start_time
+        rows = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(shared.descriptors, shared.symbols, self.cache_size)) as executor:
+                futures = [executor.submit(_evaluate_group, task)
+                           for task in self.group(combinations, self.max_workers)]
+                for future in as_completed(futures):
+                    for params, metrics in future.result():
+                        row = {key: params[key] for key in self.grid}
+                        row['timeframes'] = ','.join(params['timeframes'])
+                        row.update(metrics)
+                        rows.append(row)
+        finally:
+            shared.close()
+
+        results = pd.DataFrame(rows).sort_values(rank_by, ascending=False).reset_index(drop=True)
+        if verbose:
+            print(f"Evaluated {len(results)} parameter sets on {len(symbols)} symbols with {self.max_workers} "
+                  f"workers in {time.time() - start_time:.2f} seconds (load {load_time:.2f}s)")
+            print(results.head(10).to_string())
+        return results
@@ -0,0 +1,230 @@
+# panel.py
+import numpy as np
+import pandas as pd
+
+
+class PricePanel:
+    """모든 심볼의 OHLCV를 (심볼 x 시간) NumPy 배열로 정렬해 담는다. 없는 봉은 NaN."""
+
+    def __init__(self, symbols, timestamps, open, high, low, close, volume):
+        self.symbols = list(symbols)
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @staticmethod
+    def from_coins_data(coins_data):
+        symbols = [symbol for symbol, df in coins_data.items() if not df.empty]
+        frames = [coins_data[symbol] for symbol in symbols]
+        if not frames:
+            return PricePanel._build([], [], [np.empty(0, dtype=np.int64)] + [np.empty(0)] * 5)
+
+        # 여러 열을 한 번에 고르면 pandas 인덱서 비용이 커서 열 단위로 꺼낸다
+        columns = [np.concatenate([PricePanel._timestamps_ms(df['timestamp']) for df in frames])]
+        columns += [np.concatenate([df[name].to_numpy(dtype=np.float64) for df in frames])
+                    for name in ['open', 'high', 'low', 'close', 'volume']]
+        return PricePanel._build(symbols, [len(df) for df in frames], columns)
+
+    @staticmethod
+    def from_ohlcv(raw_data):
+        """fetcher가 반환한 {symbol: [[ts, o, h, l, c, v], ...]}에서 DataFrame 없이 바로 만든다."""
+        arrays = {symbol: np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6) for symbol, ohlcv in raw_data.items()}
+        symbols = [symbol for symbol, array in arrays.items() if len(array)]
+        stacked = np.concatenate([arrays[symbol] for symbol in symbols]) if symbols else np.empty((0, 6))
+        columns = [stacked[:, 0].astype(np.int64)] + [stacked[:, i] for i in range(1, 6)]
+        return PricePanel._build(symbols, [len(arrays[symbol]) for symbol in symbols], columns)
+
+    @staticmethod
+    def _build(symbols, lengths, columns):
+        timestamps = np.unique(columns[0])
+        rows = np.repeat(np.arange(len(symbols)), lengths)
+        positions = np.searchsorted(timestamps, columns[0])
+
+        arrays = []
+        for values in columns[1:]:
+            array = np.full((len(symbols), len(timestamps)), np.nan)
+            array[rows, positions] = values
+            arrays.append(array)
+        return PricePanel(symbols, timestamps, *arrays)
+
+    @staticmethod
+    def _timestamps_ms(timestamps):
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            return timestamps.to_numpy().astype('datetime64[ms]').astype(np.int64)
+        return timestamps.to_numpy().astype(np.int64)
+
+    def last_valid_index(self):
+        """심볼별 마지막 봉의 열 위치 (봉이 없으면 -1)."""
+        valid = ~np.isnan(self.close)
+        if not valid.shape[1]:
+            return np.full(len(self.symbols), -1)
+        last = valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        return np.where(valid.any(axis=1), last, -1)
+
+    def latest(self, bars):
+        """심볼마다 자기 봉 중 최근 bars개만 오른쪽 정렬해 담은 작은 패널.
+
+        다른 심볼에만 있는 타임스탬프(이 심볼이 빠진 봉)의 NaN은 건너뛰므로, DataFrame별 계산이
+        각 심볼의 마지막 bars행을 쓰는 것과 같은 윈도우가 된다. 봉이 bars개보다 적으면 왼쪽이 NaN.
+        """
+        valid = ~np.isnan(self.close)
+        # 행마다 유효한 봉에 1부터 번호를 매기고 마지막 bars개만 오른쪽 끝에 맞춰 옮긴다
+        rank = np.cumsum(valid, axis=1)
+        total = rank[:, -1] if rank.shape[1] else np.zeros(len(self.symbols), dtype=np.int64)
+        rows, columns = np.nonzero(valid & (rank > (total - bars)[:, None]))
+        targets = bars - 1 - (total[rows] - rank[rows, columns])
+
+        arrays = []
+        for array in [self.open, self.high, self.low, self.close, self.volume]:
+            compact = np.full((len(self.symbols), bars), np.nan)
+            compact[rows, targets] = array[rows, columns]
+            arrays.append(compact)
+        return PricePanel(self.symbols, np.arange(bars), *arrays)
+
+
+class PanelIndicators:
+    """TechnicalIndicators와 같은 정의의 지표를 패널 전체에 대해 한 번에 계산한다."""
+
+    @staticmethod
+    def _shift(x, periods):
+        shifted = np.full_like(x, np.nan)
+        if periods > 0:
+            shifted[:, periods:] = x[:, :-periods]
+        elif periods < 0:
+            shifted[:, :periods] = x[:, -periods:]
+        else:
+            shifted[:] = x
+        return shifted
+
+    @staticmethod
+    def _rolling_sums(x, window):
+        # 행마다 첫 값을 빼서 누적합의 크기를 줄인 뒤(정밀도) 누적합 차분으로 윈도우 합을 구한다
+        valid = ~np.isnan(x)
+        first = np.argmax(valid, axis=1)
+        center = np.where(valid.any(axis=1), x[np.arange(len(x)), first], 0.0)[:, None]
+        centered = np.where(valid, x - center, 0.0)
+
+        zeros = np.zeros((len(x), 1))
+        cumsum = np.concatenate([zeros, np.cumsum(centered, axis=1)], axis=1)
+        cumsum_sq = np.concatenate([zeros, np.cumsum(centered ** 2, axis=1)], axis=1)
+        counts = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+
+        sums = np.full_like(x, np.nan)
+        sums_sq = np.full_like(x, np.nan)
+        if x.shape[1] >= window:
+            full = (counts[:, window:] - counts[:, :-window]) == window
+            sums[:, window - 1:] = np.where(full, cumsum[:, window:] - cumsum[:, :-window], np.nan)
+            sums_sq[:, window - 1:] = np.where(full, cumsum_sq[:, window:] - cumsum_sq[:, :-window], np.nan)
+        return sums, sums_sq, center
+
+    @staticmethod
+    def rolling_mean(x, window):
+        sums, _, center = PanelIndicators._rolling_sums(x, window)
+        return sums / window + center
+
+    @staticmethod
+    def rolling_std(x, window):
+        sums, sums_sq, _ = PanelIndicators._rolling_sums(x, window)
+        variance = (sums_sq - sums ** 2 / window) / (window - 1)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    @staticmethod
+    def rolling_max(x, window):
+        result = np.full_like(x, np.nan)
+        if x.shape[1] >= window:
+            result[:, window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=1).max(axis=-1)
+        return result
+
+    @staticmethod
+    def rolling_min(x, window):
+        result = np.full_like(x, np.nan)
+        if x.shape[1] >= window:
+            result[:, window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=1).min(axis=-1)
+        return result
+
+    @staticmethod
+    def calculate_sma(panel, window=20):
+        return PanelIndicators.rolling_mean(panel.close, window)
+
+    @staticmethod
+    def calculate_ema(panel, window=20):
+        # adjust=False 재귀식: 심볼 축은 벡터화, 시간 축만 순회
+        alpha = 2.0 / (window + 1)
+        close = panel.close
+        ema = np.full_like(close, np.nan)
+        previous = np.full(len(close), np.nan)
+        for t in range(close.shape[1]):
+            value = close[:, t]
+            updated = alpha * value + (1 - alpha) * previous
+            previous = np.where(np.isnan(previous), value, np.where(np.isnan(value), previous, updated))
+            ema[:, t] = previous
+        return ema
+
+    @staticmethod
+    def calculate_rsi(panel, window=14):
+        close = panel.close
+        delta = np.full_like(close, np.nan)
+        delta[:, 1:] = close[:, 1:] - close[:, :-1]
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+
+        # pandas에서처럼 각 심볼의 첫 봉부터 window개가 모여야 값이 나온다
+        listed = np.where(np.isnan(close), np.nan, 0.0)
+        gain_mean = PanelIndicators.rolling_mean(gain + listed, window)
+        loss_mean = PanelIndicators.rolling_mean(loss + listed, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = gain_mean / loss_mean
+            return 100 - (100 / (1 + rs))
+
+    @staticmethod
+    def calculate_bollinger_bands(panel, window=20, num_of_std=3):
+        rolling_mean = PanelIndicators.rolling_mean(panel.close, window)
+        rolling_std = PanelIndicators.rolling_std(panel.close, window)
+        return rolling_mean + rolling_std * num_of_std, rolling_mean - rolling_std * num_of_std
+
+    @staticmethod
+    def calculate_ichimoku(panel):
+        high, low = panel.high, panel.low
+        tenkan_sen = (PanelIndicators.rolling_max(high, 9) + PanelIndicators.rolling_min(low, 9)) / 2
+        kijun_sen = (PanelIndicators.rolling_max(high, 26) + PanelIndicators.rolling_min(low, 26)) / 2
+        senkou_span_a = PanelIndicators._shift((tenkan_sen + kijun_sen) / 2, 26)
+        senkou_span_b = PanelIndicators._shift(
+            (PanelIndicators.rolling_max(high, 52) + PanelIndicators.rolling_min(low, 52)) / 2, 26)
+        chikou_span = PanelIndicators._shift(panel.close, -26)
+        return tenkan_sen, kijun_sen, senkou_span_a, senkou_span_b, chikou_span
+
+
+class PanelEngine:
+    @staticmethod
+    def scan(panel, bb_window=20, num_of_std=2, rsi_window=14, overbought_threshold=70, oversold_threshold=30):
+        """심볼별 마지막 봉의 BB/RSI 상태를 담은 신호 테이블을 반환."""
+        if not panel.symbols:
+            return pd.DataFrame(columns=['close', 'upper_band', 'lower_band', 'rsi', 'bb_signal', 'rsi_signal'],
+                                index=pd.Index([], name='symbol'))
+        # 마지막 봉의 신호만 필요하므로 심볼별 최근 구간만 잘라서 계산한다 (결과는 전체 계산과 동일)
+        panel = panel.latest(max(bb_window, rsi_window + 1))
+        upper_band, lower_band = PanelIndicators.calculate_bollinger_bands(panel, bb_window, num_of_std)
+        rsi = PanelIndicators.calculate_rsi(panel, rsi_window)
+
+        last = panel.last_valid_index()
+        rows = np.arange(len(panel.symbols))[last >= 0]
+        columns = last[last >= 0]
+        close = panel.close[rows, columns]
+        upper = upper_band[rows, columns]
+        lower = lower_band[rows, columns]
+        last_rsi = rsi[rows, columns]
+
+        bb_signal = np.select([close > upper, close < lower], ['Above Upper Band', 'Below Lower Band'], None)
+        rsi_signal = np.select([last_rsi > overbought_threshold, last_rsi < oversold_threshold],
+                               ['Overbought', 'Oversold'], None)
+        return pd.DataFrame({
+            'close': close,
+            'upper_band': upper,
+            'lower_band': lower,
+            'rsi': last_rsi,
+            'bb_signal': bb_signal,
+            'rsi_signal': rsi_signal,
+        }, index=pd.Index([panel.symbols[i] for i in rows], name='symbol'))
@@ -0,0 +1,66 @@
+# prescreen.py
+import ccxt
+import numpy as np
+
+from panel import PanelEngine, PricePanel
+
+
+class PreScreen:
+    """티커 가격 하나로 캔들을 다시 받을 심볼(후보)을 고른다.
+
+    BB/RSI는 마지막 봉의 종가만 현재가로 바뀌고 나머지 봉은 이미 마감된 값이므로, 이전 스캔에서 받아 둔
+    캔들의 마지막 종가를 티커 가격으로 바꿔 계산하면 전체 스캔과 같은 신호가 나온다.
+    티커와 캔들 요청 사이의 가격 변화는 ±margin 범위의 가격에서도 확인해 흡수한다.
+    이전 스캔의 마지막 봉이 지금 진행 중인 봉이 아니면(새 봉이 열렸으면) 그 심볼은 항상 후보다.
+    """
+
+    @staticmethod
+    def current_bar(timeframe, now_ms):
+        period = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        return now_ms // period * period
+
+    @staticmethod
+    def fresh_symbols(coins_data, timeframe, now_ms):
+        """이전 데이터의 마지막 봉이 현재 진행 중인 봉인 심볼들."""
+        current_bar = PreScreen.current_bar(timeframe, now_ms)
+        fresh = set()
+        for symbol, df in coins_data.items():
+            if len(df) and PricePanel._timestamps_ms(df['timestamp'].iloc[-1:])[0] == current_bar:
+                fresh.add(symbol)
+        return fresh
+
+    @staticmethod
+    def with_prices(panel, prices):
+        """심볼별 마지막 봉의 종가를 prices(심볼 순서와 같은 배열)로 바꾼 패널."""
+        close = panel.close.copy()
+        last = panel.last_valid_index()
+        rows = np.flatnonzero(last >= 0)
+        close[rows, last[rows]] = prices[rows]
+        return PricePanel(panel.symbols, panel.timestamps, panel.open, panel.high, panel.low, close, panel.volume)
+
+    @staticmethod
+    def possible_signals(panel, prices, margin=0.0, **scan_params):
+        """현재가 ±margin 안에서 BB/RSI 신호가 날 수 있는 심볼 집합 (bb, rsi)."""
+        bb_symbols, rsi_symbols = set(), set()
+        for factor in sorted({1 - margin, 1.0, 1 + margin}):
+            table = PanelEngine.scan(PreScreen.with_prices(panel, prices * factor), **scan_params)
+            bb_symbols.update(table.index[table['bb_signal'].notna()])
+            rsi_symbols.update(table.index[table['rsi_signal'].notna()])
+        return bb_symbols, rsi_symbols
+
+    @staticmethod
+    def candidates(all_coins_data, prices, symbols, timeframes, now_ms, margin=0.0, **scan_params):
+        """모든 타임프레임에서 BB 또는 RSI 신호가 날 수 있는 심볼과, 새 봉이 열려 다시 받아야 하는 심볼."""
+        symbols = set(symbols)
+        possible_bb, possible_rsi = set(symbols), set(symbols)
+        for timeframe in timeframes:
+            coins_data = all_coins_data.get(timeframe) or {}
+            fresh = PreScreen.fresh_symbols(coins_data, timeframe, now_ms) & symbols & set(prices)
+            # 이전 데이터가 없거나 새 봉이 열린 심볼은 판단할 수 없으므로 후보로 남긴다
+            stale = symbols - fresh
+            panel = PricePanel.from_coins_data({symbol: coins_data[symbol] for symbol in sorted(fresh)})
+            price_array = np.array([prices[symbol] for symbol in panel.symbols], dtype=np.float64)
+            bb_symbols, rsi_symbols = PreScreen.possible_signals(panel, price_array, margin, **scan_params)
+            possible_bb &= bb_symbols | stale
+            possible_rsi &= rsi_symbols | stale
+        return possible_bb | possible_rsi
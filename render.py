@@ -0,0 +1,132 @@
+# render.py
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from metrics import metrics
+
+
+def _init_worker():
+    # 워커는 화면 없이 Agg로만 그리고, 무거운 import는 시작할 때 미리 해 둔다
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    import mplfinance  # noqa: F401
+    import util  # noqa: F401
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def render_chart(data, symbol, timeframe, folder_path):
+    """워커 프로세스에서 지표 계산과 차트 저장을 함께 수행하고 파일 경로를 반환."""
+    from calculate import TechnicalIndicators
+    from util import ChartUtils
+
+    data = TechnicalIndicators.add_technical_indicators(data.copy())
+    data['upper_band'], data['lower_band'] = TechnicalIndicators.calculate_bollinger_bands(data)
+    return ChartUtils.save_chart(data, symbol, timeframe, folder_path)
+
+
+class ChartRenderer:
+    """프로세스 풀로 차트를 병렬 렌더링하는 큐.
+
+    같은 (symbol, timeframe, 마지막 봉) 요청은 하나로 합치고, 이전 실행에서 이미 그린
+    차트는 charts/.manifest.json을 보고 다시 그리지 않는다. submit은 Future를 바로 반환한다.
+    """
+
+    def __init__(self, folder_path='charts', max_workers=None):
+        self.folder_path = folder_path
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(folder_path, '.manifest.json')
+        self.manifest = self._load_manifest()
+        self.stats = {'rendered': 0, 'deduplicated': 0, 'reused': 0}
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(self.folder_path, exist_ok=True)
+        with open(self.manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def _get_executor(self):
+        if self.executor is None:
+            # 스트림/이벤트 루프 스레드가 있어도 안전하도록 spawn으로 띄운다
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker)
+        return self.executor
+
+    def warm(self):
+        """워커를 미리 띄워 첫 차트가 프로세스 시작/임포트 비용을 치르지 않게 한다 (기다리지 않음)."""
+        executor = self._get_executor()
+        return [executor.submit(_warm_up) for _ in range(self.max_workers)]
+
+    @staticmethod
+    def bar_key(data, symbol, timeframe):
+        return f"{symbol}|{timeframe}|{data['timestamp'].iloc[-1]}|{data['close'].iloc[-1]!r}"
+
+    def submit(self, data, symbol, timeframe):
+        key = self.bar_key(data, symbol, timeframe)
+        filename = self.chart_filename(symbol, timeframe)
+        with self.lock:
+            if key in self.pending:
+                self.stats['deduplicated'] += 1
+                metrics.increment('charts', result='deduplicated')
+                return self.pending[key]
+            if self.manifest.get(filename) == key and os.path.exists(filename):
+                self.stats['reused'] += 1
+                metrics.increment('charts', result='reused')
+                future = Future()
+                future.set_result(filename)
+                return future
+
+            future = self._get_executor().submit(render_chart, data, symbol, timeframe, self.folder_path)
+            self.pending[key] = future
+        submitted = time.perf_counter()
+        future.add_done_callback(lambda done: self._on_done(done, key, filename, submitted))
+        return future
+
+    def chart_filename(self, symbol, timeframe):
+        from util import ChartUtils
+
+        return ChartUtils.chart_filename(symbol, timeframe, self.folder_path)
+
+    def _on_done(self, future, key, filename, submitted):
+        # 대기열에서 기다린 시간까지 포함한 제출~완료 시간
+        metrics.observe('chart_render', time.perf_counter() - submitted)
+        with self.lock:
+            self.pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                metrics.error('chart_render')
+                return
+            self.stats['rendered'] += 1
+            metrics.increment('charts', result='rendered')
+            self.manifest[filename] = key
+            self._save_manifest()
+
+    def wait(self, timeout=None):
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait)
+            self.executor = None
@@ -0,0 +1,266 @@
+# replay.py
+import asyncio
+import threading
+import time
+import zlib
+
+import ccxt
+import numpy as np
+
+from fetcher import kline_weight
+from funding import FundingRateService
+from universe import SymbolUniverse
+
+
+class ReplayData:
+    """리플레이 거래소가 돌려줄 캔들/티커/펀딩 데이터.
+
+    store(OHLCVStore)를 주면 저장된 캔들을 그대로 재생하고, 없으면 (seed, symbol, timeframe)으로
+    결정되는 랜덤워크 캔들을 end_time(ms, 기본은 생성 시각)까지 history개 만든다.
+    가격 경로는 end_time과 무관하게 같은 seed면 항상 같다.
+    """
+
+    def __init__(self, n_symbols=300, history=1500, end_time=None, seed=0, store=None):
+        self.history = history
+        self.end_time = end_time if end_time is not None else int(time.time() * 1000)
+        self.seed = seed
+        self.store = store
+        self.arrays = {}
+        # 진행 중인 마지막 봉의 종가에 곱할 심볼별 배수 (move로 가격 변화를 흉내 낸다)
+        self.factors = {}
+        self.lock = threading.Lock()
+        if store is not None:
+            symbol_sets = [set(store.symbols(timeframe)) for timeframe in store.timeframes()]
+            self.symbols = sorted(set.union(*symbol_sets)) if symbol_sets else []
+        else:
+            self.symbols = [f'SYN{i}/USDT:USDT' for i in range(n_symbols)]
+
+    def _rng(self, *keys):
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(key).encode()) for key in keys])
+
+    def ohlcv(self, symbol, timeframe):
+        key = (symbol, timeframe)
+        with self.lock:
+            if key not in self.arrays:
+                self.arrays[key] = self._load(symbol, timeframe)
+            return self.arrays[key]
+
+    def _load(self, symbol, timeframe):
+        if self.store is not None:
+            return self.store.load_array(symbol, timeframe)
+        period = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        end = self.end_time // period * period
+        timestamps = end - period * np.arange(self.history)[::-1]
+        rng = self._rng(symbol)
+        start_price = 10 ** rng.uniform(-3, 4)
+        rng = self._rng(symbol, timeframe)
+        close = start_price * np.exp(np.cumsum(rng.normal(0, 0.01, self.history)))
+        open = np.concatenate([[start_price], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.005, self.history)) * close
+        return np.column_stack([timestamps, open, np.maximum(open, close) + spread,
+                                np.minimum(open, close) - spread, close, rng.uniform(1, 1000, self.history)])
+
+    def move(self, volatility=0.01, step=0):
+        """모든 심볼의 현재가(모든 타임프레임의 마지막 봉 종가)를 결정적으로 움직인다."""
+        for symbol in self.symbols:
+            self.factors[symbol] = float(np.exp(self._rng(symbol, 'move', step).normal(0, volatility)))
+
+    def ohlcv_now(self, symbol, timeframe):
+        candles = self.ohlcv(symbol, timeframe)
+        factor = self.factors.get(symbol)
+        if factor is None or not len(candles):
+            return candles
+        candles = candles.copy()
+        close = candles[-1, 4] * factor
+        candles[-1, 2:5] = [max(candles[-1, 2], close), min(candles[-1, 3], close), close]
+        return candles
+
+    def window(self, symbol, timeframe, since=None, limit=None):
+        candles = self.ohlcv_now(symbol, timeframe)
+        limit = limit or 500
+        if since is None:
+            return candles[-limit:]
+        start = np.searchsorted(candles[:, 0], since, side='left')
+        return candles[start:start + limit]
+
+    def tickers(self):
+        tickers = {}
+        for symbol in self.symbols:
+            candles = self.ohlcv_now(symbol, '1h')
+            if not len(candles):
+                continue
+            day = candles[-24:]
+            last, first = day[-1, 4], day[0, 1]
+            tickers[symbol] = {
+                'symbol': symbol, 'timestamp': int(day[-1, 0]), 'last': last, 'close': last,
+                'bid': last * 0.9999, 'ask': last * 1.0001, 'high': day[:, 2].max(), 'low': day[:, 3].min(),
+                'percentage': (last / first - 1) * 100, 'baseVolume': day[:, 5].sum(),
+                'quoteVolume': float((day[:, 5] * day[:, 4]).sum()),
+            }
+        return tickers
+
+    def funding_rates(self):
+        next_funding_time = (self.end_time // 28_800_000 + 1) * 28_800_000
+        return {symbol: {'symbol': symbol, 'fundingRate': float(self._rng(symbol, 'funding').normal(0.0001, 0.0002)),
+                         'fundingTimestamp': next_funding_time}
+                for symbol in self.symbols}
+
+    def markets(self):
+        markets = {}
+        for symbol in self.symbols:
+            base = symbol.split('/')[0]
+            markets[symbol] = {
+                'id': f'{base}USDT', 'symbol': symbol, 'base': base, 'quote': 'USDT', 'settle': 'USDT',
+                'baseId': base, 'quoteId': 'USDT', 'settleId': 'USDT', 'type': 'swap', 'spot': False,
+                'margin': False, 'swap': True, 'future': False, 'option': False, 'contract': True,
+                'linear': True, 'inverse': False, 'active': True, 'taker': 0.0005, 'maker': 0.0002,
+                'precision': {'amount': 0.001, 'price': 0.0001}, 'limits': {}, 'info': {},
+            }
+        return markets
+
+
+class ReplayLimiter:
+    """바이낸스처럼 분당 가중치를 세고 한도를 넘으면 418/429에 해당하는 DDoSProtection을 낸다."""
+
+    def __init__(self, weight_per_minute=2400):
+        self.weight_per_minute = weight_per_minute
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def consume(self, weight):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.used = 0
+            self.used += weight
+            if self.weight_per_minute and self.used > self.weight_per_minute:
+                raise ccxt.DDoSProtection(f'replay: request weight {self.used} exceeds {self.weight_per_minute}/min')
+            return self.used
+
+
+class ReplayClient:
+    """ccxt.binance(선물)의 동기 API 중 이 프로젝트가 쓰는 부분만 흉내 내는 결정적 가짜 거래소.
+
+    latency초 지연, 분당 가중치 한도를 적용하고 stats에 요청 수/가중치/거절 수를 센다.
+    """
+
+    def __init__(self, data=None, latency=0.0, limiter=None):
+        self.data = data or ReplayData()
+        self.latency = latency
+        self.limiter = limiter or ReplayLimiter()
+        self.markets = None
+        self.currencies = {}
+        self.symbols = None
+        self.last_response_headers = {}
+        self.has = {'fetchOHLCV': True, 'fetchTickers': True, 'fetchFundingRates': True}
+        self.stats = {'requests': 0, 'weight': 0, 'rejected': 0}
+        self.stats_lock = threading.Lock()
+
+    def _request(self, weight):
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            self.stats['weight'] += weight
+        try:
+            used = self.limiter.consume(weight)
+        except ccxt.DDoSProtection:
+            with self.stats_lock:
+                self.stats['rejected'] += 1
+            raise
+        self.last_response_headers = {'X-MBX-USED-WEIGHT-1M': str(used)}
+
+    def load_markets(self, reload=False):
+        if self.markets and not reload:
+            return self.markets
+        self._request(1)
+        time.sleep(self.latency)
+        self.set_markets(self.data.markets())
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = dict(markets)
+        self.currencies = currencies or {}
+        self.symbols = sorted(self.markets)
+        return self.markets
+
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self._request(kline_weight(limit))
+        time.sleep(self.latency)
+        return self.data.window(symbol, timeframe, since, limit).tolist()
+
+    def fetch_tickers(self, symbols=None):
+        self._request(40)
+        time.sleep(self.latency)
+        return self.data.tickers()
+
+    def fetch_funding_rates(self, symbols=None):
+        self._request(10)
+        time.sleep(self.latency)
+        return self.data.funding_rates()
+
+    def fetch_balance(self):
+        return {'total': {'USDT': 0.0}, 'info': {'positions': []}}
+
+
+class AsyncReplayClient(ReplayClient):
+    """OHLCVFetcher용 async 버전. 지연은 이벤트 루프를 막지 않는다."""
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self._request(kline_weight(limit))
+        await asyncio.sleep(self.latency)
+        return self.data.window(symbol, timeframe, since, limit).tolist()
+
+    async def close(self):
+        pass
+
+
+class ReplayExchange:
+    """exchange.Exchange 대신 Analysis에 넘길 수 있는 리플레이 거래소 묶음.
+
+    동기 클라이언트와 connect_async가 만드는 async 클라이언트는 데이터와 가중치 한도를 공유한다.
+    """
+
+    def __init__(self, data=None, latency=0.0, weight_per_minute=2400, universe_path='cache/replay_markets.json'):
+        self.data = data or ReplayData()
+        self.latency = latency
+        self.limiter = ReplayLimiter(weight_per_minute)
+        self.exchange = ReplayClient(self.data, latency, self.limiter)
+        self.async_clients = []
+        self.funding = FundingRateService(self.exchange)
+        self.universe = SymbolUniverse(self.exchange, path=universe_path)
+        self.universe.load(reload=True)
+
+    @staticmethod
+    def synthetic(n_symbols=300, history=1500, end_time=None, seed=0, latency=0.0, weight_per_minute=2400,
+                  universe_path='cache/replay_markets.json'):
+        """랜덤워크 데이터로 만든 리플레이 거래소. 인자만으로 정해지므로 다른 프로세스에서도 같은 거래소를 만든다."""
+        data = ReplayData(n_symbols, history, end_time, seed)
+        return ReplayExchange(data, latency, weight_per_minute, universe_path)
+
+    def connect_async(self):
+        client = AsyncReplayClient(self.data, self.latency, self.limiter)
+        client.set_markets(self.exchange.markets)
+        self.async_clients.append(client)
+        return client
+
+    @property
+    def stats(self):
+        clients = [self.exchange] + self.async_clients
+        return {key: sum(client.stats[key] for client in clients) for key in ['requests', 'weight', 'rejected']}
+
+    def fetch_funding_rate(self, symbol):
+        return self.funding.get(symbol)
+
+    def fetch_balance(self):
+        return self.exchange.fetch_balance()
+
+    def load_markets(self):
+        self.universe.load()
+        return self.exchange.markets
+
+    def get_symbols(self, max_tier=None):
+        return self.universe.symbols(max_tier)
+
+    def print_balance(self):
+        pass
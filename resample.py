@@ -0,0 +1,99 @@
+# resample.py
+import os
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+
+class OHLCVResampler:
+    """기준 타임프레임(1h) 캔들로 상위 타임프레임 캔들을 만든다.
+
+    버킷은 epoch(UTC 00:00) 기준으로 정렬되어 바이낸스 캔들 경계와 같다.
+    앞쪽의 불완전한 버킷은 버리고, 마지막의 진행 중인 버킷은 남긴다.
+    """
+
+    @staticmethod
+    def ratio(timeframe, base_timeframe='1h'):
+        period = ccxt.Exchange.parse_timeframe(timeframe)
+        base_period = ccxt.Exchange.parse_timeframe(base_timeframe)
+        if period % base_period or 86400 % period:
+            raise ValueError(f"{timeframe} cannot be derived from {base_timeframe} candles")
+        return period // base_period
+
+    @staticmethod
+    def base_limit(timeframes, bars, base_timeframe='1h', max_limit=1500):
+        """모든 상위 타임프레임에 bars개씩(+정렬 여유 1봉) 만들 수 있는 기준 봉 개수."""
+        ratios = [OHLCVResampler.ratio(timeframe, base_timeframe) for timeframe in timeframes]
+        return min(max_limit, max(ratio * (bars + 1) for ratio in ratios))
+
+    @staticmethod
+    def resample(candles, timeframe, base_timeframe='1h'):
+        candles = np.asarray(candles, dtype=np.float64).reshape(-1, 6)
+        ratio = OHLCVResampler.ratio(timeframe, base_timeframe)
+        if ratio == 1 or not len(candles):
+            return candles
+
+        period_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+        timestamps = candles[:, 0].astype(np.int64)
+        buckets = timestamps - timestamps % period_ms
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        ends = np.concatenate([starts[1:], [len(candles)]])
+
+        resampled = np.empty((len(starts), 6))
+        resampled[:, 0] = buckets[starts]
+        resampled[:, 1] = candles[starts, 1]
+        resampled[:, 2] = np.maximum.reduceat(candles[:, 2], starts)
+        resampled[:, 3] = np.minimum.reduceat(candles[:, 3], starts)
+        resampled[:, 4] = candles[ends - 1, 4]
+        resampled[:, 5] = np.add.reduceat(candles[:, 5], starts)
+
+        # 첫 버킷이 중간부터 시작했다면 부분 봉이므로 제외
+        if timestamps[0] != buckets[0]:
+            resampled = resampled[1:]
+        return resampled
+
+    @staticmethod
+    def verify(base_candles, fetched_candles, timeframe, base_timeframe='1h', rtol=1e-9):
+        """리샘플 결과와 거래소에서 받은 캔들을 공통 타임스탬프에서 비교해 불일치 행을 반환."""
+        columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+        resampled = pd.DataFrame(OHLCVResampler.resample(base_candles, timeframe, base_timeframe), columns=columns)
+        fetched = pd.DataFrame(np.asarray(fetched_candles, dtype=np.float64).reshape(-1, 6), columns=columns)
+        merged = resampled.merge(fetched, on='timestamp', suffixes=('_resampled', '_fetched'))
+
+        mismatch = np.zeros(len(merged), dtype=bool)
+        for column in columns[1:]:
+            mismatch |= ~np.isclose(merged[f'{column}_resampled'], merged[f'{column}_fetched'], rtol=rtol)
+        return merged[mismatch]
+
+    @staticmethod
+    def record_fixtures(fetcher, symbols, timeframes, bars=100, directory='fixtures/resample', base_timeframe='1h'):
+        """검증용으로 기준/상위 타임프레임 캔들을 같은 시점에 받아 .npy로 저장."""
+        base_limit = OHLCVResampler.base_limit(timeframes, bars, base_timeframe)
+        timeframe_limits = {timeframe: bars for timeframe in timeframes}
+        timeframe_limits[base_timeframe] = base_limit
+        raw_data = fetcher.fetch_many(symbols, timeframe_limits)
+        for timeframe, data in raw_data.items():
+            os.makedirs(os.path.join(directory, timeframe), exist_ok=True)
+            for symbol, ohlcv in data.items():
+                formatted_symbol = symbol.replace(':USDT', '').replace('/', '_')
+                np.save(os.path.join(directory, timeframe, f"{formatted_symbol}.npy"), np.asarray(ohlcv, dtype=np.float64))
+
+    @staticmethod
+    def verify_fixtures(directory='fixtures/resample', base_timeframe='1h', rtol=1e-9):
+        """저장된 픽스처 전체를 비교해 {(symbol, timeframe): 불일치 행} 반환 (일치하면 빈 dict)."""
+        mismatches = {}
+        base_directory = os.path.join(directory, base_timeframe)
+        for timeframe in sorted(os.listdir(directory)):
+            if timeframe == base_timeframe:
+                continue
+            for file_name in sorted(os.listdir(os.path.join(directory, timeframe))):
+                base_path = os.path.join(base_directory, file_name)
+                if not os.path.exists(base_path):
+                    continue
+                # 마지막 봉은 두 요청 사이에 값이 바뀔 수 있으므로 확정된 봉만 비교
+                fetched = np.load(os.path.join(directory, timeframe, file_name))[:-1]
+                diff = OHLCVResampler.verify(np.load(base_path), fetched, timeframe, base_timeframe, rtol)
+                if len(diff):
+                    mismatches[(file_name[:-len('.npy')], timeframe)] = diff
+        return mismatches
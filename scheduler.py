@@ -0,0 +1,112 @@
+# scheduler.py
+import time
+
+import ccxt
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class CandleCloseScheduler:
+    """타임프레임별 봉 마감 시각(UTC 기준) + settle_delay초에 job(timeframes, close_time)을 호출한다.
+
+    job은 이번에 봉이 마감된 타임프레임 목록과 마감 시각(ms)을 받는다. 실행은 한 번에 하나뿐이며,
+    실행이 길어져 그동안 지나간 마감이 있으면 다음 실행 한 번으로 합친다.
+    idle_job을 주면 마감 사이에 마지막 실행 후 idle_interval초마다 인자 없이 호출한다 (진행 중인 봉 감시).
+    """
+
+    def __init__(self, timeframes, job, settle_delay=5.0, run_on_start=True, idle_job=None, idle_interval=None):
+        self.timeframes = sorted(timeframes, key=ccxt.Exchange.parse_timeframe)
+        self.job = job
+        self.settle_delay = settle_delay
+        self.run_on_start = run_on_start
+        self.idle_job = idle_job
+        self.idle_interval = idle_interval
+        self.last_close = None
+        self.last_run = None
+        self.stats = {'runs': 0, 'idle_runs': 0, 'coalesced': 0, 'busy': 0.0}
+
+    @staticmethod
+    def period_ms(timeframe):
+        return ccxt.Exchange.parse_timeframe(timeframe) * 1000
+
+    def last_boundary(self, timeframe, timestamp):
+        period = self.period_ms(timeframe)
+        return timestamp // period * period
+
+    def next_close(self, timestamp):
+        """timestamp 이후 가장 이른 마감 시각과 그때 마감되는 타임프레임들."""
+        closes = {timeframe: self.last_boundary(timeframe, timestamp) + self.period_ms(timeframe)
+                  for timeframe in self.timeframes}
+        close_time = min(closes.values())
+        return close_time, [timeframe for timeframe in self.timeframes if closes[timeframe] == close_time]
+
+    def closed_between(self, start, end):
+        """(start, end] 사이에 봉이 하나라도 마감된 타임프레임들."""
+        return [timeframe for timeframe in self.timeframes if self.last_boundary(timeframe, end) > start]
+
+    def _run(self, timeframes, close_time):
+        start_time = time.time()
+        try:
+            self.job(timeframes, close_time)
+        except Exception as e:
+            print(f"Scheduled job failed: {e}")
+        self.stats['runs'] += 1
+        self.stats['busy'] += time.time() - start_time
+        self.last_run = time.time()
+
+    def seconds_until_idle(self):
+        if self.idle_job is None or not self.idle_interval:
+            return None
+        if self.last_run is None:
+            return 0.0
+        return max(0.0, self.last_run + self.idle_interval - time.time())
+
+    def run_idle(self):
+        """idle_interval이 지났으면 idle_job을 한 번 실행하고 True를 반환."""
+        if self.seconds_until_idle() != 0.0:
+            return False
+        start_time = time.time()
+        try:
+            self.idle_job()
+        except Exception as e:
+            print(f"Idle job failed: {e}")
+        self.stats['idle_runs'] += 1
+        self.stats['busy'] += time.time() - start_time
+        self.last_run = time.time()
+        return True
+
+    def run_pending(self, timestamp=None):
+        """settle_delay가 지난 마감이 있으면 한 번 실행하고 True를 반환."""
+        settled = (timestamp if timestamp is not None else now_ms()) - int(self.settle_delay * 1000)
+        if self.last_close is None:
+            self.last_close = max(self.last_boundary(timeframe, settled) for timeframe in self.timeframes)
+            if self.run_on_start:
+                self._run(list(self.timeframes), self.last_close)
+                return True
+            return False
+
+        timeframes = self.closed_between(self.last_close, settled)
+        if not timeframes:
+            return False
+        close_time = max(self.last_boundary(timeframe, settled) for timeframe in timeframes)
+        # 지난 실행 중에 놓친 마감 횟수 (가장 짧은 타임프레임 기준)
+        shortest = self.period_ms(self.timeframes[0])
+        self.stats['coalesced'] += max(0, (close_time - self.last_close) // shortest - 1)
+        self.last_close = close_time
+        self._run(timeframes, close_time)
+        return True
+
+    def seconds_until_next(self, timestamp=None):
+        timestamp = timestamp if timestamp is not None else now_ms()
+        reference = self.last_close if self.last_close is not None else timestamp - int(self.settle_delay * 1000)
+        close_time, _ = self.next_close(reference)
+        return max(0.0, (close_time + self.settle_delay * 1000 - timestamp) / 1000)
+
+    def run_forever(self):
+        while True:
+            if not self.run_pending():
+                self.run_idle()
+            delays = [self.seconds_until_next(), self.seconds_until_idle()]
+            time.sleep(min(delay for delay in delays if delay is not None))
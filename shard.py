@@ -0,0 +1,241 @@
+# shard.py
+import atexit
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+import zlib
+
+from metrics import metrics
+
+
+def shard_of(symbol, count):
+    """심볼이 속한 샤드 번호. 프로세스나 노드가 달라도 같은 값이 나오도록 crc32를 쓴다."""
+    return zlib.crc32(symbol.encode()) % count
+
+
+def _worker(index, count, exchange_factory, analysis_options, weight_per_minute, charts, requests, responses):
+    """샤드 워커: 자기 거래소 연결, 캔들 캐시, 신호 상태를 가진 Analysis로 코디네이터의 명령을 처리한다."""
+    try:
+        from analysis import Analysis
+        from fetcher import WeightRateLimiter
+
+        exchange = exchange_factory()
+        report_path = analysis_options.get('report_path', 'reports/last_scan.json')
+        if report_path:
+            # 샤드마다 자기 보고서를 남기고, 코디네이터가 합친 보고서를 report_path에 쓴다
+            root, extension = os.path.splitext(report_path)
+            report_path = f'{root}_shard{index}{extension}'
+        analysis = Analysis(exchange, shard=(index, count), **dict(analysis_options, report_path=report_path))
+        if weight_per_minute:
+            # 같은 IP의 분당 가중치 한도를 샤드끼리 나눠 쓴다
+            analysis.fetcher.limiter = WeightRateLimiter(weight_per_minute, share=1 / count)
+        responses.put((index, None, 'ready', {'symbols': len(analysis.symbols()),
+                                              'timeframes': analysis.timeframe_options}))
+    except Exception:
+        responses.put((index, None, 'error', traceback.format_exc()))
+        return
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        sequence, command, args = request
+        try:
+            if command == 'scan':
+                payload = _scan(analysis, *args)
+            elif command == 'details':
+                payload = _details(analysis, args, charts)
+            elif command == 'top_coins':
+                payload = analysis.analyze_top_coins()
+            else:
+                raise ValueError(f'unknown command: {command}')
+            responses.put((index, sequence, command, payload))
+        except Exception:
+            responses.put((index, sequence, 'error', traceback.format_exc()))
+    analysis.renderer.shutdown()
+    analysis.fetcher.close()
+
+
+def _scan(analysis, timeframes, close_time):
+    run_start = metrics.snapshot()
+    start_time = time.perf_counter()
+    analysis.update_timeframe_signals(timeframes or analysis.timeframe_options, close_time)
+    elapsed = time.perf_counter() - start_time
+    if analysis.report_path:
+        report = metrics.write_report(analysis.report_path, run_start)
+    else:
+        report = metrics.report(run_start)
+    signals = {timeframe: {name: sorted(symbols) for name, symbols in timeframe_signals.items()}
+               for timeframe, timeframe_signals in analysis.timeframe_signals.items()}
+    return {'signals': signals, 'elapsed': elapsed, 'symbols': len(analysis.symbols()), 'metrics': report}
+
+
+def _details(analysis, symbols, charts):
+    """공통 BB 신호 심볼의 펀딩비와 차트 파일 경로 (Analysis.analyze_all_timeframes와 같은 봉으로 그린다)."""
+    run_start = metrics.snapshot()
+    futures = {}
+    if charts:
+        # 차트를 모두 렌더링 풀에 넘긴 뒤 결과를 모은다
+        for symbol in symbols:
+            data = [analysis.timeframe_coins_data[timeframe][symbol] for timeframe in analysis.timeframe_options
+                    if symbol in analysis.timeframe_coins_data.get(timeframe, {})]
+            futures[symbol] = analysis.renderer.submit(data[0], symbol, "common")
+    funding_rates = {symbol: analysis.fetch_funding_rate(symbol) for symbol in symbols}
+    details = {symbol: {'funding_rate': funding_rates[symbol],
+                        'chart': futures[symbol].result() if symbol in futures else None}
+               for symbol in symbols}
+    return {'symbols': details, 'metrics': metrics.report(run_start)}
+
+
+class ShardedScanner:
+    """심볼 유니버스를 해시로 나눠 shards개 워커 프로세스에서 스캔하고 결과를 합치는 코디네이터.
+
+    워커마다 자기 거래소 연결, 캔들 캐시, 타임프레임별 신호 상태를 가지며 multiprocessing 큐로 명령을 주고받는다.
+    샤드끼리 심볼이 겹치지 않으므로 타임프레임별 신호의 합집합으로 교집합을 구하면 단일 프로세스
+    Analysis.analyze_all_timeframes와 같은 결과가 나온다. Analysis(shard=(index, count))로 다른 노드에서도
+    같은 조각을 맡길 수 있다. exchange_factory는 spawn된 워커로 넘어가므로 pickle 가능해야 한다.
+    """
+
+    def __init__(self, shards=None, exchange_factory=None, analysis_options=None, weight_per_minute=2400,
+                 charts=True, timeout=600):
+        self.shards = shards or os.cpu_count() or 1
+        self.exchange_factory = exchange_factory
+        self.analysis_options = analysis_options or {}
+        self.report_path = self.analysis_options.get('report_path', 'reports/last_scan.json')
+        # 0/None이면 워커마다 기본 리미터(전체 한도)를 그대로 쓴다
+        self.weight_per_minute = weight_per_minute
+        self.charts = charts
+        self.timeout = timeout
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = []
+        self.requests = []
+        self.responses = None
+        self.sequence = 0
+        self.timeframe_options = None
+        self.shard_symbols = {}
+
+    def start(self):
+        if self.processes:
+            return self
+        exchange_factory = self.exchange_factory
+        if exchange_factory is None:
+            from exchange import Exchange
+            exchange_factory = Exchange
+        atexit.register(self.stop)
+        self.responses = self.context.Queue()
+        for index in range(self.shards):
+            requests = self.context.Queue()
+            # 워커가 차트 렌더링 풀을 띄울 수 있도록 daemon이 아닌 프로세스로 두고 종료 시 stop으로 정리한다
+            process = self.context.Process(target=_worker, args=(
+                index, self.shards, exchange_factory, self.analysis_options, self.weight_per_minute, self.charts,
+                requests, self.responses))
+            process.start()
+            self.requests.append(requests)
+            self.processes.append(process)
+        ready = self._collect(None, range(self.shards))
+        self.timeframe_options = ready[0]['timeframes']
+        self.shard_symbols = {index: info['symbols'] for index, info in ready.items()}
+        return self
+
+    def _collect(self, sequence, indices):
+        pending = set(indices)
+        results = {}
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            try:
+                index, response_sequence, kind, payload = self.responses.get(
+                    timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"shards {sorted(pending)} did not answer in {self.timeout}s")
+            # 이전 요청이 실패했을 때 남은 다른 샤드의 응답은 버린다
+            if response_sequence != sequence or index not in pending:
+                continue
+            if kind == 'error':
+                raise RuntimeError(f"shard {index} failed:\n{payload}")
+            results[index] = payload
+            pending.discard(index)
+        return results
+
+    def _call(self, command, args_by_shard):
+        """{샤드 번호: 인자}로 명령을 보내고 {샤드 번호: 결과}를 기다린다."""
+        self.sequence += 1
+        for index, args in args_by_shard.items():
+            self.requests[index].put((self.sequence, command, args))
+        return self._collect(self.sequence, args_by_shard)
+
+    def analyze_all_timeframes(self, timeframes=None, close_time=None):
+        """Analysis.analyze_all_timeframes와 같은 형태의 결과. charts에는 Future 대신 파일 경로가 담긴다."""
+        from util import ChartUtils
+
+        print("Analyzing all timeframes...")
+        self.start()
+        result = {
+            'common_bb_symbols': [],
+            'common_rsi_symbols': [],
+            'intersected_symbols': [],
+            'funding_rates': {},
+            'charts': {}
+        }
+        run_start = metrics.snapshot()
+        start_time = time.time()
+        with metrics.timer('shard_scan'):
+            scans = self._call('scan', {index: (timeframes, close_time) for index in range(self.shards)})
+        print(f"Total execution time: {time.time() - start_time:.2f} seconds")
+
+        signals = {timeframe: {'bb': set(), 'rsi': set()} for timeframe in self.timeframe_options}
+        for scan in scans.values():
+            for timeframe, timeframe_signals in scan['signals'].items():
+                for name, symbols in timeframe_signals.items():
+                    signals[timeframe][name].update(symbols)
+        common_bb_symbols = set.intersection(*[signals[timeframe]['bb'] for timeframe in self.timeframe_options])
+        common_rsi_symbols = set.intersection(*[signals[timeframe]['rsi'] for timeframe in self.timeframe_options])
+        intersected_symbols = common_bb_symbols.intersection(common_rsi_symbols)
+
+        reports = [scan['metrics'] for scan in scans.values()]
+        if common_bb_symbols:
+            # 차트와 펀딩비는 캔들을 가진 샤드에서 가져온다
+            owners = {}
+            for symbol in sorted(common_bb_symbols):
+                owners.setdefault(shard_of(symbol, self.shards), []).append(symbol)
+            with metrics.timer('shard_details'):
+                details = self._call('details', owners)
+            funding_rate = None
+            for shard_details in details.values():
+                reports.append(shard_details['metrics'])
+                for symbol, detail in shard_details['symbols'].items():
+                    if detail['chart'] is not None:
+                        result['charts'][symbol] = detail['chart']
+                    result['funding_rates'][symbol] = funding_rate = detail['funding_rate']
+            result.update({
+                'common_bb_symbols': ChartUtils.remove_suffix_from_symbols(common_bb_symbols),
+                'common_rsi_symbols': ChartUtils.remove_suffix_from_symbols(common_rsi_symbols),
+                'intersected_symbols': ChartUtils.remove_suffix_from_symbols(intersected_symbols),
+                'funding_rate': funding_rate})
+        else:
+            print("No common Bollinger Band signals found across timeframes.")
+
+        metrics.observe('scan', time.time() - start_time)
+        if self.report_path:
+            # 샤드들의 보고서와 코디네이터의 변화량을 합쳐 단일 프로세스 스캔과 같은 'metrics'를 만든다
+            result['metrics'] = metrics.write_combined_report(self.report_path,
+                                                              reports + [metrics.report(run_start)])
+        result['shards'] = {index: {'symbols': scan['symbols'], 'elapsed': round(scan['elapsed'], 6)}
+                            for index, scan in scans.items()}
+        return result
+
+    def analyze_top_coins(self):
+        # 상위 상승/하락 코인은 티커 한 번으로 전체를 보므로 첫 샤드에 맡긴다
+        self.start()
+        return self._call('top_coins', {0: ()})[0]
+
+    def stop(self):
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.requests = []
@@ -0,0 +1,204 @@
+# store.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class OHLCVStore:
+    """timeframe/symbol 단위로 나눈 열 지향 OHLCV 저장소.
+
+    data/{timeframe}/{symbol}/ 아래에 열마다 원시 배열 파일(timestamp는 int64 ms)을 두고
+    meta.json의 rows까지만 유효한 데이터로 본다. 추가는 파일 끝(또는 마지막 봉 자리)에만 쓰고 meta를
+    마지막에 원자적으로 교체하므로 중간에 죽어도 마지막으로 기록된 상태로 읽힌다.
+    전체를 다시 쓸 때(rewrite)는 새 세대(generation) 파일에 쓴 뒤 meta 교체 한 번으로 전환한다.
+    읽기는 np.memmap으로 필요한 구간만 잘라 온다.
+    """
+
+    PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+    def __init__(self, root='data', price_dtype='float64'):
+        self.root = root
+        self.price_dtype = price_dtype
+
+    @staticmethod
+    def format_symbol(symbol):
+        return symbol.replace(':USDT', '').replace('/', '_')
+
+    def _directory(self, symbol, timeframe):
+        return os.path.join(self.root, timeframe, self.format_symbol(symbol))
+
+    def _read_meta(self, directory):
+        path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, directory, meta):
+        path = os.path.join(directory, 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def _column_path(self, directory, column, generation=0):
+        # 세대 0은 기존 파일 이름을 그대로 쓴다
+        if not generation:
+            return os.path.join(directory, f'{column}.bin')
+        return os.path.join(directory, f'{column}.{generation}.bin')
+
+    def dtypes(self, meta=None):
+        if meta is not None:
+            return meta['dtypes']
+        dtypes = {'timestamp': 'int64'}
+        dtypes.update({column: self.price_dtype for column in self.PRICE_COLUMNS})
+        return dtypes
+
+    # --- 쓰기 ---
+
+    def append(self, symbol, timeframe, ohlcv):
+        """[[ts_ms, o, h, l, c, v], ...] 또는 fetch_coins_data DataFrame 중 마지막 저장 봉부터 추가.
+
+        마지막 저장 봉과 타임스탬프가 같은 행은 새 값으로 덮어쓴다 (저장할 때 아직 진행 중이던 봉).
+        새로 늘어난 행 수를 반환한다.
+        """
+        candles = self._to_array(ohlcv)
+        directory = self._directory(symbol, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta(directory) or {'symbol': symbol, 'timeframe': timeframe, 'rows': 0,
+                                              'last_timestamp': None, 'dtypes': self.dtypes()}
+        rows = meta['rows']
+        if meta['last_timestamp'] is not None:
+            candles = candles[candles[:, 0] >= meta['last_timestamp']]
+            if len(candles) and candles[0, 0] == meta['last_timestamp']:
+                rows -= 1
+        if not len(candles):
+            return 0
+
+        dtypes = self.dtypes(meta)
+        for i, column in enumerate(['timestamp'] + self.PRICE_COLUMNS):
+            dtype = np.dtype(dtypes[column])
+            path = self._column_path(directory, column, meta.get('generation', 0))
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # 이전에 meta 갱신 전에 중단됐다면 남은 꼬리를 잘라낸다. 유효한 행은 자르지 않고 덮어쓰므로
+                # 여기서 중단돼도 meta의 rows만큼은 항상 읽을 수 있다
+                f.truncate(meta['rows'] * dtype.itemsize)
+                f.seek(rows * dtype.itemsize)
+                f.write(candles[:, i].astype(dtype).tobytes())
+
+        written = rows + len(candles) - meta['rows']
+        meta['rows'] = rows + len(candles)
+        meta['last_timestamp'] = int(candles[-1, 0])
+        self._write_meta(directory, meta)
+        return written
+
+    def rewrite(self, symbol, timeframe, ohlcv):
+        """기존 데이터와 합쳐(중복 제거, 정렬) 다시 쓴다. 앞쪽 과거 구간을 채울 때만 사용.
+
+        합친 열은 다음 세대 파일에 따로 쓰고 meta를 원자적으로 교체해 전환하므로, 중간에 죽어도
+        이전 세대 데이터가 그대로 남는다. 교체가 끝난 뒤에 이전 세대 파일을 지운다.
+        """
+        # 같은 타임스탬프는 새로 받은 값이 남도록 뒤에서부터 고른다
+        candles = np.concatenate([self.load_array(symbol, timeframe), self._to_array(ohlcv)])
+        _, unique = np.unique(candles[:, 0][::-1], return_index=True)
+        candles = candles[::-1][unique]
+        directory = self._directory(symbol, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta(directory) or {'symbol': symbol, 'timeframe': timeframe, 'rows': 0,
+                                              'last_timestamp': None, 'dtypes': self.dtypes()}
+        if not len(candles):
+            return 0
+
+        previous = meta.get('generation', 0)
+        generation = previous + 1
+        dtypes = self.dtypes(meta)
+        for i, column in enumerate(['timestamp'] + self.PRICE_COLUMNS):
+            # 이전 시도에서 남은 같은 세대 파일은 덮어쓴다
+            with open(self._column_path(directory, column, generation), 'wb') as f:
+                f.write(candles[:, i].astype(np.dtype(dtypes[column])).tobytes())
+
+        written = len(candles) - meta['rows']
+        meta.update({'rows': len(candles), 'last_timestamp': int(candles[-1, 0]), 'generation': generation})
+        self._write_meta(directory, meta)
+        for column in ['timestamp'] + self.PRICE_COLUMNS:
+            path = self._column_path(directory, column, previous)
+            if os.path.exists(path):
+                os.remove(path)
+        return written
+
+    @staticmethod
+    def _to_array(ohlcv):
+        if isinstance(ohlcv, pd.DataFrame):
+            timestamps = ohlcv['timestamp']
+            if pd.api.types.is_datetime64_any_dtype(timestamps):
+                timestamps = timestamps.to_numpy().astype('datetime64[ms]').astype(np.int64)
+            columns = [np.asarray(timestamps, dtype=np.float64)]
+            columns += [ohlcv[column].to_numpy(dtype=np.float64) for column in OHLCVStore.PRICE_COLUMNS]
+            return np.column_stack(columns)
+        return np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+
+    # --- 읽기 ---
+
+    def timeframes(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def symbols(self, timeframe):
+        directory = os.path.join(self.root, timeframe)
+        if not os.path.isdir(directory):
+            return []
+        symbols = []
+        for name in sorted(os.listdir(directory)):
+            meta = self._read_meta(os.path.join(directory, name))
+            if meta is not None:
+                symbols.append(meta['symbol'])
+        return symbols
+
+    def first_timestamp(self, symbol, timeframe):
+        columns = self.columns(symbol, timeframe)
+        return None if columns is None else int(columns['timestamp'][0])
+
+    def last_timestamp(self, symbol, timeframe):
+        meta = self._read_meta(self._directory(symbol, timeframe))
+        return None if meta is None else meta['last_timestamp']
+
+    def columns(self, symbol, timeframe, start=None, end=None):
+        """{column: memmap 슬라이스} (start <= timestamp < end, ms). 데이터가 없으면 None."""
+        directory = self._directory(symbol, timeframe)
+        meta = self._read_meta(directory)
+        if meta is None or not meta['rows']:
+            return None
+        dtypes = self.dtypes(meta)
+        generation = meta.get('generation', 0)
+        columns = {column: np.memmap(self._column_path(directory, column, generation), dtype=dtypes[column],
+                                     mode='r', shape=(meta['rows'],))
+                   for column in ['timestamp'] + self.PRICE_COLUMNS}
+        timestamps = columns['timestamp']
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, side='left')
+        return {column: values[lo:hi] for column, values in columns.items()}
+
+    def load_array(self, symbol, timeframe, start=None, end=None):
+        columns = self.columns(symbol, timeframe, start, end)
+        if columns is None:
+            return np.empty((0, 6))
+        return np.column_stack([np.asarray(columns[column], dtype=np.float64)
+                                for column in ['timestamp'] + self.PRICE_COLUMNS])
+
+    def load(self, symbol, timeframe, start=None, end=None):
+        """fetch_coins_data와 같은 형태의 DataFrame."""
+        columns = self.columns(symbol, timeframe, start, end)
+        if columns is None:
+            return pd.DataFrame(columns=['timestamp'] + self.PRICE_COLUMNS)
+        df = pd.DataFrame({column: np.asarray(values) for column, values in columns.items()})
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+    def load_many(self, symbols, timeframe, start=None, end=None):
+        return {symbol: self.load(symbol, timeframe, start, end) for symbol in symbols}
+
+    def load_ohlcv(self, symbols, timeframe, start=None, end=None):
+        """{symbol: (n, 6) 배열}. PricePanel.from_ohlcv로 바로 패널을 만들 수 있다."""
+        return {symbol: self.load_array(symbol, timeframe, start, end) for symbol in symbols}
@@ -0,0 +1,314 @@
+# stream.py
+import asyncio
+import json
+import threading
+import time
+
+import aiohttp
+import ccxt
+from aiohttp import web
+
+from data import MarketData
+from fetcher import OHLCVFetcher
+from streaming import StreamingCandleIndicators
+
+
+class MarketStream:
+    """바이낸스 선물 combined stream(kline, !markPrice@arr, !ticker@arr)으로 시장 상태를 메모리에 유지한다.
+
+    REST는 최초 적재와 재연결 후 공백 메우기에만 쓰므로 정상 상태의 요청 가중치는 0에 가깝다.
+    on_event 콜백은 스트림 스레드에서 호출된다. funding_service(FundingRateService)를 주면 markPrice로 받은
+    펀딩비를 그쪽에도 반영한다.
+    """
+
+    def __init__(self, client_factory, markets, symbols, timeframes, limit=100,
+                 url='wss://fstream.binance.com/stream', on_event=None, streams_per_connection=200,
+                 reconnect_delay=1, max_reconnect_delay=60, record_path=None, ready_timeout=120,
+                 funding_service=None):
+        self.client_factory = client_factory
+        # REST 클라이언트는 스트림 스레드의 이벤트 루프에서만 쓰므로 그 루프가 생긴 뒤에 만든다 (_thread_main)
+        self.fetcher = None
+        self.symbols = list(symbols)
+        self.timeframes = list(timeframes)
+        self.limit = limit
+        self.url = url
+        self.on_event = on_event
+        self.streams_per_connection = streams_per_connection
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.record_path = record_path
+        self.ready_timeout = ready_timeout
+        self.funding_service = funding_service
+
+        self.ids = {markets[symbol]['id']: symbol for symbol in self.symbols}
+        self.candles = {(symbol, timeframe): [] for symbol in self.symbols for timeframe in self.timeframes}
+        self.indicators = {}
+        self.tickers = {}
+        self.funding = {}
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.stopping = None
+        # 최초 REST 적재가 끝나면 설정된다 (그 전의 스캔은 빈 캔들을 읽게 된다)
+        self.backfilled = threading.Event()
+        self.resync_pending = set()
+        self.stats = {'messages': 0, 'reconnects': 0, 'resyncs': 0}
+
+    def streams(self):
+        kline_streams = [f"{market_id.lower()}@kline_{timeframe}"
+                         for market_id in self.ids for timeframe in self.timeframes]
+        chunks = [kline_streams[i:i + self.streams_per_connection]
+                  for i in range(0, len(kline_streams), self.streams_per_connection)]
+        return [['!markPrice@arr', '!ticker@arr']] + chunks
+
+    # --- 상태 조회 (메인 스레드) ---
+
+    def coins_data(self, timeframe):
+        """fetch_coins_data와 같은 형태의 {symbol: DataFrame}."""
+        with self.lock:
+            snapshot = {symbol: list(self.candles[(symbol, timeframe)]) for symbol in self.symbols}
+        return {symbol: MarketData.to_dataframe(candles) for symbol, candles in snapshot.items() if candles}
+
+    def ticker_snapshot(self):
+        with self.lock:
+            return dict(self.tickers)
+
+    def funding_snapshot(self):
+        with self.lock:
+            return dict(self.funding)
+
+    # --- 스레드 수명 ---
+
+    def start(self):
+        """스트림 스레드를 띄우고 최초 적재가 끝날 때까지(최대 ready_timeout초) 기다린다."""
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._thread_main, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        if not self.backfilled.wait(self.ready_timeout):
+            print(f"Stream backfill did not finish in {self.ready_timeout}s; continuing with partial data")
+
+    def stop(self):
+        if self.loop is not None and self.stopping is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+        if self.thread is not None:
+            self.thread.join()
+
+    def _thread_main(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.fetcher = OHLCVFetcher(self.client_factory, loop=self.loop)
+        self.stopping = asyncio.Event()
+        ready.set()
+        try:
+            self.loop.run_until_complete(self.run())
+        finally:
+            # run이 최초 적재 전에 실패해도 start가 타임아웃까지 기다리지 않게 한다
+            self.backfilled.set()
+            self.loop.close()
+
+    async def run(self):
+        async with aiohttp.ClientSession() as session:
+            connections = [asyncio.ensure_future(self._connection(session, streams)) for streams in self.streams()]
+            try:
+                await self._backfill(list(self.candles))
+            finally:
+                self.backfilled.set()
+            await self.stopping.wait()
+            for connection in connections:
+                connection.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+        await self.fetcher.close_async()
+
+    # --- 웹소켓 ---
+
+    async def _connection(self, session, streams):
+        url = f"{self.url}?streams={'/'.join(streams)}"
+        delay = self.reconnect_delay
+        first = True
+        while not self.stopping.is_set():
+            try:
+                async with session.ws_connect(url, heartbeat=30) as ws:
+                    delay = self.reconnect_delay
+                    if not first:
+                        # 끊겨 있던 동안의 봉을 REST로 메운다
+                        self.stats['reconnects'] += 1
+                        await self._backfill(self._keys_for(streams))
+                    first = False
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self._record(message.data)
+                            self.handle_frame(json.loads(message.data))
+                            if self.resync_pending:
+                                keys, self.resync_pending = list(self.resync_pending), set()
+                                asyncio.ensure_future(self._backfill(keys))
+                        elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Stream connection error: {e}")
+            if self.stopping.is_set():
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _keys_for(self, streams):
+        keys = []
+        for stream in streams:
+            if '@kline_' in stream:
+                market_id, timeframe = stream.split('@kline_')
+                keys.append((self.ids[market_id.upper()], timeframe))
+        return keys
+
+    def _record(self, text):
+        if self.record_path:
+            with open(self.record_path, 'a') as f:
+                f.write(json.dumps({'time': time.time(), 'frame': text}) + '\n')
+
+    def handle_frame(self, frame):
+        self.stats['messages'] += 1
+        stream, data = frame.get('stream', ''), frame.get('data')
+        if '@kline_' in stream:
+            self._handle_kline(data)
+        elif stream.startswith('!markPrice'):
+            self._handle_mark_prices(data)
+        elif stream.startswith('!ticker'):
+            self._handle_tickers(data)
+
+    def _handle_kline(self, data):
+        kline = data['k']
+        symbol = self.ids.get(kline['s'])
+        if symbol is None:
+            return
+        key = (symbol, kline['i'])
+        candle = [kline['t'], float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']),
+                  float(kline['v'])]
+        with self.lock:
+            candles = self.candles[key]
+            timeframe_ms = ccxt.Exchange.parse_timeframe(kline['i']) * 1000
+            if candles and candle[0] > candles[-1][0] + timeframe_ms:
+                self.resync_pending.add(key)
+            self._merge(key, [candle])
+            indicators = self.indicators.get(key)
+            values = None
+            if indicators is not None and candle[0] >= indicators.bollinger.timestamp:
+                values = indicators.update(candle[0], candle[4])
+        self._emit({'type': 'kline', 'symbol': symbol, 'timeframe': kline['i'], 'closed': kline['x'],
+                    'candle': candle, 'indicators': values})
+
+    def _handle_mark_prices(self, data):
+        updates = {}
+        for item in data:
+            symbol = self.ids.get(item['s'])
+            if symbol is not None:
+                updates[symbol] = {'markPrice': float(item['p']), 'fundingRate': float(item['r']),
+                                   'nextFundingTime': item['T']}
+        with self.lock:
+            self.funding.update(updates)
+        if self.funding_service is not None:
+            for symbol, update in updates.items():
+                self.funding_service.update(symbol, update['fundingRate'], update['nextFundingTime'])
+        self._emit({'type': 'funding', 'updates': updates})
+
+    def _handle_tickers(self, data):
+        updates = {}
+        for item in data:
+            symbol = self.ids.get(item['s'])
+            if symbol is not None:
+                updates[symbol] = {'symbol': symbol, 'last': float(item['c']), 'percentage': float(item['P']),
+                                   'quoteVolume': float(item['q'])}
+        with self.lock:
+            self.tickers.update(updates)
+        self._emit({'type': 'ticker', 'updates': updates})
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    # --- REST 동기화 ---
+
+    def _merge(self, key, new_candles):
+        candles = self.candles[key]
+        for candle in new_candles:
+            if not candles or candle[0] > candles[-1][0]:
+                candles.append(candle)
+            elif candle[0] == candles[-1][0]:
+                candles[-1] = candle
+            else:
+                for i in range(len(candles) - 1, -1, -1):
+                    if candles[i][0] == candle[0]:
+                        candles[i] = candle
+                        break
+                    if candles[i][0] < candle[0]:
+                        candles.insert(i + 1, candle)
+                        break
+        del candles[:-self.limit]
+
+    async def _backfill(self, keys):
+        self.stats['resyncs'] += 1
+        semaphore = asyncio.Semaphore(self.fetcher.max_concurrency)
+
+        async def backfill_one(symbol, timeframe):
+            with self.lock:
+                candles = self.candles[(symbol, timeframe)]
+                last_ts = candles[-1][0] if candles else None
+            # 마지막 봉부터 limit개로 현재까지 닿을 때만 since를 쓰고, 아니면 최신 limit개를 받는다
+            timeframe_ms = ccxt.Exchange.parse_timeframe(timeframe) * 1000
+            since = None
+            if last_ts is not None and (time.time() * 1000 - last_ts) // timeframe_ms < self.limit:
+                since = last_ts
+            try:
+                ohlcv = await self.fetcher.fetch_symbol(symbol, timeframe, self.limit, since=since,
+                                                        semaphore=semaphore)
+            except Exception as e:
+                print(f"Error backfilling {symbol} {timeframe}: {e}")
+                return
+            with self.lock:
+                self._merge((symbol, timeframe), [[int(row[0])] + [float(v) for v in row[1:]] for row in ohlcv])
+                candles = self.candles[(symbol, timeframe)]
+                indicators = StreamingCandleIndicators()
+                indicators.seed([row[0] for row in candles], [row[4] for row in candles])
+                self.indicators[(symbol, timeframe)] = indicators
+
+        await asyncio.gather(*[backfill_one(symbol, timeframe) for symbol, timeframe in keys])
+        self._emit({'type': 'resync', 'keys': keys})
+
+
+class StreamReplayServer:
+    """MarketStream(record_path=...)로 녹화한 프레임을 로컬 웹소켓으로 재생하는 테스트용 서버."""
+
+    def __init__(self, record_path, host='127.0.0.1', port=0, speed=0.0):
+        self.record_path = record_path
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.runner = None
+
+    async def _handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        previous = None
+        with open(self.record_path) as f:
+            for line in f:
+                record = json.loads(line)
+                if self.speed and previous is not None:
+                    await asyncio.sleep((record['time'] - previous) / self.speed)
+                previous = record['time']
+                await ws.send_str(record['frame'])
+        await ws.close()
+        return ws
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/stream', self._handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        return f"ws://{self.host}:{self.port}/stream"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
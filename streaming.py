@@ -0,0 +1,280 @@
+# streaming.py
+import math
+from collections import deque
+
+
+class RollingWindow:
+    """확정된 봉 window-1개의 합/제곱합을 유지하고 진행 중인 봉 하나를 더해 윈도우를 만든다.
+
+    합은 기준값(center)을 뺀 값으로 누적해 정밀도를 지키고, window번 확정될 때마다
+    deque에서 다시 합산해 부동소수점 오차가 쌓이지 않게 한다 (분할 상환 O(1)).
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.closed = deque()
+        self.center = None
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.commits = 0
+
+    def commit(self, value):
+        if self.center is None:
+            self.center = value
+        self.closed.append(value)
+        self.sum += value - self.center
+        self.sum_sq += (value - self.center) ** 2
+        if len(self.closed) > self.window - 1:
+            removed = self.closed.popleft() - self.center
+            self.sum -= removed
+            self.sum_sq -= removed ** 2
+
+        self.commits += 1
+        if self.commits % self.window == 0:
+            self._resync()
+
+    def _resync(self):
+        self.center = self.closed[0] if self.closed else None
+        self.sum = sum(value - self.center for value in self.closed)
+        self.sum_sq = sum((value - self.center) ** 2 for value in self.closed)
+
+    def is_full(self):
+        return len(self.closed) == self.window - 1
+
+    def sums(self, value):
+        """진행 중인 봉 value를 포함한 윈도우의 (합, 제곱합)을 center 기준으로 반환."""
+        center = value if self.center is None else self.center
+        return self.sum + (value - center), self.sum_sq + (value - center) ** 2, center
+
+
+class StreamingIndicator:
+    """같은 timestamp로 다시 들어오면 진행 중인 봉을 덮어쓰고, 새 timestamp면 이전 봉을 확정한다."""
+
+    def __init__(self):
+        self.timestamp = None
+        self.pending = None
+
+    def update(self, timestamp, *values):
+        if self.timestamp is not None and timestamp < self.timestamp:
+            raise ValueError(f"out-of-order candle: {timestamp} < {self.timestamp}")
+        if self.timestamp is not None and timestamp > self.timestamp:
+            self._commit(*self.pending)
+        self.timestamp = timestamp
+        self.pending = values
+        return self._value(*values)
+
+    def seed(self, timestamps, *columns):
+        """과거 봉으로 상태를 채우고 마지막 값을 반환 (마지막 봉은 진행 중인 봉으로 취급)."""
+        value = math.nan
+        for row in zip(timestamps, *columns):
+            value = self.update(*row)
+        return value
+
+    def _commit(self, *values):
+        raise NotImplementedError
+
+    def _value(self, *values):
+        raise NotImplementedError
+
+
+class StreamingSMA(StreamingIndicator):
+    def __init__(self, window=20):
+        super().__init__()
+        self.rolling = RollingWindow(window)
+
+    def _commit(self, close):
+        self.rolling.commit(close)
+
+    def _value(self, close):
+        if not self.rolling.is_full():
+            return math.nan
+        total, _, center = self.rolling.sums(close)
+        return total / self.rolling.window + center
+
+
+class StreamingEMA(StreamingIndicator):
+    """TechnicalIndicators.calculate_ema (ewm(span, adjust=False))의 재귀식."""
+
+    def __init__(self, window=20):
+        super().__init__()
+        self.alpha = 2.0 / (window + 1)
+        self.closed_ema = None
+
+    def _commit(self, close):
+        self.closed_ema = self._value(close)
+
+    def _value(self, close):
+        if self.closed_ema is None:
+            return close
+        return (1 - self.alpha) * self.closed_ema + self.alpha * close
+
+
+class StreamingBollinger(StreamingIndicator):
+    """(upper_band, lower_band) 반환. calculate_bollinger_bands와 같은 표본표준편차(ddof=1)."""
+
+    def __init__(self, window=20, num_of_std=3):
+        super().__init__()
+        self.rolling = RollingWindow(window)
+        self.num_of_std = num_of_std
+
+    def _commit(self, close):
+        self.rolling.commit(close)
+
+    def _value(self, close):
+        if not self.rolling.is_full():
+            return math.nan, math.nan
+        window = self.rolling.window
+        total, total_sq, center = self.rolling.sums(close)
+        mean = total / window + center
+        std = math.sqrt(max((total_sq - total * total / window) / (window - 1), 0.0))
+        return mean + std * self.num_of_std, mean - std * self.num_of_std
+
+
+class StreamingRSI(StreamingIndicator):
+    """method='simple'은 calculate_rsi(단순 이동평균)와 같고, 'wilder'는 Wilder 평활 RSI."""
+
+    def __init__(self, window=14, method='simple'):
+        super().__init__()
+        if method not in ('simple', 'wilder'):
+            raise ValueError(f"unknown RSI method: {method}")
+        self.window = window
+        self.method = method
+        self.last_close = None
+        self.gains = RollingWindow(window)
+        self.losses = RollingWindow(window)
+        self.count = 0
+        self.avg_gain = None
+        self.avg_loss = None
+
+    def _change(self, close):
+        # calculate_rsi처럼 첫 봉의 변화량(NaN)은 0으로 취급
+        delta = 0.0 if self.last_close is None else close - self.last_close
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def _commit(self, close):
+        gain, loss = self._change(close)
+        if self.method == 'wilder':
+            self.avg_gain, self.avg_loss = self._wilder(gain, loss)
+        self.gains.commit(gain)
+        self.losses.commit(loss)
+        self.last_close = close
+        self.count += 1
+
+    def _wilder(self, gain, loss):
+        if self.count + 1 < self.window:
+            return None, None
+        if self.avg_gain is None:
+            total_gain, _, gain_center = self.gains.sums(gain)
+            total_loss, _, loss_center = self.losses.sums(loss)
+            return (total_gain / self.window + gain_center, total_loss / self.window + loss_center)
+        return ((self.avg_gain * (self.window - 1) + gain) / self.window,
+                (self.avg_loss * (self.window - 1) + loss) / self.window)
+
+    def _value(self, close):
+        gain, loss = self._change(close)
+        if self.method == 'wilder':
+            avg_gain, avg_loss = self._wilder(gain, loss)
+            if avg_gain is None:
+                return math.nan
+        else:
+            if not self.gains.is_full():
+                return math.nan
+            total_gain, _, gain_center = self.gains.sums(gain)
+            total_loss, _, loss_center = self.losses.sums(loss)
+            avg_gain = total_gain / self.window + gain_center
+            avg_loss = total_loss / self.window + loss_center
+
+        if avg_loss == 0:
+            return math.nan if avg_gain == 0 else 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class RollingExtreme:
+    """단조 deque로 확정된 봉의 구간 최대/최소를 O(1) 분할 상환으로 유지."""
+
+    def __init__(self, window, mode='max'):
+        self.window = window
+        self.better = (lambda a, b: a >= b) if mode == 'max' else (lambda a, b: a <= b)
+        self.pick = max if mode == 'max' else min
+        self.items = deque()
+        self.count = 0
+
+    def commit(self, value):
+        while self.items and self.better(value, self.items[-1][1]):
+            self.items.pop()
+        self.items.append((self.count, value))
+        self.count += 1
+
+    def value(self, pending):
+        # 진행 중인 봉의 인덱스는 self.count, 윈도우는 count-window+1 ~ count
+        if self.count + 1 < self.window:
+            return math.nan
+        while self.items and self.items[0][0] <= self.count - self.window:
+            self.items.popleft()
+        return self.pick(self.items[0][1], pending) if self.items else pending
+
+
+class StreamingIchimoku(StreamingIndicator):
+    """(tenkan_sen, kijun_sen, senkou_span_a, senkou_span_b, chikou_span) 반환.
+
+    chikou_span은 26봉 뒤의 종가라 배치 계산에서도 최근 봉 값은 항상 NaN이다.
+    """
+
+    def __init__(self, displacement=26):
+        super().__init__()
+        self.displacement = displacement
+        self.extremes = {window: (RollingExtreme(window, 'max'), RollingExtreme(window, 'min'))
+                         for window in (9, 26, 52)}
+        self.span_a = deque(maxlen=displacement)
+        self.span_b = deque(maxlen=displacement)
+
+    def _midpoint(self, window, high, low):
+        highest, lowest = self.extremes[window]
+        return (highest.value(high) + lowest.value(low)) / 2
+
+    def _lines(self, high, low):
+        tenkan_sen = self._midpoint(9, high, low)
+        kijun_sen = self._midpoint(26, high, low)
+        return tenkan_sen, kijun_sen, (tenkan_sen + kijun_sen) / 2, self._midpoint(52, high, low)
+
+    def _commit(self, high, low, close):
+        _, _, span_a, span_b = self._lines(high, low)
+        self.span_a.append(span_a)
+        self.span_b.append(span_b)
+        for highest, lowest in self.extremes.values():
+            highest.commit(high)
+            lowest.commit(low)
+
+    def _value(self, high, low, close):
+        tenkan_sen, kijun_sen, _, _ = self._lines(high, low)
+        shifted = len(self.span_a) == self.displacement
+        senkou_span_a = self.span_a[0] if shifted else math.nan
+        senkou_span_b = self.span_b[0] if shifted else math.nan
+        return tenkan_sen, kijun_sen, senkou_span_a, senkou_span_b, math.nan
+
+
+class StreamingCandleIndicators:
+    """심볼 하나의 BB/RSI/EMA 상태 묶음. 캔들 하나로 모든 지표를 갱신한다."""
+
+    def __init__(self, bb_window=20, num_of_std=2, rsi_window=14, ema_windows=(7, 25, 99)):
+        self.bollinger = StreamingBollinger(bb_window, num_of_std)
+        self.rsi = StreamingRSI(rsi_window)
+        self.emas = {window: StreamingEMA(window) for window in ema_windows}
+
+    def update(self, timestamp, close):
+        upper_band, lower_band = self.bollinger.update(timestamp, close)
+        values = {
+            'close': close,
+            'upper_band': upper_band,
+            'lower_band': lower_band,
+            'RSI': self.rsi.update(timestamp, close),
+        }
+        for window, ema in self.emas.items():
+            values[f'EMA_{window}'] = ema.update(timestamp, close)
+        return values
+
+    def seed(self, timestamps, closes):
+        values = {}
+        for timestamp, close in zip(timestamps, closes):
+            values = self.update(timestamp, close)
+        return values
@@ -1,72 +1,409 @@
 # telegram.py
-import schedule
+import asyncio
+import json
+import os
+import random
+import threading
 import time
+from concurrent.futures import Future
+
+import aiohttp
 import requests
+from aiohttp import web
 from dotenv import load_dotenv
-import os
+from funding import format_funding_rate
+from metrics import metrics
+from scheduler import CandleCloseScheduler
 
 
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+TELEGRAM_API_URL = 'https://api.telegram.org'
+MESSAGE_LIMIT = 4096
+MEDIA_GROUP_LIMIT = 10
+_STOP = object()
 
 
 def send_telegram_message(token, chat_id, message):
     """Send a message to a Telegram chat."""
-    url = f'https://api.telegram.org/bot{token}/sendMessage'
-    payload = {'chat_id': chat_id, 'text': message}
-    requests.post(url, json=payload)
+    url = f'{TELEGRAM_API_URL}/bot{token}/sendMessage'
+    for chunk in split_message(message):
+        try:
+            response = requests.post(url, json={'chat_id': chat_id, 'text': chunk}, timeout=10)
+            if not response.ok:
+                print(f"Telegram sendMessage failed: {response.status_code} {response.text}")
+        except requests.RequestException as e:
+            print(f"Telegram sendMessage failed: {e}")
 
 
-def run_telegram_bot(analysis_functions):
-    def scheduled_analysis():
-        all_timeframes_result = analysis_functions['all_timeframes']()
-        top_coins_result = analysis_functions['top_coins']()
+def split_message(message, limit=MESSAGE_LIMIT):
+    """텔레그램 메시지 길이 제한에 맞게 줄 단위로 나눈다 (한 줄이 너무 길면 그 줄을 자른다)."""
+    chunks = []
+    current = ''
+    for line in message.split('\n'):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = line if not current else current + '\n' + line
+        if len(candidate) > limit:
+            chunks.append(current)
+            candidate = line
+        current = candidate
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
 
-        if not all_timeframes_result or not isinstance(all_timeframes_result['intersected_symbols'], dict):
-            print("No significant all-timeframes analysis results found.")
+
+class TelegramSender:
+    """분석 루프를 막지 않는 텔레그램 전송 워커.
+
+    별도 스레드의 이벤트 루프에서 하나의 aiohttp 세션(연결 풀)으로 보낸다. send는 큐에 넣고 바로
+    반환하며, 큐가 가득 차면 가장 오래된 메시지를 버리고, stop이 시작된 뒤의 send는 받지 않는다.
+    coalesce_delay초 안에 들어온 메시지는 하나로 합쳐 보내고, 4096자를 넘으면 나눈다.
+    사진(파일 경로 또는 경로를 돌려주는 Future)은 sendMediaGroup으로 10장씩 올린다.
+    429는 retry_after만큼 기다린 뒤 다시 보낸다.
+    """
+
+    def __init__(self, token, chat_id, base_url=TELEGRAM_API_URL, max_queue=100, coalesce_delay=1.0,
+                 max_retries=5, backoff=1.0, timeout=30, max_connections=4):
+        self.token = token
+        self.chat_id = chat_id
+        self.base_url = base_url
+        self.max_queue = max_queue
+        self.coalesce_delay = coalesce_delay
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.loop = None
+        self.thread = None
+        self.queue = None
+        # stopping은 stop()을 부른 스레드에서, closing은 이벤트 루프에서 _STOP을 넣기 직전에 설정된다
+        self.stopping = False
+        self.closing = False
+        self.stats = {'queued': 0, 'dropped': 0, 'rejected': 0, 'coalesced': 0, 'requests': 0, 'rate_limited': 0,
+                      'failed': 0}
+
+    # --- 스레드 수명 ---
+
+    def start(self):
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._thread_main, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """남은 메시지를 모두 보낸 뒤 종료."""
+        self.stopping = True
+        if self.loop is not None and self.thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _thread_main(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue(self.max_queue)
+        ready.set()
+        try:
+            self.loop.run_until_complete(self.run())
+        finally:
+            self.loop.close()
+
+    # --- 큐 ---
+
+    def send(self, message, photos=None):
+        """스레드 어디서나 호출 가능. 전송을 기다리지 않는다. 종료 중이면 버리고 False를 반환한다."""
+        if self.stopping:
+            self._reject()
+            return False
+        if self.loop is None:
+            self.start()
+        self.loop.call_soon_threadsafe(self._enqueue, message, list(photos or []))
+        return True
+
+    def _reject(self):
+        self.stats['rejected'] += 1
+        metrics.increment('telegram_rejected')
+
+    async def _close(self):
+        # stop 전에 보낸 메시지(먼저 예약된 _enqueue)는 이미 큐에 있다. 이후의 메시지는 _STOP 뒤에 들어가거나
+        # 가득 찬 큐에서 _STOP을 밀어내지 않도록 버린다
+        self.closing = True
+        await self.queue.put(_STOP)
+
+    def _enqueue(self, message, photos):
+        if self.closing:
+            self._reject()
             return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.queue.task_done()
+            self.stats['dropped'] += 1
+        self.queue.put_nowait((message, photos))
+        self.stats['queued'] += 1
+
+    async def _next_batch(self):
+        """(message, photos, 꺼낸 항목 수, 종료 여부). 종료 표시를 만나면 그 앞까지만 묶는다."""
+        item = await self.queue.get()
+        if item is _STOP:
+            return None, [], 1, True
+        messages = [item[0]] if item[0] else []
+        photos, count, stopping = list(item[1]), 1, False
+        # 짧은 시간 안에 몰린 메시지는 한 번에 보낸다
+        if self.coalesce_delay:
+            await asyncio.sleep(self.coalesce_delay)
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            count += 1
+            if item is _STOP:
+                stopping = True
+                break
+            if item[0]:
+                messages.append(item[0])
+            photos += item[1]
+        self.stats['coalesced'] += count - 1 - stopping
+        return '\n\n'.join(messages), photos, count, stopping
 
-        message_parts = []
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            stopping = False
+            while not stopping:
+                message, photos, count, stopping = await self._next_batch()
+                try:
+                    await self._deliver(session, message, photos)
+                except Exception as e:
+                    print(f"Telegram delivery failed: {e}")
+                    self.stats['failed'] += 1
+                finally:
+                    for _ in range(count):
+                        self.queue.task_done()
 
-        if top_coins_result:
-            gainers_message = "Top 5 Gainers:\n" + \
-                            "\n".join([f"{coin['symbol']}: {coin['change']}%, Funding Rate: {(coin['funding_rate'])}" for coin in top_coins_result.get('gainers', [])])
-            losers_message = "Top 5 Losers:\n" + \
-                            "\n".join([f"{coin['symbol']}: {coin['change']}%, Funding Rate: {(coin['funding_rate'])}" for coin in top_coins_result.get('losers', [])])
-            message_parts.append(gainers_message)
-            message_parts.append(losers_message)
+    # --- 전송 ---
+
+    async def _deliver(self, session, message, photos):
+        if message:
+            for chunk in split_message(message):
+                await self._request(session, 'sendMessage', payload={'chat_id': self.chat_id, 'text': chunk})
+        paths = []
+        for photo in photos:
+            if isinstance(photo, Future):
+                try:
+                    photo = await asyncio.wrap_future(photo)
+                except Exception as e:
+                    print(f"Chart rendering failed: {e}")
+                    continue
+            if photo and os.path.exists(photo):
+                paths.append(photo)
+        for i in range(0, len(paths), MEDIA_GROUP_LIMIT):
+            await self._send_photos(session, paths[i:i + MEDIA_GROUP_LIMIT])
+
+    async def _send_photos(self, session, paths):
+        def form():
+            data = aiohttp.FormData()
+            data.add_field('chat_id', str(self.chat_id))
+            if len(paths) == 1:
+                with open(paths[0], 'rb') as f:
+                    data.add_field('photo', f.read(), filename=os.path.basename(paths[0]))
+                return data
+            media = []
+            for i, path in enumerate(paths):
+                with open(path, 'rb') as f:
+                    data.add_field(f'photo{i}', f.read(), filename=os.path.basename(path))
+                media.append({'type': 'photo', 'media': f'attach://photo{i}',
+                              'caption': os.path.splitext(os.path.basename(path))[0]})
+            data.add_field('media', json.dumps(media))
+            return data
+
+        # 한 장이면 sendMediaGroup을 쓸 수 없다 (2~10장)
+        method = 'sendPhoto' if len(paths) == 1 else 'sendMediaGroup'
+        await self._request(session, method, data=form)
+
+    async def _request(self, session, method, payload=None, data=None):
+        url = f'{self.base_url}/bot{self.token}/{method}'
+        for attempt in range(self.max_retries + 1):
+            self.stats['requests'] += 1
+            retry_after = None
+            try:
+                # 재시도마다 multipart 본문을 새로 만든다 (FormData는 한 번만 보낼 수 있음)
+                start_time = time.perf_counter()
+                async with session.post(url, json=payload, data=data() if callable(data) else data) as response:
+                    metrics.observe('telegram_send', time.perf_counter() - start_time)
+                    if response.status == 200:
+                        return await response.json()
+                    body = await response.json(content_type=None)
+                    if response.status == 429:
+                        self.stats['rate_limited'] += 1
+                        metrics.increment('rate_limited', service='telegram')
+                        retry_after = (body.get('parameters') or {}).get('retry_after', 1)
+                    elif response.status < 500:
+                        print(f"Telegram {method} failed: {response.status} {body.get('description')}")
+                        self.stats['failed'] += 1
+                        metrics.error('telegram_send')
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f"Telegram {method} error: {e}")
+            if attempt == self.max_retries:
+                break
+            metrics.increment('retries', stage='telegram_send')
+            delay = retry_after if retry_after is not None else self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+            await asyncio.sleep(delay)
+        self.stats['failed'] += 1
+        metrics.error('telegram_send')
+        return None
+
+    def flush(self, timeout=None):
+        """큐가 빌 때까지 기다린다 (테스트/종료용)."""
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
 
-        message_parts.append("----------------------------")
 
-        common_bb_symbols = all_timeframes_result.get('common_bb_symbols', [])
-        common_rsi_symbols = all_timeframes_result.get('common_rsi_symbols', [])
-        intersected_symbols = all_timeframes_result.get('intersected_symbols', [])
-        funding_rates = all_timeframes_result.get('funding_rates', {})
+class TelegramStubServer:
+    """TelegramSender를 시험하기 위한 로컬 Bot API 스텁. 요청을 기록하고 앞쪽 요청에 429를 돌려줄 수 있다."""
 
-        if common_bb_symbols:
-            bb_symbols_message = "Common Bollinger Band Extreme Symbols: " + ", ".join(common_bb_symbols)
-            bb_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {funding_rates.get(symbol+':USDT', 'N/A')}" for symbol in common_bb_symbols])
-            message_parts.append(bb_symbols_message)
-            message_parts.append(bb_funding_rates_message)
+    def __init__(self, host='127.0.0.1', port=0, rate_limit_first=0, retry_after=1, latency=0.0):
+        self.host = host
+        self.port = port
+        self.rate_limit_first = rate_limit_first
+        self.retry_after = retry_after
+        self.latency = latency
+        self.requests = []
+        self.runner = None
 
-        if common_rsi_symbols:
-            rsi_symbols_message = "Common RSI Extreme Symbols: " + ", ".join(common_rsi_symbols)
-            # rsi_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {funding_rates.get(symbol, 'N/A')}" for symbol in common_rsi_symbols])
-            message_parts.append(rsi_symbols_message)
-            # message_parts.append(rsi_funding_rates_message)
+    async def _handler(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        method = request.match_info['method']
+        if request.content_type == 'multipart/form-data':
+            fields = {}
+            files = 0
+            async for part in (await request.multipart()):
+                if part.filename:
+                    await part.read()
+                    files += 1
+                else:
+                    fields[part.name] = await part.text()
+            payload = dict(fields, files=files)
+        else:
+            payload = await request.json()
+        if self.rate_limit_first > 0:
+            self.rate_limit_first -= 1
+            return web.json_response({'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                                      'parameters': {'retry_after': self.retry_after}}, status=429)
+        self.requests.append((method, payload))
+        return web.json_response({'ok': True, 'result': {}})
 
-        if intersected_symbols:
-            intersected_message = "Symbols with both extreme BB and RSI: " + ", ".join(intersected_symbols)
-            intersected_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {funding_rates.get(symbol+':USDT', 'N/A')}" for symbol in intersected_symbols])
-            message_parts.append(intersected_message)
-            message_parts.append(intersected_funding_rates_message)
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        return f"http://{self.host}:{self.port}"
 
-        message = "\n\n".join(message_parts) if message_parts else "No significant updates or unexpected result format."
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+def signal_key(all_timeframes_result):
+    """메시지를 다시 보낼지 판단하는 신호 집합 (상위 코인 등락률은 매번 바뀌므로 제외)."""
+    return tuple(frozenset(all_timeframes_result.get(key, []))
+                 for key in ['common_bb_symbols', 'common_rsi_symbols', 'intersected_symbols'])
+
+
+def build_message(all_timeframes_result, top_coins_result):
+    message_parts = []
+
+    if top_coins_result:
+        gainers_message = "Top 5 Gainers:\n" + \
+                        "\n".join([f"{coin['symbol']}: {coin['change']}%, Funding Rate: {format_funding_rate(coin['funding_rate'])}" for coin in top_coins_result.get('gainers', [])])
+        losers_message = "Top 5 Losers:\n" + \
+                        "\n".join([f"{coin['symbol']}: {coin['change']}%, Funding Rate: {format_funding_rate(coin['funding_rate'])}" for coin in top_coins_result.get('losers', [])])
+        message_parts.append(gainers_message)
+        message_parts.append(losers_message)
+
+    message_parts.append("----------------------------")
+
+    common_bb_symbols = all_timeframes_result.get('common_bb_symbols', [])
+    common_rsi_symbols = all_timeframes_result.get('common_rsi_symbols', [])
+    intersected_symbols = all_timeframes_result.get('intersected_symbols', [])
+    funding_rates = all_timeframes_result.get('funding_rates', {})
+
+    if common_bb_symbols:
+        bb_symbols_message = "Common Bollinger Band Extreme Symbols: " + ", ".join(common_bb_symbols)
+        bb_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {format_funding_rate(funding_rates.get(symbol+':USDT'))}" for symbol in common_bb_symbols])
+        message_parts.append(bb_symbols_message)
+        message_parts.append(bb_funding_rates_message)
+
+    if common_rsi_symbols:
+        rsi_symbols_message = "Common RSI Extreme Symbols: " + ", ".join(common_rsi_symbols)
+        # rsi_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {funding_rates.get(symbol, 'N/A')}" for symbol in common_rsi_symbols])
+        message_parts.append(rsi_symbols_message)
+        # message_parts.append(rsi_funding_rates_message)
+
+    if intersected_symbols:
+        intersected_message = "Symbols with both extreme BB and RSI: " + ", ".join(intersected_symbols)
+        intersected_funding_rates_message = "\n".join([f"{symbol}: Funding Rate: {format_funding_rate(funding_rates.get(symbol+':USDT'))}" for symbol in intersected_symbols])
+        message_parts.append(intersected_message)
+        message_parts.append(intersected_funding_rates_message)
+
+    if not (common_bb_symbols or common_rsi_symbols or intersected_symbols):
+        message_parts.append("No common extreme signals across timeframes.")
+
+    return "\n\n".join(message_parts) if message_parts else "No significant updates or unexpected result format."
+
+
+def run_telegram_bot(analysis_functions, timeframes=('1h', '2h', '4h', '6h', '8h', '12h'), settle_delay=5,
+                     watch_interval=None):
+    """각 타임프레임 봉 마감 직후에 마감된 타임프레임만 다시 분석하고, 신호 집합이 바뀔 때만 보낸다.
+
+    watch_interval(초)을 주면 마감 사이에도 그 간격으로 진행 중인 봉까지 포함해 전체를 다시 분석한다
+    (Analysis(prescreen_margin=...)의 티커 사전 선별은 이 실행에서만 동작한다).
+    """
+    sender = TelegramSender(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID).start()
+    last_key = None
+    watched = False
+
+    def analyze(closed_timeframes, close_time):
+        nonlocal last_key
+        all_timeframes_result = analysis_functions['all_timeframes'](closed_timeframes, close_time)
+
+        if not all_timeframes_result or 'intersected_symbols' not in all_timeframes_result:
+            print("No significant all-timeframes analysis results found.")
+            return
+
+        key = signal_key(all_timeframes_result)
+        if key == last_key:
+            print(f"Signals unchanged after {', '.join(closed_timeframes or ['in-progress'])} scan, skipping message.")
+            return
+        last_key = key
+
+        top_coins_result = analysis_functions['top_coins']()
+        charts = list(all_timeframes_result.get('charts', {}).values())
+        sender.send(build_message(all_timeframes_result, top_coins_result), photos=charts)
 
-        send_telegram_message(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, message)
+    def scheduled_analysis(closed_timeframes, close_time):
+        nonlocal watched
+        # 감시 실행이 남긴 진행 중인 봉 신호가 섞이지 않도록 그 뒤의 첫 마감에서는 모든 타임프레임을 다시 본다
+        if watched:
+            closed_timeframes, watched = list(timeframes), False
+        analyze(closed_timeframes, close_time)
 
-    schedule.every(1).second.do(scheduled_analysis)
+    def watch_analysis():
+        nonlocal watched
+        watched = True
+        analyze(None, None)
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
\ No newline at end of file
+    CandleCloseScheduler(timeframes, scheduled_analysis, settle_delay=settle_delay,
+                         idle_job=watch_analysis if watch_interval else None,
+                         idle_interval=watch_interval).run_forever()
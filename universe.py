@@ -0,0 +1,183 @@
+# universe.py
+import contextlib
+import json
+import os
+import threading
+import time
+
+from metrics import metrics
+
+
+class SymbolUniverse:
+    """거래소 마켓 정보를 한 번만 받아 파일로 캐시하고, 스캔 대상 심볼 인덱스를 미리 만들어 둔다.
+
+    - 캐시 파일이 refresh_interval초보다 새로우면 네트워크 없이 set_markets로 복원한다.
+    - 인덱스: 거래 중인 USDT-M 무기한 선물만, -1122(상장 폐지/거래 중지)로 실패한 심볼은 제외.
+    - 24시간 거래대금(quoteVolume)으로 유동성 등급(1이 가장 높음)을 매긴다.
+    """
+
+    def __init__(self, exchange, path='cache/markets.json', refresh_interval=3600,
+                 tier_thresholds=(100_000_000, 10_000_000), exclusion_ttl=86400):
+        self.exchange = exchange
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.tier_thresholds = tier_thresholds
+        self.exclusion_ttl = exclusion_ttl
+        self.lock = threading.Lock()
+        self.loaded_at = 0.0
+        self.volumes = {}
+        self.volumes_at = 0.0
+        self.excluded = {}
+        self.perps = []
+
+    # --- 적재 ---
+
+    def load(self, reload=False):
+        """마켓을 적재하고 인덱스를 만든다. 캐시가 유효하면 요청하지 않는다."""
+        if not reload and self.loaded_at and time.time() - self.loaded_at < self.refresh_interval:
+            return self.perps
+        cached = None if reload else self._read_cache()
+        if cached is not None and time.time() - cached['time'] < self.refresh_interval:
+            with metrics.timer('market_load'):
+                self.exchange.set_markets(cached['markets'], cached.get('currencies'))
+            metrics.increment('market_cache', result='hit')
+            self.loaded_at = cached['time']
+            self.volumes = cached.get('volumes', {})
+            self.volumes_at = cached.get('volumes_time', 0.0)
+            self.excluded.update(cached.get('excluded', {}))
+        else:
+            metrics.mark('first_request')
+            with metrics.timer('market_load'):
+                self.exchange.load_markets(reload=True)
+            metrics.increment('market_cache', result='refresh')
+            self.loaded_at = time.time()
+            if cached is not None:
+                self.excluded.update(cached.get('excluded', {}))
+            self._write_cache()
+        self._build_index()
+        return self.perps
+
+    def _read_cache(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    @contextlib.contextmanager
+    def _file_lock(self, timeout=10.0):
+        """같은 캐시 파일을 쓰는 프로세스(샤드)끼리의 잠금. timeout초 넘게 남은 잠금 파일은 죽은 프로세스의 것으로 본다."""
+        lock_path = f'{self.path}.lock'
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(lock_path)
+                    deadline = time.monotonic() + timeout
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(lock_path)
+
+    def _write_cache(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._file_lock():
+            self._write_cache_locked()
+
+    def _write_cache_locked(self):
+        # 다른 샤드가 그 사이에 기록한 제외 심볼을 잃지 않도록 파일의 목록과 합친 뒤 쓴다
+        cached = self._read_cache()
+        now = time.time()
+        with self.lock:
+            if cached is not None:
+                for symbol, since in cached.get('excluded', {}).items():
+                    if symbol not in self.excluded and now - since < self.exclusion_ttl:
+                        self.excluded[symbol] = since
+            payload = {
+                'time': self.loaded_at,
+                'markets': self.exchange.markets,
+                'currencies': self.exchange.currencies,
+                'volumes': self.volumes,
+                'volumes_time': self.volumes_at,
+                'excluded': self.excluded,
+            }
+        # 샤드 프로세스들이 같은 캐시 파일을 쓸 수 있으므로 임시 파일은 프로세스별로 둔다
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def is_usdt_perp(market):
+        return (market.get('swap') and market.get('linear') and market.get('quote') == 'USDT'
+                and market.get('settle') == 'USDT' and market.get('active') is not False)
+
+    def _build_index(self):
+        now = time.time()
+        with self.lock:
+            # 오래된 제외 기록은 다시 시도해 볼 수 있게 만료시킨다
+            self.excluded = {symbol: since for symbol, since in self.excluded.items()
+                             if now - since < self.exclusion_ttl}
+            self.perps = sorted(symbol for symbol, market in self.exchange.markets.items()
+                                if self.is_usdt_perp(market) and symbol not in self.excluded)
+
+    # --- 갱신 ---
+
+    def exclude(self, symbol):
+        """-1122 등으로 항상 실패하는 심볼을 이후 스캔 대상에서 뺀다 (파일에도 기록)."""
+        with self.lock:
+            if symbol in self.excluded:
+                return
+            self.excluded[symbol] = time.time()
+            if symbol in self.perps:
+                self.perps.remove(symbol)
+        metrics.increment('excluded_symbols')
+        self._write_cache()
+
+    def refresh_volumes(self, max_age=None):
+        """fetch_tickers 한 번으로 24시간 거래대금을 갱신 (max_age초 안이면 생략)."""
+        max_age = self.refresh_interval if max_age is None else max_age
+        if self.volumes and time.time() - self.volumes_at < max_age:
+            return self.volumes
+        metrics.mark('first_request')
+        with metrics.timer('ticker_load'):
+            tickers = self.exchange.fetch_tickers()
+        with self.lock:
+            self.volumes = {symbol: float(ticker.get('quoteVolume') or 0.0) for symbol, ticker in tickers.items()
+                            if symbol in self.exchange.markets and self.is_usdt_perp(self.exchange.markets[symbol])}
+            self.volumes_at = time.time()
+        self._write_cache()
+        return self.volumes
+
+    # --- 조회 ---
+
+    def tier(self, symbol):
+        volume = self.volumes.get(symbol)
+        if volume is None:
+            return None
+        for i, threshold in enumerate(self.tier_thresholds):
+            if volume >= threshold:
+                return i + 1
+        return len(self.tier_thresholds) + 1
+
+    def symbols(self, max_tier=None):
+        """스캔 대상 심볼. max_tier를 주면 그 등급 이상(숫자가 작을수록 유동성 높음)만."""
+        self.load()
+        if max_tier is None:
+            return list(self.perps)
+        self.refresh_volumes()
+        return [symbol for symbol in self.perps if (self.tier(symbol) or len(self.tier_thresholds) + 1) <= max_tier]
+
+    def tiers(self):
+        self.refresh_volumes()
+        return {symbol: self.tier(symbol) for symbol in self.perps}
@@ -1,16 +1,15 @@
 import os
 import shutil
-import matplotlib.pyplot as plt
-import mplfinance as mpf
 import pandas as pd
 
 
 class ChartUtils:
     @staticmethod
-    def initialize_chart_folder(folder_path='charts'):
-        if os.path.exists(folder_path):
+    def initialize_chart_folder(folder_path='charts', clear=False):
+        # 데이터가 바뀌지 않은 차트는 다음 실행에서도 재사용하므로 기본적으로 지우지 않는다
+        if clear and os.path.exists(folder_path):
             shutil.rmtree(folder_path)
-        os.mkdir(folder_path)
+        os.makedirs(folder_path, exist_ok=True)
     
     @staticmethod
     def calculate_limit(timeframe):
@@ -26,7 +25,15 @@ class ChartUtils:
         return timeframe_limits.get(timeframe, 100)
 
     @staticmethod
-    def save_chart(data, symbol, timeframe):
+    def chart_filename(symbol, timeframe, folder_path='charts'):
+        return f'{folder_path}/{symbol.replace("/", "_")}_{timeframe}.png'
+
+    @staticmethod
+    def save_chart(data, symbol, timeframe, folder_path='charts'):
+        # matplotlib/mplfinance는 import만 1초 가까이 걸리므로 차트를 그릴 때만 불러온다
+        import matplotlib.pyplot as plt
+        import mplfinance as mpf
+
         data.index = pd.to_datetime(data['timestamp'], unit='ms')
         ohlcv = data[['open', 'high', 'low', 'close', 'volume']]
 
@@ -49,15 +56,19 @@ class ChartUtils:
         mpf.plot(ohlcv, type='line', style='yahoo', addplot=apds, title=f'{symbol} {timeframe}', 
                 figratio=(10, 8), volume=True, panel_ratios=(6,3))
 
-        if not os.path.isdir('charts'):
-            os.mkdir('charts')
+        if not os.path.isdir(folder_path):
+            os.mkdir(folder_path)
 
-        chart_filename = f'charts/{symbol.replace("/", "_")}_{timeframe}.png'
+        chart_filename = ChartUtils.chart_filename(symbol, timeframe, folder_path)
         plt.savefig(chart_filename)
         plt.close()
+        return chart_filename
 
     @staticmethod
     def save_ichimoku_chart(data, symbol, timeframe):
+        import matplotlib.pyplot as plt
+        import mplfinance as mpf
+
         apds = [mpf.make_addplot(data['tenkan_sen'], color='blue', width=0.7, label='Tenkan Sen'),
                 mpf.make_addplot(data['kijun_sen'], color='red', width=0.7, label='Kijun Sen'),
                 mpf.make_addplot(data['senkou_span_a'], color='green', width=0.7, label='Senkou Span A', alpha=0.3),